@@ -0,0 +1,200 @@
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+import scene_scoring
+from build_manifest import file_stamp
+from change_events import ACTIVITY_SIZE, CAPTURE_PARAMS, choose_capture
+from frame_source import open_frame_source, DEFAULT_BACKEND
+
+# What happens on screen over the whole recording, computed once by decoding the video at
+# a low rate and small size, and stored next to it as <video>.timeline.npz. For every
+# sample it keeps the change since the previous sample (changed pixels, mean change and
+# the bounding box of the changed region in video pixels) and the perceptual hash of the
+# screen. doc_generator (scene cuts), assembler (frames before/after a click) and
+# redbox_research (change region) answer their questions from it and decode full-size
+# frames only for the screenshots they write. Like the keyframe index, a replaced or
+# re-encoded video gets a fresh timeline automatically.
+TIMELINE_VERSION = 1
+TIMELINE_FPS = 2.0
+
+def timeline_path_for(video_path):
+    return video_path + ".timeline.npz"
+
+def video_info(video_path):
+    # (duration in seconds, width, height) from the container header
+    cap = cv2.VideoCapture(video_path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    finally:
+        cap.release()
+    return (frames / fps if fps and fps > 0 else 0.0), width, height
+
+class ActivityTimeline:
+    def __init__(self, times, changed, magnitude, boxes, phash, fps, frame_size):
+        self.times = times            # sample times in seconds, ascending
+        self.changed = changed        # changed thumbnail pixels since the previous sample (0 for the first)
+        self.magnitude = magnitude    # mean absolute luma change since the previous sample (0-255)
+        self.boxes = boxes            # (N, 4) x, y, w, h of the changed region in video pixels (zeros: none)
+        self.phash = phash            # (N, 8) packed 64-bit perceptual hash of every sample
+        self.fps = fps
+        self.frame_size = frame_size  # (width, height) of the video
+
+    def __len__(self):
+        return len(self.times)
+
+    def index_at(self, time_sec):
+        # Sample closest to time_sec, or None past the end of the recording
+        if not len(self.times) or time_sec > self.times[-1] + 0.5 / self.fps:
+            return None
+        i = int(np.searchsorted(self.times, time_sec))
+        if i == len(self.times) or (i > 0 and time_sec - self.times[i - 1] <= self.times[i] - time_sec):
+            i -= 1
+        return i
+
+    def span(self, start, end):
+        # [first, last) sample indices inside [start, end]
+        return int(np.searchsorted(self.times, start - 1e-6)), int(np.searchsorted(self.times, end + 1e-6))
+
+    def hash_distance(self, i, j):
+        # Differing bits of the perceptual hashes of samples i and j (scene_scoring's phash score)
+        return int(np.unpackbits(self.phash[i] ^ self.phash[j]).sum())
+
+    def capture_times(self, plan_time, window, params=CAPTURE_PARAMS):
+        # change_events.choose_capture on the timeline samples of the window
+        first, last = self.span(*window)
+        if last - first < 2:
+            return None
+        times = [float(t) for t in self.times[first:last]]
+        return choose_capture(times, self.changed[first + 1:last], plan_time, params)
+
+    def change_region(self, start, end, min_changed=CAPTURE_PARAMS["min_changed"]):
+        # Bounding box (x, y, w, h) of everything that changed after `start` up to `end`,
+        # or None if the screen did not change
+        first, last = self.span(start, end)
+        first = max(first, 1)
+        active = np.flatnonzero(self.changed[first:last] >= min_changed) + first
+        if not len(active):
+            return None
+        boxes = self.boxes[active]
+        x0, y0 = boxes[:, 0].min(), boxes[:, 1].min()
+        x1, y1 = (boxes[:, 0] + boxes[:, 2]).max(), (boxes[:, 1] + boxes[:, 3]).max()
+        return int(x0), int(y0), int(x1 - x0), int(y1 - y0)
+
+def changed_box(mask, frame_size):
+    # Bounding box of the True pixels of a thumbnail mask, scaled to video pixels
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if not len(rows):
+        return 0, 0, 0, 0
+    sx = frame_size[0] / mask.shape[1]
+    sy = frame_size[1] / mask.shape[0]
+    x0, y0 = int(cols[0] * sx), int(rows[0] * sy)
+    x1, y1 = int(np.ceil((cols[-1] + 1) * sx)), int(np.ceil((rows[-1] + 1) * sy))
+    return x0, y0, x1 - x0, y1 - y0
+
+def build_timeline(video_path, backend=DEFAULT_BACKEND, fps=TIMELINE_FPS,
+                   pixel_threshold=CAPTURE_PARAMS["pixel_threshold"], progress=None):
+    # One pass over the video at `fps` samples per second; returns the arrays stored
+    # in the .npz file
+    duration, width, height = video_info(video_path)
+    source = open_frame_source(video_path, backend)
+    if not source.is_opened():
+        raise RuntimeError(f"Cannot open video: {video_path}")
+    # One extra second in case the header's frame count is short; decoding stops at the end
+    wanted = [i / fps for i in range(int((duration + 1.0) * fps) + 1)]
+    times, changed, magnitude, boxes, hash_thumbs = [], [], [], [], []
+    previous = None
+    try:
+        for t, frame in source.iter_frames(wanted):
+            if progress is not None:
+                progress.check()
+            thumb = frame.thumbnail(ACTIVITY_SIZE)
+            if previous is None:
+                changed.append(0)
+                magnitude.append(0.0)
+                boxes.append((0, 0, 0, 0))
+            else:
+                diff = cv2.absdiff(thumb, previous)
+                mask = diff > pixel_threshold
+                changed.append(int(np.count_nonzero(mask)))
+                magnitude.append(float(diff.mean()))
+                boxes.append(changed_box(mask, (width, height)))
+            times.append(t)
+            hash_thumbs.append(cv2.resize(thumb, scene_scoring.THUMB_SIZE, interpolation=cv2.INTER_AREA))
+            previous = thumb
+    finally:
+        source.release()
+    # Hashed in one batch; the small thumbnails are not kept
+    phash = np.packbits(scene_scoring.phash_bits(np.stack(hash_thumbs)), axis=1) if hash_thumbs \
+        else np.zeros((0, 8), np.uint8)
+    return {
+        "version": np.int32(TIMELINE_VERSION),
+        "stamp": np.array(file_stamp(video_path), dtype=np.int64),
+        "fps": np.float64(fps),
+        "pixel_threshold": np.int32(pixel_threshold),
+        "frame_size": np.array([width, height], dtype=np.int32),
+        "times": np.array(times, dtype=np.float64),
+        "changed": np.array(changed, dtype=np.int32),
+        "magnitude": np.array(magnitude, dtype=np.float32),
+        "boxes": np.array(boxes, dtype=np.int32).reshape(-1, 4),
+        "phash": phash,
+    }
+
+def load_timeline(video_path, backend=DEFAULT_BACKEND, build=True, fps=TIMELINE_FPS, progress=None):
+    # Returns the ActivityTimeline of the video, building and saving it if missing or stale.
+    # None when it cannot be built (unreadable video).
+    path = timeline_path_for(video_path)
+    data = None
+    try:
+        with np.load(path) as stored:
+            data = {key: stored[key] for key in stored.files}
+        if (int(data["version"]) != TIMELINE_VERSION or data["stamp"].tolist() != file_stamp(video_path)
+                or float(data["fps"]) != fps
+                or int(data["pixel_threshold"]) != CAPTURE_PARAMS["pixel_threshold"]):
+            data = None
+    except (OSError, ValueError, KeyError):
+        data = None
+
+    if data is None:
+        if not build:
+            return None
+        try:
+            start = time.perf_counter()
+            data = build_timeline(video_path, backend, fps, progress=progress)
+            print(f"Activity timeline of {os.path.basename(video_path)}: {len(data['times'])} samples "
+                  f"in {time.perf_counter() - start:.1f}s")
+        except (RuntimeError, ValueError) as e:
+            print(f"Activity timeline error: {e}")
+            return None
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(f, **data)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Read-only video folder: the timeline is only used for this run
+            pass
+
+    if not len(data["times"]):
+        return None
+    return ActivityTimeline(data["times"], data["changed"], data["magnitude"], data["boxes"], data["phash"],
+                            float(data["fps"]), tuple(int(v) for v in data["frame_size"]))
+
+if __name__ == "__main__":
+    # Builds (or refreshes) the timeline and prints the busiest moments:
+    #   python activity_timeline.py <video>
+    timeline = load_timeline(sys.argv[1])
+    if timeline is None:
+        print("Could not build the timeline")
+        sys.exit(1)
+    size = os.path.getsize(timeline_path_for(sys.argv[1]))
+    print(f"{len(timeline)} samples at {timeline.fps:g}/s, {size / 1024:.0f} KB on disk")
+    for i in np.argsort(timeline.magnitude)[::-1][:10]:
+        print(f"{timeline.times[i]:>9.2f}s  change {timeline.magnitude[i]:6.2f}  "
+              f"{timeline.changed[i]:>6} px  box {tuple(int(v) for v in timeline.boxes[i])}")
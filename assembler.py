@@ -1,147 +1,216 @@
 import json
 import cv2
 import os
+import argparse
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
 from docx import Document
 from docx.shared import Inches, Pt, RGBColor, Twips
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 from docx.oxml.ns import qn
+from frame_source import open_frame_source, DEFAULT_BACKEND, BACKENDS as DECODER_BACKENDS
+from frame_cache import FrameCache, video_fingerprint
+from ui_index import UIBoxIndex
+from image_optimizer import optimize_image, optimize_images, DEFAULT_DPI, FORMATS as IMAGE_FORMATS
+from template_cache import TemplateCache
+from pipeline_timing import timings
+from progress import ProgressReporter, BuildCancelled
+from staged_pipeline import staged_results
+from change_events import CAPTURE_PARAMS, capture_windows, find_capture_times
+from activity_timeline import load_timeline
+from build_manifest import (manifest_path_for, plan_item_hash, file_stamp, load_manifest,
+                            save_manifest, build_signature, reusable_steps, diff_summary)
 
-def extract_frame_with_redbox(video_path, time_sec, output_path):
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
+# The "before" frame for the red-box diff is taken this many seconds before the step
+REDBOX_LOOKBACK_SEC = 1.5
+
+# Tunable numbers of the red-box detection
+REDBOX_PARAMS = {
+    "canny_low": 30,
+    "canny_high": 100,
+    "ui_kernel": (3, 25),    # wide but short: merges [Checkbox] + [Text Label] on one line
+    "ui_min_h": 15,
+    "ui_max_h": 80,
+    "ui_min_w": 50,
+    "diff_threshold": 25,
+    "diff_kernel": (5, 5),
+    "diff_iterations": 3,
+    "min_diff_area": 300,
+    "dedupe_distance": 20,
+    "max_boxes": 5,
+}
+
+# Bump when the red-box drawing/detection changes so cached images are not reused
+REDBOX_VERSION = 2
+
+# How the two frames of a step are chosen:
+#   events: change_events.py scans a window around the plan time and takes the settled
+#           frame after the largest change, compared with the frame before that change
+#   fixed:  the frame at the plan time, compared with the one REDBOX_LOOKBACK_SEC before
+CAPTURE_MODES = ("events", "fixed")
+DEFAULT_CAPTURE = "events"
+
+# Threads of the staged build (--pipeline) for red-box detection and for writing and
+# optimizing the images; the decoder and the docx writer have one thread each
+PIPELINE_VISION_THREADS = max(1, (os.cpu_count() or 1) - 2)
+PIPELINE_ENCODER_THREADS = max(1, (os.cpu_count() or 1) // 4)
+
+def extraction_params(backend=DEFAULT_BACKEND, capture="fixed", timeline=None):
+    # Everything besides the video and the time that decides how a step image looks
+    params = dict(REDBOX_PARAMS, lookback=REDBOX_LOOKBACK_SEC, backend=backend)
+    if capture == "events":
+        params["capture"] = CAPTURE_PARAMS
+        if timeline is not None:
+            # Events found on the timeline's samples instead of a scan of every window
+            params["capture"] = dict(CAPTURE_PARAMS, timeline_fps=timeline.fps)
+    elif capture != "fixed":
+        raise ValueError(f"Unknown capture mode: {capture} (expected one of {CAPTURE_MODES})")
+    return params
+
+def previous_frame_time(time_sec):
+    return max(0, time_sec - REDBOX_LOOKBACK_SEC)
+
+def extract_frame_with_redbox(video_path, time_sec, output_path, backend=DEFAULT_BACKEND, capture=DEFAULT_CAPTURE,
+                              timeline=None):
+    source = open_frame_source(video_path, backend)
+    if not source.is_opened():
         return False
+    
+    prev_time = previous_frame_time(time_sec)
+    if capture == "events":
+        if timeline is not None:
+            chosen = timeline.capture_times(time_sec, capture_windows([time_sec])[0])
+        else:
+            chosen = find_capture_times(source, [time_sec], capture_windows([time_sec]), seek_to_first=True)[0]
+        if chosen is not None:
+            time_sec, prev_time = chosen
+        
+    frame_curr = source.frame_at(time_sec)
+    frame_curr = frame_curr.bgr() if frame_curr is not None else None
+    
+    frame_prev = source.frame_at(prev_time)
+    frame_prev = frame_prev.bgr() if frame_prev is not None else None
+    
+    source.release()
+    
+    if frame_curr is None: return False
+    
+    return len(render_redbox(frame_curr, frame_prev, output_path))
+
+def detect_redboxes(frame_curr, frame_prev, params=REDBOX_PARAMS):
+    # Returns the boxes (x, y, w, h) to highlight, in label order
+    with timings.stage("canny/contours"):
+        gray_curr = cv2.cvtColor(frame_curr, cv2.COLOR_BGR2GRAY)
+        # 1. Analyze Structure (Horizontal Grouping)
+        # We want to group [Checkbox] + [Text Label] into one block.
+        # So we use a kernel that is wide but short.
+        edges = cv2.Canny(gray_curr, params["canny_low"], params["canny_high"])
+        
+        # Horizontal Kernel: (3, 25) means dilate 25 pixels horizontally, 3 vertically
+        # This merges words and checkoxes on the same line.
+        kernel_horizontal = np.ones(params["ui_kernel"], np.uint8) 
+        edges_dilated = cv2.dilate(edges, kernel_horizontal, iterations=1)
         
-    cap.set(cv2.CAP_PROP_POS_MSEC, time_sec * 1000)
-    ret1, frame_curr = cap.read()
+        contours_ui, _ = cv2.findContours(edges_dilated, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
     
-    prev_time = max(0, time_sec - 1.5)
-    cap.set(cv2.CAP_PROP_POS_MSEC, prev_time * 1000)
-    ret2, frame_prev = cap.read()
+    # Filter useful UI rows
+    # Height should be reasonable for a text line (15-80px)
+    # Width should be enough for text (>50px)
+    rects = np.array([cv2.boundingRect(c) for c in contours_ui], dtype=np.int64).reshape(-1, 4)
+    keep = (rects[:, 3] > params["ui_min_h"]) & (rects[:, 3] < params["ui_max_h"]) & (rects[:, 2] > params["ui_min_w"])
+    # Also avoid huge container boxes (like the whole window)
+    max_ui_area = frame_curr.shape[0] * frame_curr.shape[1] * 0.9
+    ui_index = UIBoxIndex(rects[keep], max_ui_area)
+
+    with timings.stage("diff"):
+        # 2. Analyze Changes (Diff)
+        gray_prev = cv2.cvtColor(frame_prev, cv2.COLOR_BGR2GRAY)
+        diff = cv2.absdiff(gray_curr, gray_prev)
+        _, thresh = cv2.threshold(diff, params["diff_threshold"], 255, cv2.THRESH_BINARY)
+        
+        # Dilate the diff too, to tolerate small discrepancies
+        kernel_diff = np.ones(params["diff_kernel"], np.uint8)
+        dilated_diff = cv2.dilate(thresh, kernel_diff, iterations=params["diff_iterations"])
+        
+        contours_diff, _ = cv2.findContours(dilated_diff, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    
+    # Significant changes, sorted by area (largest first)
+    areas = [cv2.contourArea(c) for c in contours_diff]
+    order = sorted(range(len(contours_diff)), key=lambda i: areas[i], reverse=True)
+    diff_rects = [cv2.boundingRect(contours_diff[i]) for i in order if areas[i] > params["min_diff_area"]]
     
-    cap.release()
+    # 3. Smart Match: smallest UI box that contains the center of each diff box
+    centers = [(dx + dw/2, dy + dh/2) for dx, dy, dw, dh in diff_rects]
+    matches = ui_index.smallest_containing_many(centers)
     
-    if not ret1: return False
+    boxes_found = []
+    found_xy = np.empty((0, 2))
+    distance = params["dedupe_distance"]
     
+    for (dx, dy, dw, dh), best_match in zip(diff_rects, matches):
+        # Select Box to Draw
+        if best_match:
+            fx, fy, fw, fh = best_match
+        else:
+            # Fallback: Just the diff box + padding
+            fx, fy, fw, fh = dx-5, dy-5, dw+10, dh+10
+        
+        # Check overlap with already drawn boxes to prevent duplicates
+        if np.any((np.abs(found_xy[:, 0] - fx) < distance) & (np.abs(found_xy[:, 1] - fy) < distance)):
+            continue
+        
+        boxes_found.append((fx, fy, fw, fh))
+        found_xy = np.vstack([found_xy, (fx, fy)])
+        if len(boxes_found) >= params["max_boxes"]: break
+    
+    return boxes_found
+
+def draw_redboxes(image, boxes):
+    for count, (fx, fy, fw, fh) in enumerate(boxes, start=1):
+        # Draw Red Box (BGR: 0, 0, 255)
+        cv2.rectangle(image, (fx, fy), (fx+fw, fy+fh), (0, 0, 255), 2)
+        
+        # Draw Label (Circle with Number)
+        center_x = fx
+        center_y = fy
+        radius = 12
+        # Ensure circle is inside image
+        center_y = max(radius, center_y)
+        center_x = max(radius, center_x)
+        
+        cv2.circle(image, (center_x, center_y), radius, (0, 0, 255), -1)
+        
+        label = str(count)
+        cv2.putText(image, label, (center_x - 5, center_y + 5), 
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+
+def draw_step_image(frame_curr, frame_prev):
+    # A copy of frame_curr with the numbered red boxes drawn on it.
+    # frame_prev may be None (no diff possible). Returns (image, boxes drawn).
     final_image = frame_curr.copy()
+    boxes = []
     
-    if ret2:
+    if frame_prev is not None:
         try:
-            gray_curr = cv2.cvtColor(frame_curr, cv2.COLOR_BGR2GRAY)
-            gray_prev = cv2.cvtColor(frame_prev, cv2.COLOR_BGR2GRAY)
-            # 1. Analyze Structure (Horizontal Grouping)
-            # We want to group [Checkbox] + [Text Label] into one block.
-            # So we use a kernel that is wide but short.
-            gray_curr_clean = cv2.cvtColor(frame_curr, cv2.COLOR_BGR2GRAY)
-            edges = cv2.Canny(gray_curr_clean, 30, 100)
-            
-            # Horizontal Kernel: (3, 20) means dilate 20 pixels horizontally, 3 vertically
-            # This merges words and checkoxes on the same line.
-            kernel_horizontal = np.ones((3, 25), np.uint8) 
-            edges_dilated = cv2.dilate(edges, kernel_horizontal, iterations=1)
-            
-            contours_ui, _ = cv2.findContours(edges_dilated, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-            
-            ui_boxes = []
-            for c in contours_ui:
-                x, y, w, h = cv2.boundingRect(c)
-                # Filter useful UI rows
-                # Height should be reasonable for a text line (15-60px)
-                # Width should be enough for text (>50px)
-                if h > 15 and h < 80 and w > 50: 
-                    ui_boxes.append((x, y, w, h))
-
-            # 2. Analyze Changes (Diff)
-            diff = cv2.absdiff(gray_curr, gray_prev)
-            _, thresh = cv2.threshold(diff, 25, 255, cv2.THRESH_BINARY)
-            
-            # Dilate the diff too, to tolerate small discrepancies
-            kernel_diff = np.ones((5,5), np.uint8)
-            dilated_diff = cv2.dilate(thresh, kernel_diff, iterations=3)
-            
-            contours_diff, _ = cv2.findContours(dilated_diff, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            # Sort contours by area
-            contours_diff = sorted(contours_diff, key=cv2.contourArea, reverse=True)
-            
-            count = 1
-            boxes_found = []
-            
-            for c in contours_diff:
-                if cv2.contourArea(c) > 300: # Significant change
-                    dx, dy, dw, dh = cv2.boundingRect(c)
-                    
-                    # 3. Smart Match: Find enclosing UI Box
-                    best_match = None
-                    min_area = float('inf')
-                    
-                    # Logic: Find smallest UI box that roughly contains the diff box
-                    # We allow some tolerance
-                    for ux, uy, uw, uh in ui_boxes:
-                        # Check intersection/inclusion
-                        # Simple inclusion: UI box contains center of Diff box?
-                        cx = dx + dw/2
-                        cy = dy + dh/2
-                        
-                        if (ux <= cx <= ux + uw) and (uy <= cy <= uy + uh):
-                            # It contains center. Is it smaller than current best?
-                            area = uw * uh
-                            # Also avoid huge container boxes (like the whole window)
-                            if area < min_area and area < (frame_curr.shape[0]*frame_curr.shape[1] * 0.9):
-                                min_area = area
-                                best_match = (ux, uy, uw, uh)
-                    
-                    # Select Box to Draw
-                    if best_match:
-                        fx, fy, fw, fh = best_match
-                    else:
-                        # Fallback: Just the diff box + padding
-                        fx, fy, fw, fh = dx-5, dy-5, dw+10, dh+10
-                    
-                    # Check overlap with already drawn boxes to prevent duplicates
-                    is_duplicate = False
-                    for b in boxes_found:
-                        # simple centers distance check
-                        bx, by, bw, bh = b
-                        if abs(fx - bx) < 20 and abs(fy - by) < 20: 
-                             is_duplicate = True
-                             break
-                    
-                    if is_duplicate: continue
-
-                    # Draw Red Box (BGR: 0, 0, 255)
-                    cv2.rectangle(final_image, (fx, fy), (fx+fw, fy+fh), (0, 0, 255), 2)
-                    
-                    # Draw Label (Circle with Number)
-                    center_x = fx
-                    center_y = fy
-                    radius = 12
-                    # Ensure circle is inside image
-                    center_y = max(radius, center_y)
-                    center_x = max(radius, center_x)
-                    
-                    cv2.circle(final_image, (center_x, center_y), radius, (0, 0, 255), -1)
-                    
-                    label = str(count)
-                    cv2.putText(final_image, label, (center_x - 5, center_y + 5), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
-                    
-                    boxes_found.append((fx, fy, fw, fh))
-                    count += 1
-                    if count > 5: break
-            
-            # Save
-            cv2.imwrite(output_path, final_image)
-            return len(boxes_found)
-            
+            with timings.stage("detect"):
+                boxes = detect_redboxes(frame_curr, frame_prev)
+                draw_redboxes(final_image, boxes)
         except Exception as e:
             print(f"RedBox Error: {e}")
-            cv2.imwrite(output_path, final_image)
-            return 0
-    else:
+            final_image = frame_curr.copy()
+            boxes = []
+    return final_image, boxes
+
+def render_redbox(frame_curr, frame_prev, output_path):
+    # Draws the numbered red boxes on frame_curr and saves it to output_path.
+    # Returns the list of boxes drawn.
+    final_image, boxes = draw_step_image(frame_curr, frame_prev)
+    
+    # Save
+    with timings.stage("image write"):
         cv2.imwrite(output_path, final_image)
-        return 0
+    return boxes
 
 def set_aifteam_styles(doc):
     # 1. Page Margins
@@ -229,20 +298,357 @@ def clean_and_prepare_template(template_path):
         
     return doc, history_tbl
 
-def create_doc_from_plan(video_path, plan_path, output_docx):
-    # Load Plan
-    with open(plan_path, 'r', encoding='utf-8') as f:
-        plan = json.load(f)
-        
+def iter_step_frames(video_path, jobs, prev_times=None, seek_to_first=False, backend=DEFAULT_BACKEND, progress=None):
+    # jobs: list of (time_sec, output_path) for every step of the plan.
+    # Instead of two seeks per step, every needed timestamp (current and "previous"
+    # frames alike) is collected and the video is decoded once, front to back.
+    # Yields (job index, current frame, previous frame or None) in time order as soon as
+    # both frames are decoded; steps whose frame cannot be read are never yielded.
+    # prev_times: time of the "previous" frame of every job (default: the fixed look-back)
+    if prev_times is None:
+        prev_times = [previous_frame_time(t) for t, _ in jobs]
+
+    remaining_uses = {}
+    steps_at_time = {}
+    for i, (time_sec, _) in enumerate(jobs):
+        steps_at_time.setdefault(time_sec, []).append(i)
+        for t in (time_sec, prev_times[i]):
+            remaining_uses[t] = remaining_uses.get(t, 0) + 1
+
+    # Only frames still waiting for a later step are kept in memory
+    frames = {}
+
+    def release(t):
+        remaining_uses[t] -= 1
+        if remaining_uses[t] == 0:
+            frames.pop(t, None)
+
+    source = open_frame_source(video_path, backend)
+    if not source.is_opened():
+        return
+    try:
+        for t, frame in timings.iterate("decode", source.iter_frames(remaining_uses.keys(), seek_to_first)):
+            if progress is not None:
+                progress.check()
+            with timings.stage("to bgr"):
+                frames[t] = frame.bgr()
+            # The previous frame is never later than the current one, so it is already decoded
+            for i in steps_at_time.get(t, []):
+                yield i, frames[t], frames.get(prev_times[i])
+                release(jobs[i][0])
+                release(prev_times[i])
+    finally:
+        source.release()
+
+def extract_plan_frames(video_path, jobs, seek_to_first=False, backend=DEFAULT_BACKEND, progress=None,
+                        prev_times=None):
+    # Renders the step images of iter_step_frames.
+    # Returns the drawn boxes (or False if the frame could not be read) in job order.
+    # progress: a progress.ProgressReporter advanced after every step (or None).
+    results = [False] * len(jobs)
+    for i, frame_curr, frame_prev in iter_step_frames(video_path, jobs, prev_times, seek_to_first, backend, progress):
+        output_path = jobs[i][1]
+        with timings.stage("render", image=os.path.basename(output_path)):
+            results[i] = render_redbox(frame_curr, frame_prev, output_path)
+        if progress is not None:
+            progress.advance()
+    return results
+
+def _extract_range_worker(args):
+    # Runs in a worker process with its own decoder. With capture windows the worker
+    # first finds the change events of its own range. Returns (boxes per job, chosen
+    # captures or None).
+    video_path, jobs, backend, prev_times, windows = args
+    chosen = None
+    if windows is not None:
+        chosen = find_job_captures(video_path, jobs, windows, backend, seek_to_first=True)
+        if chosen is not None:
+            jobs, prev_times = captured_jobs(jobs, chosen)
+    return extract_plan_frames(video_path, jobs, seek_to_first=True, backend=backend, prev_times=prev_times), chosen
+
+def split_jobs_by_time(jobs, workers):
+    # Splits the jobs into contiguous time ranges, one per worker.
+    # Returns lists of job indexes, each sorted by time.
+    order = sorted(range(len(jobs)), key=lambda i: jobs[i][0])
+    workers = max(1, min(workers, len(order)))
+    chunk_size, extra = divmod(len(order), workers)
+    chunks = []
+    start = 0
+    for w in range(workers):
+        end = start + chunk_size + (1 if w < extra else 0)
+        chunks.append(order[start:end])
+        start = end
+    return chunks
+
+# How often the parent checks for cancellation while worker processes extract
+CANCEL_POLL_SEC = 0.25
+
+def extract_plan_frames_parallel(video_path, jobs, workers, backend=DEFAULT_BACKEND, progress=None, prev_times=None,
+                                 windows=None):
+    # Same result as extract_plan_frames, but every worker process decodes only its
+    # own time range. Results are put back in plan order.
+    # windows: event capture windows of the jobs (capture_windows of the whole plan);
+    # the change events are then found too, by every worker for its own range.
+    if workers <= 1 or len(jobs) < 2:
+        if windows is not None:
+            jobs, prev_times = capture_jobs(video_path, jobs, windows, backend, progress)
+        return extract_plan_frames(video_path, jobs, backend=backend, progress=progress, prev_times=prev_times)
+    
+    if prev_times is None:
+        prev_times = [previous_frame_time(t) for t, _ in jobs]
+    chunks = split_jobs_by_time(jobs, workers)
+    tasks = [(video_path, [jobs[i] for i in chunk], backend, [prev_times[i] for i in chunk],
+              [windows[i] for i in chunk] if windows is not None else None) for chunk in chunks]
+    
+    results = [False] * len(jobs)
+    chosen = [None] * len(jobs)
+    opened = True
+    executor = ProcessPoolExecutor(max_workers=len(chunks))
+    cancelled = False
+    try:
+        pending = {executor.submit(_extract_range_worker, task): chunk for task, chunk in zip(tasks, chunks)}
+        while pending:
+            done, _ = wait(pending, timeout=CANCEL_POLL_SEC, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = pending.pop(future)
+                boxes_list, chunk_chosen = future.result()
+                for i, boxes in zip(chunk, boxes_list):
+                    results[i] = boxes
+                if chunk_chosen is None:
+                    opened = False
+                else:
+                    for i, capture in zip(chunk, chunk_chosen):
+                        chosen[i] = capture
+                if progress is not None:
+                    progress.advance(len(chunk))
+            if progress is not None:
+                progress.check()
+    except BuildCancelled:
+        cancelled = True
+        raise
+    finally:
+        # When cancelled, the running ranges are not waited for; their images are never used
+        executor.shutdown(wait=not cancelled, cancel_futures=cancelled)
+    if windows is not None and opened:
+        report_captures(chosen)
+    return results
+
+def find_job_captures(video_path, jobs, windows, backend=DEFAULT_BACKEND, progress=None, timeline=None,
+                      seek_to_first=False):
+    # (capture time, previous frame time) chosen by change_events for every job, None for
+    # the steps without any change; None altogether when the video cannot be opened.
+    # seek_to_first: seek to the first window (a worker's range) instead of decoding from 0.
+    # With an activity timeline nothing is decoded here.
+    if timeline is not None:
+        return [timeline.capture_times(t, window) for (t, _), window in zip(jobs, windows)]
+    source = open_frame_source(video_path, backend)
+    if not source.is_opened():
+        return None
+    try:
+        return find_capture_times(source, [t for t, _ in jobs], windows, progress=progress,
+                                  seek_to_first=seek_to_first)
+    finally:
+        source.release()
+
+def captured_jobs(jobs, chosen):
+    # The jobs moved to their chosen frames, and the time of their "previous" frames.
+    # Steps without any change keep the fixed offsets.
+    moved_jobs, prev_times = [], []
+    for (time_sec, output_path), capture in zip(jobs, chosen):
+        if capture is None:
+            moved_jobs.append((time_sec, output_path))
+            prev_times.append(previous_frame_time(time_sec))
+        else:
+            moved_jobs.append((capture[0], output_path))
+            prev_times.append(capture[1])
+    return moved_jobs, prev_times
+
+def report_captures(chosen):
+    found = sum(c is not None for c in chosen)
+    print(f"Change events: {found} of {len(chosen)} steps captured after their change "
+          f"({len(chosen) - found} with fixed offsets)")
+
+def capture_jobs(video_path, jobs, windows, backend=DEFAULT_BACKEND, progress=None, timeline=None):
+    # Event capture: the jobs moved to the frames chosen by change_events, and the time
+    # of their "previous" frames (None, jobs unchanged, if the video cannot be opened)
+    chosen = find_job_captures(video_path, jobs, windows, backend, progress, timeline)
+    if chosen is None:
+        return jobs, None
+    report_captures(chosen)
+    return captured_jobs(jobs, chosen)
+
+def frame_cache_keys(cache, video_path, jobs, params, windows=None):
+    # Event capture depends on the window too, not only on the plan time
+    key_times = [[t, lo, hi] for (t, _), (lo, hi) in zip(jobs, windows)] if windows is not None \
+        else [t for t, _ in jobs]
+    return [cache.make_key(video_path, kt, params, REDBOX_VERSION) for kt in key_times]
+
+def extract_plan_frames_cached(video_path, jobs, workers=1, cache=None, backend=DEFAULT_BACKEND, progress=None,
+                               capture="fixed", windows=None, timeline=None):
+    # Serves unchanged steps from the frame cache and extracts only the rest.
+    # capture="events": frames chosen by change_events in windows around the plan times
+    # (default: capture_windows of these jobs; whole-plan builds pass the windows of the
+    # whole plan so every batch picks the same frames).
+    # timeline: activity_timeline.ActivityTimeline answering the event capture (or None)
+    params = extraction_params(backend, capture, timeline)
+    if capture == "events" and windows is None:
+        windows = capture_windows([t for t, _ in jobs])
+    
+    results = [None] * len(jobs)
+    keys = None
+    if cache is not None:
+        keys = frame_cache_keys(cache, video_path, jobs, params, windows if capture == "events" else None)
+        results = [cache.get(key, output_path) for key, (_, output_path) in zip(keys, jobs)]
+    
+    missing = [i for i, boxes in enumerate(results) if boxes is None]
+    if progress is not None and len(missing) < len(jobs):
+        progress.advance(len(jobs) - len(missing))
+    if missing:
+        todo = [jobs[i] for i in missing]
+        prev_times = None
+        todo_windows = None
+        if capture == "events":
+            todo_windows = [windows[i] for i in missing]
+            if timeline is not None:
+                # Answered by the timeline without decoding: nothing to parallelize
+                todo, prev_times = capture_jobs(video_path, todo, todo_windows, backend, progress, timeline)
+                todo_windows = None
+        # Without a timeline the windows are scanned by the extraction itself (in every
+        # worker for its own range with workers > 1)
+        extracted = extract_plan_frames_parallel(video_path, todo, workers, backend, progress, prev_times,
+                                                 todo_windows)
+        for i, boxes in zip(missing, extracted):
+            results[i] = boxes
+            if keys is not None and boxes is not False:
+                cache.put(keys[i], jobs[i][1], boxes)
+    return results
+
+def reuse_previous_images(jobs, previous, windows=None):
+    # Returns the boxes of every job that can reuse an image of the previous build
+    # (None for the ones that must be extracted). Images that moved to a new file
+    # name are read before anything is written, so renames never clobber a source.
+    # windows: event capture windows of the jobs; a step whose neighbours moved may
+    # capture another change, so its window must match too.
+    results = [None] * len(jobs)
+    copies = []
+    for i, (time_sec, img_path) in enumerate(jobs):
+        entry = previous.get(time_sec)
+        if entry is None:
+            continue
+        if windows is not None and entry.get("window") != list(windows[i]):
+            continue
+        if entry["image"] != img_path:
+            with open(entry["image"], 'rb') as f:
+                copies.append((img_path, f.read()))
+        results[i] = [tuple(b) for b in entry["boxes"]]
+    for img_path, data in copies:
+        with open(img_path, 'wb') as f:
+            f.write(data)
+    return results
+
+def staged_step_results(video_path, jobs, step_boxes, cache=None, backend=DEFAULT_BACKEND, capture="fixed",
+                        windows=None, timeline=None, image_format="auto", dpi=DEFAULT_DPI, embed_dir=None,
+                        threads=PIPELINE_VISION_THREADS, encoder_threads=PIPELINE_ENCODER_THREADS, progress=None):
+    # The step images built by overlapping stages (staged_pipeline.py): one thread decodes
+    # the video, `threads` threads detect and draw the red boxes, `encoder_threads` threads
+    # write and optimize the images, while the caller adds finished steps to the document.
+    # Yields (boxes or False, embed path) for every job, in job order.
+    # step_boxes: boxes of the jobs whose image is already on disk (incremental builds),
+    # None for the others.
+    embed_dir = embed_dir or EMBED_DIR
+    params = extraction_params(backend, capture, timeline)
+    known = list(step_boxes)
+    keys = None
+    if cache is not None:
+        keys = frame_cache_keys(cache, video_path, jobs, params, windows if capture == "events" else None)
+        for i, (_, output_path) in enumerate(jobs):
+            if known[i] is None:
+                known[i] = cache.get(keys[i], output_path)
+    todo = [i for i, boxes in enumerate(known) if boxes is None]
+    todo_jobs = [jobs[i] for i in todo]
+    prev_times = None
+    if capture == "events" and todo:
+        todo_jobs, prev_times = capture_jobs(video_path, todo_jobs, [windows[i] for i in todo], backend, progress,
+                                             timeline)
+    extracted = set(todo)
+    
+    def source():
+        # Images already on disk only need encoding; the others come from the decoder
+        for i, boxes in enumerate(known):
+            if boxes is not None:
+                yield i, (jobs[i][1], None, None, boxes)
+        for k, frame_curr, frame_prev in iter_step_frames(video_path, todo_jobs, prev_times, backend=backend):
+            yield todo[k], (jobs[todo[k]][1], frame_curr, frame_prev, None)
+    
+    def vision(item):
+        output_path, frame_curr, frame_prev, boxes = item
+        if frame_curr is None:
+            return output_path, None, boxes
+        with timings.stage("render", image=os.path.basename(output_path)):
+            image, boxes = draw_step_image(frame_curr, frame_prev)
+        return output_path, image, boxes
+    
+    def encode(item):
+        output_path, image, boxes = item
+        name = os.path.basename(output_path)
+        if image is not None:
+            with timings.stage("image write", image=name):
+                ok, data = cv2.imencode(".jpg", image)
+                with open(output_path, 'wb') as f:
+                    f.write(data.tobytes())
+                # Optimized from the JPEG pixels, exactly as from the file (a sequential or
+                # cached build gives the same embedded image), without reading it back
+                image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        with timings.stage("optimize", image=name):
+            try:
+                return boxes, optimize_image(output_path, embed_dir, image_format, dpi, image=image)
+            except Exception as e:
+                print(f"Image optimize error ({output_path}): {e}")
+                return boxes, (output_path, 0, 0)
+    
+    results = staged_results(source(), [(vision, threads), (encode, encoder_threads)], len(jobs),
+                             check=progress.check if progress is not None else None)
+    total_before = total_after = 0
+    try:
+        for i, result in enumerate(results):
+            if result is None:
+                yield False, None
+                continue
+            boxes, (embed_path, before, after) = result
+            if keys is not None and i in extracted:
+                cache.put(keys[i], jobs[i][1], boxes)
+            if before and image_format != "original":
+                total_before += before
+                total_after += after
+                print(f"  {os.path.basename(jobs[i][1])} -> {os.path.basename(embed_path)}: "
+                      f"{before / 1024:.0f} KB -> {after / 1024:.0f} KB ({(before - after) / 1024:.0f} KB saved)")
+            yield boxes, embed_path
+    finally:
+        results.close()
+    if total_before:
+        print(f"Images: {total_before / 1048576:.1f} MB -> {total_after / 1048576:.1f} MB "
+              f"({100.0 * (total_before - total_after) / total_before:.0f}% saved)")
+
+TEMPLATE_FILE = r"..\Çoklu Para Birimi Sihirbazı Kullanıcı Dokümanı.docx"
+IMG_DIR = "final_images"
+# Resampled/re-encoded copies that actually go into the .docx
+EMBED_DIR = os.path.join(IMG_DIR, "embed")
+
+# Every build in this process (GUI runs, batch jobs) starts from a copy of the
+# template cleaned once
+prepared_templates = TemplateCache(clean_and_prepare_template)
+
+DOCUMENT_TITLE = "El Terminali WMS Kullanım Kılavuzu"
+
+def prepare_template_document(template_file=TEMPLATE_FILE):
     # Load and Clean Template
-    template_file = r"..\Çoklu Para Birimi Sihirbazı Kullanıcı Dokümanı.docx"
-    doc, anchor_element = clean_and_prepare_template(template_file)
+    doc, anchor_element = prepared_templates.get(template_file)
     
     # Update Title
     for p in doc.paragraphs[:30]:
         if "Çoklu Para Birimi" in p.text or "Sihirbazı" in p.text:
             print(f"Updating Title: {p.text}")
-            p.text = "El Terminali WMS Kullanım Kılavuzu"
+            p.text = DOCUMENT_TITLE
     
     # Setup Styles (Enforcing calibration just in case)
     # set_aifteam_styles(doc) # Template likely has them, but we can re-apply/ensure
@@ -257,12 +663,68 @@ def create_doc_from_plan(video_path, plan_path, output_docx):
         row.cells[1].text = datetime.now().strftime("%d.%m.%Y")
         row.cells[2].text = 'Otomasyon (Jules)'
         row.cells[3].text = 'El Terminali Eğitimi'
+    
+    return doc, anchor_element
 
-    # Content Body
-    img_dir = "final_images"
+def plan_step_jobs(steps, img_dir=IMG_DIR):
+    # (time_sec, image path) for every step of the plan, numbered from 1
     if not os.path.exists(img_dir):
         os.makedirs(img_dir)
+    jobs = []
+    for item in steps:
+        time_sec = item['time']
+        img_name = f"step_{len(jobs) + 1}_{int(time_sec)}.jpg"
+        jobs.append((time_sec, os.path.join(img_dir, img_name)))
+    return jobs
+
+def add_step_text(doc, item, box_count):
+    # Add Text
+    p = doc.add_paragraph(item['text'])
+    
+    # Update text with references if boxes found
+    if box_count and box_count > 0:
+        refs = ", ".join([f"Kutu {i+1}" for i in range(box_count)])
+        if box_count == 1:
+            p.add_run(f" (Bkz: Kutu 1)")
+        else:
+            p.add_run(f" (Bkz: {refs})")
+    return p
+
+def add_step_caption(doc, step_counter):
+    caption = doc.add_paragraph(f"Ekran Görüntüsü {step_counter}")
+    caption.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+    # caption.style = "Caption" # Style might not exist in template
+    caption.runs[0].font.italic = True
+    caption.runs[0].font.size = Pt(10)
+    return caption
+
+def create_doc_from_plan(video_path, plan_path, output_docx, workers=1, use_cache=True, incremental=False,
+                         image_format="auto", dpi=DEFAULT_DPI, backend=DEFAULT_BACKEND,
+                         template_file=TEMPLATE_FILE, img_dir=IMG_DIR, on_progress=None, cancel=None,
+                         capture=DEFAULT_CAPTURE, use_timeline=False, pipeline=False,
+                         threads=PIPELINE_VISION_THREADS):
+    # Builds the document and returns the number of steps that got an image (0 when
+    # nothing could be extracted, e.g. an unreadable video).
+    # template_file may also be a file-like object holding the .docx.
+    # capture: "events" (frames after the on-screen change near every step) or "fixed".
+    # use_timeline: find the events on the video's activity timeline (built once and
+    # stored next to the video) instead of scanning the windows on every build.
+    # pipeline: decode, red-box detection (`threads` threads), image encoding and the docx
+    # writer run at the same time (staged_step_results); progress then reports them as
+    # one "extract" stage. workers only applies to the sequential build.
+    # on_progress: called with a progress.ProgressEvent after every step of every stage.
+    # cancel: a progress.CancelToken; once cancelled, BuildCancelled is raised within one
+    # step and output_docx is left untouched (the document is only written at the end).
+    progress = ProgressReporter(on_progress, cancel)
+    # Load Plan
+    with open(plan_path, 'r', encoding='utf-8') as f:
+        plan = json.load(f)
         
+    progress.begin("template", 1)
+    with timings.stage("template"):
+        doc, anchor_element = prepare_template_document(template_file)
+
+    # Content Body
     step_counter = 1
     
     # Helper to insert before anchor
@@ -270,63 +732,189 @@ def create_doc_from_plan(video_path, plan_path, output_docx):
         if anchor_element is not None:
              anchor_element.addprevious(element)
     
-    for item in plan:
-        if item['type'] == 'heading':
-            h = doc.add_heading(item['text'], level=item['level'])
-            add_element_before_anchor(h._element)
+    # Extract and render every step image up front, in one pass over the video
+    steps = [item for item in plan if item['type'] == 'step']
+    jobs = plan_step_jobs(steps, img_dir)
+    windows = capture_windows([t for t, _ in jobs]) if capture == "events" else None
+    
+    video_exists = os.path.exists(video_path)
+    cache = FrameCache() if use_cache and video_exists else None
+    timeline = None
+    if use_timeline and capture == "events" and video_exists:
+        with timings.stage("timeline"):
+            timeline = load_timeline(video_path, backend, progress=progress)
+    
+    # Incremental mode: steps whose time did not move keep the previous build's image
+    manifest_file = manifest_path_for(output_docx)
+    signature = None
+    step_boxes = [None] * len(jobs)
+    if video_exists:
+        signature = build_signature(video_fingerprint(video_path), extraction_params(backend, capture, timeline), REDBOX_VERSION)
+    if incremental and signature is not None:
+        manifest = load_manifest(manifest_file)
+        unchanged, edited, added = diff_summary(manifest, steps)
+        print(f"Incremental build: {unchanged} unchanged, {edited} edited, {added} new/moved steps")
+        step_boxes = reuse_previous_images(jobs, reusable_steps(manifest, signature), windows)
+    
+    todo = [i for i, boxes in enumerate(step_boxes) if boxes is None]
+    if pipeline:
+        progress.begin("extract", len(jobs))
+        print(f"Building {len(todo)} steps in a staged pipeline ({threads} detection threads)...")
+        # The stages start with the first step below and run while the steps are written
+        step_results = staged_step_results(video_path, jobs, step_boxes, cache, backend, capture, windows, timeline,
+                                           image_format, dpi, os.path.join(img_dir, "embed"), threads,
+                                           progress=progress)
+    else:
+        progress.begin("extract", len(jobs), len(jobs) - len(todo))
+        if workers > 1:
+            print(f"Extracting {len(todo)} steps with {workers} worker processes...")
+        else:
+            print(f"Extracting {len(todo)} steps in a single pass over the video...")
+        with timings.stage("extract"):
+            extracted = extract_plan_frames_cached(video_path, [jobs[i] for i in todo], workers, cache, backend,
+                                                   progress, capture, [windows[i] for i in todo] if windows else None,
+                                                   timeline)
+        for i, boxes in zip(todo, extracted):
+            step_boxes[i] = boxes
+        
+        print("Optimizing images for embedding...")
+        progress.begin("optimize", len(jobs))
+        with timings.stage("optimize"):
+            embed_paths = optimize_images([img_path if boxes is not False else None
+                                           for (_, img_path), boxes in zip(jobs, step_boxes)],
+                                          os.path.join(img_dir, "embed"), image_format, dpi, progress=progress)
+        step_results = zip(step_boxes, embed_paths)
+        
+        progress.begin("embed", len(jobs))
+    
+    try:
+        for item in plan:
+            if item['type'] == 'heading':
+                h = doc.add_heading(item['text'], level=item['level'])
+                add_element_before_anchor(h._element)
             
-        elif item['type'] == 'step':
-            # Add Text
-            p = doc.add_paragraph(item['text'])
-            add_element_before_anchor(p._element)
+            elif item['type'] == 'step':
+                # Add Image (extracted above, or finished by the pipeline stages meanwhile)
+                time_sec, img_path = jobs[step_counter - 1]
+                boxes, embed_path = next(step_results)
+                step_boxes[step_counter - 1] = boxes
             
-            # Extract and Add Image
-            time_sec = item['time']
-            img_name = f"step_{step_counter}_{int(time_sec)}.jpg"
-            img_path = os.path.join(img_dir, img_name)
+                print(f"Processing Step {step_counter}: {item['text'][:30]}... at {time_sec}s")
             
-            print(f"Processing Step {step_counter}: {item['text'][:30]}... at {time_sec}s")
+                box_count = len(boxes) if boxes is not False else False
             
-            box_count = extract_frame_with_redbox(video_path, time_sec, img_path)
+                with timings.stage("embed", image=os.path.basename(img_path)):
+                    p = add_step_text(doc, item, box_count)
+                    add_element_before_anchor(p._element)
+
+                    if box_count is not False: # extract returns count or False
+                        try:
+                            # Adding picture is tricky because access to the paragraph element created by add_picture is encapsulated
+                            # doc.add_picture APPENDS a paragraph with the run.
+                            # We can use doc.add_paragraph() then run.add_picture?
+                        
+                            pic_p = doc.add_paragraph()
+                            pic_p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+                            run = pic_p.add_run()
+                            run.add_picture(embed_path, width=Inches(6))
+                            add_element_before_anchor(pic_p._element)
+
+                            caption = add_step_caption(doc, step_counter)
+                            add_element_before_anchor(caption._element)
+                        
+                        except Exception as e:
+                            print(f"Error adding image: {e}")
             
-            # Update text with references if boxes found
-            if box_count and box_count > 0:
-                refs = ", ".join([f"Kutu {i+1}" for i in range(box_count)])
-                if box_count == 1:
-                    p.add_run(f" (Bkz: Kutu 1)")
-                else:
-                    p.add_run(f" (Bkz: {refs})")
-
-            if box_count is not False: # extract returns count or False
-                try:
-                    # Adding picture is tricky because access to the paragraph element created by add_picture is encapsulated
-                    # doc.add_picture APPENDS a paragraph with the run.
-                    # We can use doc.add_paragraph() then run.add_picture?
-                    
-                    pic_p = doc.add_paragraph()
-                    pic_p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-                    run = pic_p.add_run()
-                    run.add_picture(img_path, width=Inches(6))
-                    add_element_before_anchor(pic_p._element)
-
-                    caption = doc.add_paragraph(f"Ekran Görüntüsü {step_counter}")
-                    caption.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-                    # caption.style = "Caption" # Style might not exist in template
-                    caption.runs[0].font.italic = True
-                    caption.runs[0].font.size = Pt(10)
-                    add_element_before_anchor(caption._element)
-                    
-                except Exception as e:
-                    print(f"Error adding image: {e}")
+                step_counter += 1
+                progress.advance()
             
-            step_counter += 1
+    finally:
+        if pipeline:
+            # Stops the stage threads when the build fails or is cancelled
+            step_results.close()
             
-    doc.save(output_docx)
+    progress.begin("save", 1)
+    with timings.stage("save"):
+        # Written next to the output and renamed, so the output is never half-written
+        tmp_docx = output_docx + ".tmp"
+        doc.save(tmp_docx)
+        os.replace(tmp_docx, output_docx)
     print(f"Successfully saved {output_docx}")
+    
+    if signature is not None:
+        entries = []
+        for i, (item, (time_sec, img_path), boxes) in enumerate(zip(steps, jobs, step_boxes)):
+            if boxes is False:
+                continue
+            entry = {"hash": plan_item_hash(item), "time": time_sec, "image": img_path,
+                     "image_stamp": file_stamp(img_path), "boxes": [list(b) for b in boxes]}
+            if windows is not None:
+                entry["window"] = list(windows[i])
+            entries.append(entry)
+        save_manifest(manifest_file, {"signature": signature, "steps": entries})
+    
+    if cache is not None:
+        cache.evict()
+        print(cache.report())
+    
+    progress.finish(len(jobs))
+    return sum(1 for boxes in step_boxes if boxes is not False)
 
 if __name__ == "__main__":
-    video_file = r"..\1-El Terminali Eğitimi-20250623_092431-Toplantı Kaydı.mp4"
-    plan_file = "content_plan.json"
-    output_file = r"..\Taslak_Dokuman_v7_Styled.docx"
+    parser = argparse.ArgumentParser(description="Builds the user document from a content plan")
+    parser.add_argument("--video", default=r"..\1-El Terminali Eğitimi-20250623_092431-Toplantı Kaydı.mp4")
+    parser.add_argument("--plan", default="content_plan.json")
+    parser.add_argument("--output", default=r"..\Taslak_Dokuman_v7_Styled.docx")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for frame extraction (1 = serial)")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the frame cache")
+    parser.add_argument("--incremental", action="store_true", help="Reuse images of steps unchanged since the last build")
+    parser.add_argument("--stream", action="store_true", help="Bounded-memory build that resumes an interrupted run")
+    parser.add_argument("--image-format", choices=IMAGE_FORMATS, default="auto",
+                        help="Embedded image format (auto picks the smaller of palette PNG and JPEG)")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI, help="Print resolution of the 6 inch wide images")
+    parser.add_argument("--backend", choices=DECODER_BACKENDS, default=DEFAULT_BACKEND,
+                        help="Video decoder (pyav needs: pip install av)")
+    parser.add_argument("--capture", choices=CAPTURE_MODES, default=DEFAULT_CAPTURE,
+                        help="events: capture every step after its on-screen change; fixed: at the plan time")
+    parser.add_argument("--timeline", action="store_true",
+                        help="Find the changes on the video's activity timeline (<video>.timeline.npz, built once)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Overlap decoding, red-box detection, image encoding and the docx writer (threads)")
+    parser.add_argument("--threads", type=int, default=PIPELINE_VISION_THREADS,
+                        help="Red-box detection threads of --pipeline")
+    parser.add_argument("--timings", action="store_true", help="Print count, p50 and p95 of every pipeline stage")
+    parser.add_argument("--trace", metavar="FILE", help="Also write the stage timings as a Chrome trace (JSON)")
+    parser.add_argument("--profile", metavar="FILE", nargs="?", const="",
+                        help="Run under cProfile and print the top functions (and save the stats to FILE)")
+    args = parser.parse_args()
+    
+    def run():
+        if args.stream:
+            from streaming_assembler import create_doc_streaming
+            create_doc_streaming(args.video, args.plan, args.output, workers=args.workers,
+                                 use_cache=not args.no_cache, image_format=args.image_format, dpi=args.dpi,
+                                 backend=args.backend, capture=args.capture, use_timeline=args.timeline)
+        else:
+            create_doc_from_plan(args.video, args.plan, args.output, workers=args.workers,
+                                 use_cache=not args.no_cache, incremental=args.incremental,
+                                 image_format=args.image_format, dpi=args.dpi, backend=args.backend,
+                                 capture=args.capture, use_timeline=args.timeline, pipeline=args.pipeline,
+                                 threads=args.threads)
     
-    create_doc_from_plan(video_file, plan_file, output_file)
+    if args.timings or args.trace:
+        timings.enable()
+    if args.profile is not None:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.runcall(run)
+        if args.profile:
+            profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+    else:
+        run()
+    if timings.enabled:
+        print(timings.report())
+        if args.trace:
+            timings.write_trace(args.trace)
+            print(f"Trace written to {args.trace} (open in chrome://tracing)")
@@ -0,0 +1,189 @@
+import os
+import io
+import sys
+import json
+import glob
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from assembler import TEMPLATE_FILE
+from frame_source import open_frame_source
+
+# Builds one document per training video. Jobs come from a folder (every video with a
+# plan goes through assembler, every video with only a VTT through doc_generator) or
+# from a JSON manifest:
+#   [{"video": "a.mp4", "plan": "a.json", "output": "a.docx"},
+#    {"video": "b.mp4", "vtt": "b.vtt"}]
+# Jobs run in a process pool; a failing job is reported and the others keep going.
+
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".avi", ".mov")
+SUMMARY_FILE = "batch_summary.json"
+
+def jobs_from_directory(source_dir, output_dir):
+    jobs = []
+    for video in sorted(glob.glob(os.path.join(source_dir, "*"))):
+        if not video.lower().endswith(VIDEO_EXTENSIONS):
+            continue
+        base = os.path.splitext(video)[0]
+        name = os.path.basename(base)
+        job = {"name": name, "video": video, "output": os.path.join(output_dir, name + ".docx")}
+        for plan in (base + ".plan.json", base + ".json"):
+            if os.path.exists(plan):
+                job["plan"] = plan
+                break
+        else:
+            if os.path.exists(base + ".vtt"):
+                job["vtt"] = base + ".vtt"
+            else:
+                print(f"Skipping {video}: no plan (.plan.json/.json) or .vtt next to it")
+                continue
+        jobs.append(job)
+    return jobs
+
+def jobs_from_manifest(manifest_path, output_dir):
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    root = os.path.dirname(os.path.abspath(manifest_path))
+    jobs = []
+    for entry in entries:
+        job = {k: os.path.join(root, v) for k, v in entry.items() if k in ("video", "plan", "vtt", "output")}
+        name = os.path.splitext(os.path.basename(job["video"]))[0]
+        job["name"] = entry.get("name", name)
+        job.setdefault("output", os.path.join(output_dir, job["name"] + ".docx"))
+        jobs.append(job)
+    return jobs
+
+# Per worker process: the template is read from disk once and reused by every job
+_template_bytes = None
+
+def _init_worker(template_bytes):
+    global _template_bytes
+    _template_bytes = template_bytes
+
+def run_job(job, options):
+    # Runs in a worker process. Never raises: errors are returned in the result.
+    result = {"name": job["name"], "video": job["video"], "output": job["output"],
+              "mode": "plan" if "plan" in job else "vtt", "status": "ok", "steps": 0, "error": None}
+    start = time.perf_counter()
+    try:
+        out_dir = os.path.dirname(job["output"]) or "."
+        os.makedirs(out_dir, exist_ok=True)
+        img_dir = os.path.join(out_dir, job["name"] + "_images")
+        if not os.path.exists(job["video"]):
+            raise FileNotFoundError(f"Video not found: {job['video']}")
+        # Both builders only print decoder errors and carry on without frames
+        source = open_frame_source(job["video"], options["backend"])
+        opened = source.is_opened()
+        source.release()
+        if not opened:
+            raise RuntimeError(f"Cannot open video: {job['video']}")
+        if "plan" in job:
+            from assembler import create_doc_from_plan
+            template = io.BytesIO(_template_bytes) if _template_bytes is not None else options["template"]
+            result["steps"] = create_doc_from_plan(job["video"], job["plan"], job["output"],
+                                                   use_cache=options["use_cache"], backend=options["backend"],
+                                                   template_file=template, img_dir=img_dir)
+            with open(job["plan"], 'r', encoding='utf-8') as f:
+                plan_steps = sum(1 for item in json.load(f) if item['type'] == 'step')
+            if plan_steps and not result["steps"]:
+                raise RuntimeError(f"No step got a frame from the video ({plan_steps} steps in the plan)")
+        else:
+            from doc_generator import create_document
+            result["steps"] = create_document(job["video"], job["vtt"], job["output"],
+                                              backend=options["backend"], img_dir=img_dir) or 0
+            if not os.path.exists(job["output"]):
+                raise RuntimeError("No document was written")
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["traceback"] = traceback.format_exc()
+    result["duration"] = round(time.perf_counter() - start, 2)
+    return result
+
+def run_batch(jobs, workers=2, template_file=TEMPLATE_FILE, use_cache=True, backend="opencv"):
+    # Runs every job and returns their results in job order.
+    # At most `workers` jobs are in flight; if a worker process dies (e.g. a decoder crash
+    # on a broken video) the jobs it took down are marked failed and a new pool continues.
+    options = {"template": template_file, "use_cache": use_cache, "backend": backend}
+    template_bytes = None
+    if any("plan" in job for job in jobs):
+        try:
+            with open(template_file, 'rb') as f:
+                template_bytes = f.read()
+        except OSError as e:
+            print(f"Warning: template not readable ({e}), plan jobs will fail")
+
+    results = [None] * len(jobs)
+    pending = list(range(len(jobs)))
+    while pending:
+        with ProcessPoolExecutor(max_workers=max(1, workers), initializer=_init_worker,
+                                 initargs=(template_bytes,)) as executor:
+            in_flight = {}
+            broken = False
+            while (pending or in_flight) and not broken:
+                while pending and len(in_flight) < max(1, workers):
+                    i = pending.pop(0)
+                    in_flight[executor.submit(run_job, jobs[i], options)] = i
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = in_flight.pop(future)
+                    try:
+                        results[i] = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        results[i] = {"name": jobs[i]["name"], "video": jobs[i]["video"],
+                                      "output": jobs[i]["output"], "status": "failed", "steps": 0,
+                                      "duration": None, "error": "Worker process crashed"}
+                    print(f"[{sum(r is not None for r in results)}/{len(jobs)}] {results[i]['name']}: "
+                          f"{results[i]['status']}")
+            if broken:
+                for future, i in in_flight.items():
+                    results[i] = {"name": jobs[i]["name"], "video": jobs[i]["video"],
+                                  "output": jobs[i]["output"], "status": "failed", "steps": 0,
+                                  "duration": None, "error": "Worker process crashed"}
+    return results
+
+def print_summary(results):
+    print(f"\n{'Job':<40} {'Status':<8} {'Steps':>5} {'Time':>8}")
+    for r in results:
+        duration = f"{r['duration']:.1f}s" if r.get("duration") is not None else "-"
+        print(f"{r['name'][:40]:<40} {r['status']:<8} {r['steps']:>5} {duration:>8}")
+        if r["error"]:
+            print(f"    {r['error']}")
+    failed = sum(r["status"] != "ok" for r in results)
+    print(f"{len(results) - failed} ok, {failed} failed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds documents for a folder or manifest of training videos")
+    parser.add_argument("source", help="Folder of videos (with .plan.json/.json or .vtt next to them) or a JSON manifest")
+    parser.add_argument("--output-dir", default="batch_output")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Documents built in parallel")
+    parser.add_argument("--template", default=TEMPLATE_FILE)
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the frame cache")
+    parser.add_argument("--backend", default="opencv", help="Video decoder (opencv or pyav)")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.source):
+        batch_jobs = jobs_from_directory(args.source, args.output_dir)
+    else:
+        batch_jobs = jobs_from_manifest(args.source, args.output_dir)
+    if not batch_jobs:
+        print("No jobs found.")
+        sys.exit(1)
+
+    print(f"Building {len(batch_jobs)} documents with {args.workers} workers...")
+    start = time.perf_counter()
+    batch_results = run_batch(batch_jobs, args.workers, args.template, not args.no_cache, args.backend)
+    print_summary(batch_results)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    summary_path = os.path.join(args.output_dir, SUMMARY_FILE)
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump({"total_seconds": round(time.perf_counter() - start, 2), "jobs": batch_results},
+                  f, ensure_ascii=False, indent=1)
+    print(f"Summary written to {summary_path}")
+    sys.exit(1 if any(r["status"] != "ok" for r in batch_results) else 0)
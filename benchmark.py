@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import shutil
+import platform
+import argparse
+import subprocess
+import contextlib
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import scene_scoring
+from docx import Document
+
+from assembler import (detect_redboxes, previous_frame_time, create_doc_from_plan, REDBOX_LOOKBACK_SEC, REDBOX_PARAMS,
+                       DOCUMENT_TITLE)
+from frame_source import open_frame_source, DEFAULT_BACKEND, BACKENDS
+from pipeline_timing import timings
+from synthetic_video import RESOLUTIONS, generate_dataset, script_events, write_vtt, make_template, score_detections
+from text_normalizer import TextNormalizer
+from vtt_reader import iter_cues
+
+# Offline benchmark on synthetic SAP-like recordings (synthetic_video.py). Each stage is
+# timed on its own: frame extraction, red-box detection, scene detection, text cleaning
+# and docx assembly. Results go to a JSON file; --compare prints the change against an
+# earlier result file:
+#   python benchmark.py --output new.json --compare benchmark_results.json
+DATA_DIR = "bench_data"
+RESULTS_FILE = "benchmark_results.json"
+TEXT_CUES = 20000
+
+def best_of(repeat, fn):
+    # Smallest wall time of `repeat` runs and the result of the last one
+    best = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def plan_times(plan_path):
+    with open(plan_path, 'r', encoding='utf-8') as f:
+        steps = [item['time'] for item in json.load(f) if item['type'] == 'step']
+    return steps, sorted(set(steps + [previous_frame_time(t) for t in steps]))
+
+def bench_frame_extraction(paths, backend, repeat):
+    # Decoding every frame a plan needs (step and "previous" frames) in one pass
+    _, times = plan_times(paths["plan"])
+
+    def run():
+        source = open_frame_source(paths["video"], backend)
+        count = 0
+        for _, frame in source.iter_frames(times):
+            frame.bgr()
+            count += 1
+        source.release()
+        return count
+
+    seconds, frames = best_of(repeat, run)
+    return {"seconds": seconds, "frames": frames, "per_frame_ms": seconds / max(1, frames) * 1000}
+
+def bench_redbox_detection(paths, truth, backend, repeat):
+    # detect_redboxes alone (decoding excluded) and its accuracy against the scripted events
+    steps, times = plan_times(paths["plan"])
+    pairs = []
+    frames = {}
+    source = open_frame_source(paths["video"], backend)
+    for t, frame in source.iter_frames(times):
+        frames[t] = frame.bgr()
+        if t in steps:
+            pairs.append((frames[t], frames.get(previous_frame_time(t))))
+        for old in [k for k in frames if k < t - REDBOX_LOOKBACK_SEC - 0.01]:
+            del frames[old]
+    source.release()
+
+    def run():
+        return [detect_redboxes(curr, prev) if prev is not None else [] for curr, prev in pairs]
+
+    seconds, boxes = best_of(repeat, run)
+    recall, precision = score_detections(boxes, truth)
+    return {"seconds": seconds, "steps": len(pairs), "per_step_ms": seconds / max(1, len(pairs)) * 1000,
+            "boxes": sum(len(b) for b in boxes), "recall": round(recall, 3), "precision": round(precision, 3)}
+
+def bench_scene_detection(paths, backend, repeat):
+    # doc_generator's loop: every cue's frame compared with the last scene's frame.
+    # The reference cuts are the old full-frame comparison (calculate_image_difference
+    # without the disk round trip, full_res_ms); every metric is scored on what the scene
+    # loop keeps of a frame (scene_scoring.scene_signature) and its cuts are checked
+    # against the reference (matches_full_res, only meaningful for absdiff's threshold).
+    cue_times = [(cue.start_ms / 1000.0, None) for cue in iter_cues(paths["vtt"])]
+    result = {"cues": len(cue_times)}
+    thumbs = []
+    full_res_s = 0.0
+    reference_cuts = []
+    absdiff_cuts, absdiff_s = [], 0.0
+    last_ref, last_absdiff = None, None
+    start = time.perf_counter()
+    source = open_frame_source(paths["video"], backend)
+    for t, _, frame in source.iter_aligned(cue_times):
+        if frame is None:
+            continue
+        thumbs.append((t, frame.thumbnail(scene_scoring.THUMB_SIZE)))
+        bgr = frame.bgr()
+        if last_ref is None:
+            reference_cuts.append(t)
+            last_ref = bgr
+        else:
+            t0 = time.perf_counter()
+            value = np.mean(cv2.cvtColor(cv2.absdiff(bgr, last_ref), cv2.COLOR_BGR2GRAY))
+            full_res_s += time.perf_counter() - t0
+            if value > scene_scoring.DEFAULT_THRESHOLDS["absdiff"] and t - reference_cuts[-1] > 4.0:
+                reference_cuts.append(t)
+                last_ref = bgr
+        # absdiff keeps full frames, so it is scored here rather than on the stored thumbnails
+        signature = scene_scoring.scene_signature(frame, "absdiff")
+        t0 = time.perf_counter()
+        changed = last_absdiff is None or (
+            scene_scoring.is_scene_change(scene_scoring.signature_score(last_absdiff, signature, "absdiff"))
+            and t - absdiff_cuts[-1] > 4.0)
+        absdiff_s += time.perf_counter() - t0
+        if changed:
+            absdiff_cuts.append(t)
+            last_absdiff = signature
+    source.release()
+    result["decode_seconds"] = time.perf_counter() - start
+    result["full_res_ms"] = full_res_s / max(1, len(thumbs) - 1) * 1000
+    result["full_res_scene_changes"] = len(reference_cuts)
+
+    def detect(metric):
+        cuts = []
+        last_thumb = None
+        for t, thumb in thumbs:
+            if last_thumb is None or (scene_scoring.is_scene_change(scene_scoring.score(last_thumb, thumb, metric), metric)
+                                      and t - cuts[-1] > 4.0):
+                cuts.append(t)
+                last_thumb = thumb
+        return cuts
+
+    for metric in scene_scoring.METRICS:
+        if metric == "absdiff":
+            seconds, cuts = absdiff_s, absdiff_cuts
+        else:
+            seconds, cuts = best_of(repeat, lambda: detect(metric))
+        result[metric] = {"seconds": seconds, "per_cue_ms": seconds / max(1, len(thumbs)) * 1000,
+                          "scene_changes": len(cuts), "matches_full_res": cuts == reference_cuts}
+    if not result["absdiff"]["matches_full_res"]:
+        print(f"  WARNING: absdiff scene cuts differ from the full-resolution comparison "
+              f"({len(absdiff_cuts)} vs {len(reference_cuts)})")
+    return result
+
+def bench_text_cleaning(data_dir, seconds, repeat, cue_count=TEXT_CUES):
+    # Parsing and cleaning a long transcript: the scripted session's cues repeated
+    vtt_path = os.path.join(data_dir, f"transcript_{seconds:g}s_{cue_count}.vtt")
+    if not os.path.exists(vtt_path):
+        events = script_events(seconds)
+        write_vtt(vtt_path, events, repeat=-(-cue_count // (2 * len(events))), period=seconds)
+    normalizer = TextNormalizer()
+    parse_s, cues = best_of(repeat, lambda: [cue.text for cue in iter_cues(vtt_path)])
+    clean_s, _ = best_of(repeat, lambda: normalizer.clean_batch(cues))
+    return {"cues": len(cues), "parse_seconds": parse_s, "clean_seconds": clean_s,
+            "per_cue_us": clean_s / max(1, len(cues)) * 1e6}
+
+def document_problems(output, template, steps):
+    # What the saved document is missing: the updated title, the new history row (the
+    # template's first table) and one image per step
+    doc, original = Document(output), Document(template)
+    problems = []
+    if not any(p.text == DOCUMENT_TITLE for p in doc.paragraphs):
+        problems.append("title not updated")
+    if original.tables and (not doc.tables or len(doc.tables[0].rows) != len(original.tables[0].rows) + 1):
+        problems.append("history row missing")
+    if len(doc.inline_shapes) != steps:
+        problems.append(f"{len(doc.inline_shapes)} images for {steps} steps")
+    return problems
+
+def bench_docx_assembly(paths, name, data_dir, template, backend):
+    # The whole create_doc_from_plan (no frame cache), split by the pipeline_timing stages
+    output = os.path.join(data_dir, f"{name}.docx")
+    img_dir = os.path.join(data_dir, f"{name}_images")
+    # A cold build: embed files of an earlier run would be reused
+    shutil.rmtree(os.path.join(img_dir, "embed"), ignore_errors=True)
+    timings.enable()
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        steps = create_doc_from_plan(paths["video"], paths["plan"], output, use_cache=False, backend=backend,
+                                     template_file=template, img_dir=img_dir)
+    total = time.perf_counter() - start
+    summary = timings.summary()
+    timings.disable()
+    stage_seconds = {stage: round(summary[stage]["total"], 4)
+              for stage in ("template", "extract", "optimize", "embed", "save") if stage in summary}
+    assembly = sum(stage_seconds.get(stage, 0.0) for stage in ("template", "embed", "save"))
+    problems = document_problems(output, template, steps)
+    if problems:
+        print(f"  WARNING: {output}: {', '.join(problems)}")
+    return {"seconds": total, "steps": steps, "assembly_seconds": assembly, "stage_seconds": stage_seconds,
+            "docx_bytes": os.path.getsize(output), "document_ok": not problems}
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "opencv": cv2.__version__, "numpy": np.__version__, "commit": commit}
+
+def run_benchmarks(resolutions, seconds=60, fps=10, backend=DEFAULT_BACKEND, repeat=3, data_dir=DATA_DIR):
+    results = {"created": datetime.now().isoformat(timespec="seconds"), "environment": environment(),
+               "settings": {"seconds": seconds, "fps": fps, "backend": backend, "repeat": repeat},
+               "resolutions": {}}
+    os.makedirs(data_dir, exist_ok=True)
+    template = os.path.join(data_dir, "template.docx")
+    if not os.path.exists(template):
+        make_template(template)
+
+    for resolution in resolutions:
+        width, height = RESOLUTIONS[resolution]
+        name = f"sap_{resolution}"
+        print(f"[{resolution}] generating {seconds:g}s synthetic recording...")
+        paths, truth = generate_dataset(data_dir, name, width, height, seconds, fps)
+
+        r = {}
+        print(f"[{resolution}] frame extraction")
+        r["frame_extraction"] = bench_frame_extraction(paths, backend, repeat)
+        print(f"[{resolution}] red-box detection")
+        r["redbox_detection"] = bench_redbox_detection(paths, truth, backend, repeat)
+        print(f"[{resolution}] scene detection")
+        r["scene_detection"] = bench_scene_detection(paths, backend, repeat)
+        print(f"[{resolution}] docx assembly")
+        r["docx_assembly"] = bench_docx_assembly(paths, name, data_dir, template, backend)
+        results["resolutions"][resolution] = r
+
+    print("text cleaning")
+    results["text_cleaning"] = bench_text_cleaning(data_dir, seconds, repeat)
+    return results
+
+COMPARED_KEYS = ("seconds", "_ms", "_us", "recall", "precision")
+
+def _timing_values(node, prefix="", compared=False):
+    # Flattens the timings (keys ending in seconds/_ms/_us, and every value of a
+    # *seconds dict) and the detection accuracy of a result tree
+    values = {}
+    for key, value in node.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            if key not in ("settings", "environment"):
+                values.update(_timing_values(value, path + ".", key.endswith("seconds")))
+        elif isinstance(value, (int, float)) and (compared or key.endswith(COMPARED_KEYS)):
+            values[path] = value
+    return values
+
+def print_results(results):
+    for path, value in _timing_values(results).items():
+        print(f"{path:<60} {value:>12.4f}")
+
+def compare_results(old, new):
+    # Prints every value present in both files with its relative change
+    # (negative = faster, or lower recall/precision)
+    old_values, new_values = _timing_values(old), _timing_values(new)
+    print(f"{'Metric':<60} {'Old':>10} {'New':>10} {'Change':>8}")
+    for path, value in new_values.items():
+        if path not in old_values:
+            continue
+        before = old_values[path]
+        change = f"{(value - before) / before * 100:+.1f}%" if before else "-"
+        print(f"{path:<60} {before:>10.4f} {value:>10.4f} {change:>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the pipeline stages on synthetic screen recordings")
+    parser.add_argument("--resolutions", default="720p,1080p,1440p",
+                        help=f"Comma separated, from {', '.join(RESOLUTIONS)}")
+    parser.add_argument("--seconds", type=float, default=60, help="Length of every synthetic recording")
+    parser.add_argument("--fps", type=int, default=10)
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per micro benchmark (the fastest counts)")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Generated videos, plans and VTTs (reused)")
+    parser.add_argument("--output", default=RESULTS_FILE)
+    parser.add_argument("--compare", metavar="FILE", help="Earlier result file to compare with")
+    args = parser.parse_args()
+
+    resolutions = [r.strip() for r in args.resolutions.split(",") if r.strip()]
+    unknown = [r for r in resolutions if r not in RESOLUTIONS]
+    if unknown:
+        parser.error(f"unknown resolution(s): {', '.join(unknown)}")
+
+    # Read before the run, the output may overwrite it
+    previous = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+
+    results = run_benchmarks(resolutions, args.seconds, args.fps, args.backend, args.repeat, args.data_dir)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=1)
+    print(f"Results written to {args.output}")
+    if previous is not None:
+        compare_results(previous, results)
+    else:
+        print_results(results)
@@ -0,0 +1,65 @@
+import os
+import json
+import hashlib
+
+# A build manifest sits next to the output docx and records, for every step of the
+# plan, what was built: the item hash, its time, the image file and its boxes.
+# The next build reuses the images of steps whose time did not move.
+
+def manifest_path_for(output_docx):
+    return os.path.splitext(output_docx)[0] + ".manifest.json"
+
+def plan_item_hash(item):
+    payload = json.dumps(item, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def file_stamp(path):
+    st = os.stat(path)
+    return [st.st_size, int(st.st_mtime)]
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        print(f"Warning: ignoring unreadable manifest {path}")
+        return None
+
+def save_manifest(path, manifest):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+def build_signature(video_fingerprint, params, version):
+    # Anything that invalidates every image of the previous build.
+    # Round-tripped through JSON so it compares equal to the one loaded from disk.
+    signature = {"video": video_fingerprint, "params": params, "version": version}
+    return json.loads(json.dumps(signature))
+
+def reusable_steps(manifest, signature):
+    # time -> previous step entry, for entries whose image is still on disk untouched
+    if not manifest or manifest.get("signature") != signature:
+        return {}
+    by_time = {}
+    for entry in manifest.get("steps", []):
+        path = entry.get("image")
+        if path and os.path.exists(path) and file_stamp(path) == entry.get("image_stamp"):
+            by_time.setdefault(entry["time"], entry)
+    return by_time
+
+def diff_summary(manifest, items):
+    # Counts of unchanged / edited / added plan items compared to the previous build
+    old_hashes = set(e["hash"] for e in manifest.get("steps", [])) if manifest else set()
+    old_times = set(e["time"] for e in manifest.get("steps", [])) if manifest else set()
+    unchanged = edited = added = 0
+    for item in items:
+        if plan_item_hash(item) in old_hashes:
+            unchanged += 1
+        elif item["time"] in old_times:
+            edited += 1
+        else:
+            added += 1
+    return unchanged, edited, added
@@ -0,0 +1,123 @@
+import sys
+import json
+import numpy as np
+
+from frame_engine import time_to_frame_index
+
+# Chooses the frames of a step from what happens on screen instead of fixed offsets.
+# Plan times come from the narration, so a step is often spoken before the click or
+# while a dialog is still opening. A window around the plan time is scanned on small
+# gray thumbnails; the activity signal (changed pixels between consecutive frames) is
+# computed for the whole window in one vectorized pass. The largest change event in the
+# window wins: its last frame before the change is the reference ("before") frame and
+# the first frame after it has settled is the captured step frame.
+CAPTURE_PARAMS = {
+    "before": 3.0,           # seconds scanned before the plan time
+    "after": 3.0,            # and after it (both clipped halfway to the neighbouring steps)
+    "scan_fps": 10.0,        # frames per second looked at (at most the video's rate)
+    "pixel_threshold": 16,   # gray level change that marks a thumbnail pixel as changed
+    "min_changed": 3,        # changed pixels that make a frame transition active
+    "merge_gap": 0.3,        # active transitions closer than this are one event (animations)
+}
+
+# Large enough for a checkbox tick of a 720p recording to change a few pixels
+ACTIVITY_SIZE = (320, 180)
+
+def capture_windows(plan_times, params=CAPTURE_PARAMS):
+    # (start, end) in seconds of the scanned window of every plan time. Windows stop
+    # halfway to the neighbouring steps, so a step never takes its neighbour's change.
+    order = sorted(set(plan_times))
+    windows = {}
+    for k, t in enumerate(order):
+        lo, hi = t - params["before"], t + params["after"]
+        if k > 0:
+            lo = max(lo, (order[k - 1] + t) / 2)
+        if k + 1 < len(order):
+            hi = min(hi, (t + order[k + 1]) / 2)
+        windows[t] = (max(0.0, lo), hi)
+    return [windows[t] for t in plan_times]
+
+def window_times(window, fps, scan_fps):
+    # Frame times inside the window, every frame or sampled down to scan_fps
+    stride = max(1, int(round(fps / scan_fps)))
+    first = time_to_frame_index(window[0], fps)
+    last = time_to_frame_index(window[1], fps)
+    return [i / fps for i in range(first, last + 1, stride)]
+
+def activity_signal(thumbs, pixel_threshold=CAPTURE_PARAMS["pixel_threshold"]):
+    # Changed pixel count between consecutive thumbnails: (N, h, w) -> (N - 1,)
+    stack = np.asarray(thumbs, dtype=np.int16)
+    return np.count_nonzero(np.abs(np.diff(stack, axis=0)) > pixel_threshold, axis=(1, 2))
+
+def find_change_events(times, activity, params=CAPTURE_PARAMS):
+    # [first, last, strength]: the screen changes from frame `first` to frame `last + 1`;
+    # strength is the total number of changed pixels
+    events = []
+    for i in np.flatnonzero(activity >= params["min_changed"]):
+        if events and times[i] - times[events[-1][1] + 1] <= params["merge_gap"]:
+            events[-1][1] = i
+            events[-1][2] += int(activity[i])
+        else:
+            events.append([i, i, int(activity[i])])
+    return events
+
+def choose_capture(times, activity, plan_time, params=CAPTURE_PARAMS):
+    # (capture time, reference time) for the largest change of the window (the closest
+    # to the plan time among equals), or None if nothing changed
+    events = find_change_events(times, activity, params)
+    if not events:
+        return None
+    first, last, _ = max(events, key=lambda e: (e[2], -abs(times[e[0]] - plan_time)))
+    return times[last + 1], times[first]
+
+def find_capture_times(source, plan_times, windows, params=CAPTURE_PARAMS, progress=None, seek_to_first=False):
+    # One forward pass over the windows of all plan times at thumbnail resolution.
+    # Returns (capture time, reference time) or None for every plan time.
+    # seek_to_first: start with a seek to the first window instead of decoding from frame 0.
+    # Only the thumbnails of windows not yet decided are kept in memory.
+    fps = source.fps
+    per_step = [window_times(w, fps, params["scan_fps"]) for w in windows]
+    order = sorted(range(len(plan_times)), key=lambda i: windows[i])
+    results = [None] * len(plan_times)
+    thumbs = {}
+
+    def decide(i):
+        times = [t for t in per_step[i] if t in thumbs]
+        if len(times) > 1:
+            activity = activity_signal([thumbs[t] for t in times], params["pixel_threshold"])
+            results[i] = choose_capture(times, activity, plan_times[i], params)
+
+    pos = 0
+    wanted = sorted(set(t for times in per_step for t in times))
+    for t, frame in source.iter_frames(wanted, seek_to_first):
+        if progress is not None:
+            progress.check()
+        thumbs[t] = frame.thumbnail(ACTIVITY_SIZE)
+        while pos < len(order) and t >= per_step[order[pos]][-1]:
+            decide(order[pos])
+            pos += 1
+            keep_from = per_step[order[pos]][0] if pos < len(order) else t
+            for old in [k for k in thumbs if k < keep_from]:
+                del thumbs[old]
+    # Windows running past the end of the video
+    while pos < len(order):
+        decide(order[pos])
+        pos += 1
+    return results
+
+if __name__ == "__main__":
+    # Prints the chosen frames of every step of a plan:
+    #   python change_events.py <video> <content_plan.json>
+    from frame_source import open_frame_source
+
+    video_path, plan_path = sys.argv[1], sys.argv[2]
+    with open(plan_path, 'r', encoding='utf-8') as f:
+        plan_times = [item['time'] for item in json.load(f) if item['type'] == 'step']
+    source = open_frame_source(video_path)
+    windows = capture_windows(plan_times)
+    for t, window, chosen in zip(plan_times, windows, find_capture_times(source, plan_times, windows)):
+        if chosen is None:
+            print(f"{t:>8.2f}s  window {window[0]:.2f}-{window[1]:.2f}: no change, fixed offsets")
+        else:
+            print(f"{t:>8.2f}s  window {window[0]:.2f}-{window[1]:.2f}: before {chosen[1]:.2f}s, capture {chosen[0]:.2f}s")
+    source.release()
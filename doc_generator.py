@@ -1,32 +1,19 @@
-import webvtt
 import cv2
 import os
 import sys
 import numpy as np
-import re
 from docx import Document
 from docx.shared import Inches, Pt, RGBColor
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+import scene_scoring
+from text_normalizer import TextNormalizer
+from vtt_reader import iter_cues
+from frame_source import open_frame_source, DEFAULT_BACKEND
+from image_optimizer import optimize_images
+from activity_timeline import load_timeline
 
 # Load environment variables (Removed)
 
-def time_string_to_seconds(time_str):
-    parts = time_str.split(':')
-    seconds = 0.0
-    if len(parts) == 3:
-        seconds += int(parts[0]) * 3600
-        seconds += int(parts[1]) * 60
-        seconds += float(parts[2])
-    elif len(parts) == 2:
-        seconds += int(parts[0]) * 60
-        seconds += float(parts[1])
-    return seconds
-
-def get_frame(cap, time_sec):
-    cap.set(cv2.CAP_PROP_POS_MSEC, time_sec * 1000)
-    ret, frame = cap.read()
-    return ret, frame
-
 def calculate_image_difference(img1_path, img2_path):
     # Returns a percentage difference between two images
     # If images are not same size, returns 100% diff
@@ -39,127 +26,29 @@ def calculate_image_difference(img1_path, img2_path):
     if img1.shape != img2.shape:
         return 100.0
         
-    diff = cv2.absdiff(img1, img2)
-    gray_diff = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY)
-    
-    # Count non-zero pixels or calculate mean
-    score = np.mean(gray_diff)
-    return score
+    return scene_scoring.frame_difference(img1, img2)
 
 
 # ... (OpenCV parts remain same) ...
 
-def clean_text_with_regex(text):
-    # 1. Remove Speaker labels and Timestamps
-    text = re.sub(r'Speaker \d+:', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'Konuşmacı \d+:', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'\d{2}:\d{2}', '', text)
-    
-    # 2. Aggressive Filler Removal
-    fillers = [
-        "arkadaşlar", "şimdi", "burada", "gördüğünüz gibi", 
-        "yani", "efendim", "öncelikle", "şeklinde", "tabii ki",
-        "mesela", "örneğin", "bu noktada", "aslında", "muhakkak",
-        "baktığımızda", "diyebiliriz", "açıkçası", "zaten"
-    ]
-    
-    for filler in fillers:
-        pattern = re.compile(r'\b' + re.escape(filler) + r'\b', re.IGNORECASE)
-        text = pattern.sub('', text)
-        
-    # 3. VERB CONJUGATION TRANSFORMATION (The Core Logic)
-    # Target: Convert "yapıyoruz" (we are doing) to "yapınız" (do it / imperative formal)
-    # or "seçiyoruz" -> "seçiniz"
-    
-    # Common Present Continuous Suffixes in Turkish:
-    # -iyor, -ıyor, -uyor, -üyor
-    # 1st Plural: -iyoruz, -ıyoruz, -uyoruz, -üyoruz
-    # 2nd Plural: -iyorsunuz, ...
-    # Future: -acağız, -eceğiz
-    
-    # Rules:
-    # (word root) + (optional neg) + (suffix)
-    
-    # Map: "iyoruz" -> "iniz", "ıyoruz" -> "ınız", "uyoruz" -> "unuz", "üyoruz" -> "ünüz"
-    
-    replacements = [
-        (r'(\w+)iyoruz\b', r'\1iniz'),
-        (r'(\w+)ıyoruz\b', r'\1ınız'),
-        (r'(\w+)uyoruz\b', r'\1unuz'),
-        (r'(\w+)üyoruz\b', r'\1ünüz'),
-        
-        # Second person plural nuances
-        (r'(\w+)iyorsunuz\b', r'\1iniz'),
-        (r'(\w+)ıyorsunuz\b', r'\1ınız'),
-        (r'(\w+)uyorsunuz\b', r'\1unuz'),
-        (r'(\w+)üyorsunuz\b', r'\1ünüz'),
-        
-        # Basic imperative softener "lütfen" removal if valid, but keeping it is polite? 
-        # Actually corporate docs rarely use "lütfen".
-        
-        # Future tense -> Passive/Formal Future
-        # e.g. "yapacağız" -> "yapılacaktır" (hard to automate perfectly without root analysis)
-        # fallback: "yapacağız" -> "yapınız" might be safer for instructions
-        (r'(\w+)eceğiz\b', r'\1iniz'),
-        (r'(\w+)acağız\b', r'\1ınız'),
-        
-        # "ediyoruz" -> "ediniz" is handled by above generic rules but "etmek" requires care?
-        # "ediyoruz" -> "ed"+"iniz" works.
-        
-        # "basıyoruz" -> "basınız" works.
-        
-        # "girelim" -> "giriniz"
-        (r'(\w+)elim\b', r'\1iniz'),
-        (r'(\w+)alım\b', r'\1ınız'),
-    ]
-    
-    for pattern, repl in replacements:
-        text = re.sub(pattern, repl, text, flags=re.IGNORECASE)
-
-    # 4. Clean up formatting
-    # Fix punctuation spacing
-    text = re.sub(r'\s+([.,!?;:])', r'\1', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    # Capitalize sentences
-    if text:
-        # Split by sentence terminators to capitalize each sentence
-        sentences = re.split(r'([.!?]+)', text)
-        cleaned_sentences = []
-        for s in sentences:
-            s_clean = s.strip()
-            if s_clean and not re.match(r'^[.!?]+$', s_clean):
-                s_clean = s_clean[0].upper() + s_clean[1:]
-                cleaned_sentences.append(s_clean)
-            elif re.match(r'^[.!?]+$', s_clean):
-                if cleaned_sentences:
-                    cleaned_sentences[-1] += s_clean
-                    
-        text = " ".join(cleaned_sentences)
-        
-    return text
-
-def create_document(video_path, vtt_path, output_docx):
+def create_document(video_path, vtt_path, output_docx, scene_metric="absdiff", backend=DEFAULT_BACKEND,
+                    img_dir="extracted_images", use_timeline=False):
+    # Builds the document and returns the number of sections (steps) written
     # No API Key needed
+    # use_timeline: decide the scene cuts on the perceptual hashes of the video's activity
+    # timeline (built once, stored next to the video; scene_metric is then phash) and
+    # decode only the frames of the screenshots
     
-    # 1. Parse Subtitles
+    # 1. Subtitles are streamed: cues are read and cleaned one at a time below
     print(f"Parsing {vtt_path}...")
-    captions = []
-    for caption in webvtt.read(vtt_path):
-        text = caption.text.strip().replace('\n', ' ')
-        start_sec = time_string_to_seconds(caption.start)
-        captions.append({
-            'start': start_sec,
-            'text': text
-        })
+    normalizer = TextNormalizer()
 
     # 2. Scene Detection Logic
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
+    source = open_frame_source(video_path, backend)
+    if not source.is_opened():
         print("Error opening video")
         return
 
-    img_dir = "extracted_images"
     if not os.path.exists(img_dir):
         os.makedirs(img_dir)
 
@@ -167,7 +56,13 @@ def create_document(video_path, vtt_path, output_docx):
     
     final_sections = []
     
-    last_saved_img_path = None
+    timeline = load_timeline(video_path, backend) if use_timeline else None
+    if timeline is not None:
+        scene_metric = "phash"
+    # Screenshots still to be decoded (timeline mode): (time, image path)
+    pending_images = []
+    
+    last_thumb = None
     current_section = {
         'text_buffer': [],
         'image_path': None
@@ -175,33 +70,38 @@ def create_document(video_path, vtt_path, output_docx):
     
     chunk_start_time = 0
     
-    for i, cap_data in enumerate(captions):
-        text = clean_text_with_regex(cap_data['text'])
-        if not text:
-            continue
-            
-        time = cap_data['start']
-        
-        # Check current frame
-        ret, frame = get_frame(cap, time)
-        if not ret:
+    def text_cues():
+        # (time, (cue number, cleaned text)) for every cue with text left after cleaning
+        for i, cue in enumerate(iter_cues(vtt_path)):
+            text = normalizer.clean(cue.text)
+            if text:
+                yield cue.start_ms / 1000.0, (i, text)
+    
+    if timeline is not None:
+        # The timeline sample of every cue stands in for its frame; nothing is decoded
+        cue_frames = ((t, payload, timeline.index_at(t)) for t, payload in text_cues())
+    else:
+        # One forward pass over the video; cues on the same or nearby frames share one decode
+        cue_frames = source.iter_aligned(text_cues())
+    for time, (i, text), frame in cue_frames:
+        if frame is None:
             current_section['text_buffer'].append(text)
             continue
             
-        temp_img_name = "temp_current_frame.jpg"
-        cv2.imwrite(temp_img_name, frame)
-        
-        diff_score = 0
-        if last_saved_img_path:
-            diff_score = calculate_image_difference(last_saved_img_path, temp_img_name)
+        # Compare against the last keyframe in memory; nothing is written to disk yet.
+        # With absdiff that keyframe is the full BGR frame, with histogram/phash a thumbnail.
+        thumb = frame if timeline is not None else scene_scoring.scene_signature(frame, scene_metric)
+        if last_thumb is None:
+            diff_score = 100.0
+        elif timeline is not None:
+            diff_score = float(timeline.hash_distance(last_thumb, thumb))
         else:
-            diff_score = 100.0 
+            diff_score = scene_scoring.signature_score(last_thumb, thumb, scene_metric)
             
         # Threshold (Scene Change)
-        SCENE_CHANGE_THRESHOLD = 5.0 
         time_diff = time - chunk_start_time
         
-        is_scene_change = (diff_score > SCENE_CHANGE_THRESHOLD) and (time_diff > 4.0)
+        is_scene_change = scene_scoring.is_scene_change(diff_score, scene_metric) and (time_diff > 4.0)
         
         if is_scene_change or i == 0:
             # Save PREVIOUS
@@ -212,10 +112,12 @@ def create_document(video_path, vtt_path, output_docx):
             # Start NEW
             new_img_filename = f"frame_{int(time)}.jpg"
             new_img_path = os.path.join(img_dir, new_img_filename)
-            import shutil
-            shutil.move(temp_img_name, new_img_path)
+            if timeline is not None:
+                pending_images.append((time, new_img_path))
+            else:
+                cv2.imwrite(new_img_path, frame.bgr())
             
-            last_saved_img_path = new_img_path
+            last_thumb = thumb
             chunk_start_time = time
             
             current_section = {
@@ -233,9 +135,20 @@ def create_document(video_path, vtt_path, output_docx):
          current_section['final_text'] = " ".join(current_section['text_buffer'])
          final_sections.append(current_section)
 
-    cap.release()
-    if os.path.exists("temp_current_frame.jpg"):
-        os.remove("temp_current_frame.jpg")
+    # Timeline mode: the screenshots of the scene cuts, decoded in one pass at full size
+    paths_at = {}
+    for time, img_path in pending_images:
+        paths_at.setdefault(time, []).append(img_path)
+    for time, frame in source.iter_frames(sorted(paths_at)):
+        for img_path in paths_at[time]:
+            cv2.imwrite(img_path, frame.bgr())
+
+    source.release()
+
+    # Downscale/re-encode the keyframes for the 6 inch layout
+    embed_paths = optimize_images([s['image_path'] for s in final_sections], os.path.join(img_dir, "embed"))
+    for section, embed_path in zip(final_sections, embed_paths):
+        section['image_path'] = embed_path
 
     # 3. Generate Word Doc (Same as before)
 
@@ -283,6 +196,7 @@ def create_document(video_path, vtt_path, output_docx):
     
     doc.save(output_docx)
     print(f"Saved {output_docx}")
+    return len(final_sections)
 
 if __name__ == "__main__":
     # Hardcoded paths based on user files
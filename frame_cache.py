@@ -0,0 +1,106 @@
+import os
+import json
+import shutil
+import hashlib
+
+DEFAULT_CACHE_DIR = ".frame_cache"
+DEFAULT_MAX_MB = 2048
+
+# Hashing a whole hour-long recording on every run would cost more than it saves,
+# so the fingerprint covers the size plus the first and last chunks of the file.
+FINGERPRINT_CHUNK = 4 * 1024 * 1024
+
+def video_fingerprint(video_path):
+    size = os.path.getsize(video_path)
+    h = hashlib.sha256(str(size).encode())
+    with open(video_path, 'rb') as f:
+        h.update(f.read(FINGERPRINT_CHUNK))
+        if size > FINGERPRINT_CHUNK:
+            f.seek(max(FINGERPRINT_CHUNK, size - FINGERPRINT_CHUNK))
+            h.update(f.read(FINGERPRINT_CHUNK))
+    return h.hexdigest()
+
+class FrameCache:
+    # Content-addressed store of rendered step images and their detected boxes.
+    # An entry is keyed on (video hash, timestamp, parameters, code version) and
+    # consists of <key>.jpg and <key>.json. Least recently used entries are evicted
+    # once the directory grows past max_mb.
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_mb=DEFAULT_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._fingerprints = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, video_path, time_sec, params, version):
+        if video_path not in self._fingerprints:
+            self._fingerprints[video_path] = video_fingerprint(video_path)
+        payload = json.dumps({
+            "video": self._fingerprints[video_path],
+            "time": time_sec,
+            "params": params,
+            "version": version,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return base + ".jpg", base + ".json"
+
+    def get(self, key, output_path):
+        # Copies the cached image to output_path and returns its boxes, or None on a miss
+        img_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            shutil.copyfile(img_path, output_path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        # Touch both files so eviction sees them as recently used
+        os.utime(img_path)
+        os.utime(meta_path)
+        self.hits += 1
+        return [tuple(b) for b in meta["boxes"]]
+
+    def put(self, key, image_path, boxes):
+        img_path, meta_path = self._paths(key)
+        os.makedirs(os.path.dirname(img_path), exist_ok=True)
+        shutil.copyfile(image_path, img_path)
+        # The json is written last: an entry without it is never read back
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"boxes": [list(b) for b in boxes]}, f)
+        os.replace(tmp_path, meta_path)
+
+    def evict(self):
+        # Removes least recently used entries until the cache fits in max_bytes
+        entries = {}
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                key = name.split('.')[0]
+                st = os.stat(path)
+                size, used = entries.get(key, (0, 0))
+                entries[key] = (size + st.st_size, max(used, st.st_mtime))
+                total += st.st_size
+
+        removed = 0
+        for key, (size, _) in sorted(entries.items(), key=lambda e: e[1][1]):
+            if total <= self.max_bytes:
+                break
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    # Already gone (another build evicting the same cache)
+                    pass
+            total -= size
+            removed += 1
+        return removed
+
+    def report(self):
+        total = self.hits + self.misses
+        return f"Frame cache: {self.hits} hits, {self.misses} misses ({total} lookups)"
@@ -0,0 +1,95 @@
+import cv2
+
+def time_to_frame_index(time_sec, fps):
+    # Same rounding OpenCV applies for a CAP_PROP_POS_MSEC seek followed by read()
+    return int(time_sec * fps + 0.5)
+
+def iter_capture_frames(cap, times, seek_to_first=False, index=None):
+    # Decodes an opened capture once, front to back, and yields (time_sec, frame) for
+    # every requested time in ascending order. Frames in between are skipped with grab(),
+    # only the requested ones are decoded to BGR with retrieve(); times past the end of
+    # the video are simply not yielded. With a keyframe index, long gaps between
+    # requested frames are skipped with a seek instead of grab() calls.
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if not fps or fps <= 0:
+        return
+
+    wanted = {}
+    for t in times:
+        wanted.setdefault(time_to_frame_index(t, fps), []).append(t)
+    targets = sorted(wanted)
+    if not targets:
+        return
+
+    frame_idx = 0
+    if seek_to_first and targets[0] > 0:
+        # One keyframe seek to the start of the range, then strictly sequential
+        cap.set(cv2.CAP_PROP_POS_FRAMES, targets[0])
+        frame_idx = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+
+    for target in targets:
+        if target < frame_idx:
+            continue
+        if index is not None and index.should_seek(frame_idx, target):
+            cap.set(cv2.CAP_PROP_POS_MSEC, target / fps * 1000)
+            frame_idx = target
+        ok = True
+        while frame_idx <= target:
+            ok = cap.grab()
+            if not ok:
+                break
+            frame_idx += 1
+        if not ok:
+            break
+
+        ret, frame = cap.retrieve()
+        if not ret:
+            continue
+        for t in sorted(wanted[target]):
+            yield t, frame
+
+# Items closer than this to the last decoded frame reuse it instead of decoding a new one
+# (subtitle cues often start a few hundred ms apart on an unchanged screen)
+ALIGN_MERGE_SEC = 0.25
+
+def iter_aligned_frames(cap, timed_items, merge_sec=ALIGN_MERGE_SEC, index=None):
+    # Lazily aligns (time_sec, payload) items - e.g. subtitle cues in file order - to the
+    # frames of an opened capture, walking the video forward once with grab().
+    # Yields (time_sec, payload, frame); frame is None once the video has ended.
+    # An item earlier than the current position falls back to a regular seek, and so
+    # does one past a keyframe when a keyframe index is given.
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    merge_frames = int(round(merge_sec * fps)) if fps and fps > 0 else 0
+    frame_idx = 0        # index of the next frame grab() would return
+    last_idx = None      # index of the last retrieved frame
+    last_frame = None
+    ended = False
+
+    for time_sec, payload in timed_items:
+        if ended or not fps or fps <= 0:
+            yield time_sec, payload, None
+            continue
+
+        target = time_to_frame_index(time_sec, fps)
+        if last_frame is not None and last_idx <= target <= last_idx + merge_frames:
+            yield time_sec, payload, last_frame
+            continue
+
+        if target < frame_idx or index is not None and index.should_seek(frame_idx, target):
+            cap.set(cv2.CAP_PROP_POS_MSEC, time_sec * 1000)
+            frame_idx = target
+        while frame_idx <= target:
+            if not cap.grab():
+                ended = True
+                break
+            frame_idx += 1
+        if ended:
+            yield time_sec, payload, None
+            continue
+
+        ret, frame = cap.retrieve()
+        if not ret:
+            yield time_sec, payload, None
+            continue
+        last_idx, last_frame = target, frame
+        yield time_sec, payload, frame
@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import time
+import cv2
+import numpy as np
+
+from frame_engine import time_to_frame_index, iter_capture_frames, iter_aligned_frames, ALIGN_MERGE_SEC
+from keyframe_index import load_keyframe_index
+
+# Frame access for assembler, doc_generator and redbox_research goes through a frame
+# source, so the decoder can be swapped:
+#   opencv: cv2.VideoCapture (default, no extra dependency)
+#   pyav:   ffmpeg through PyAV (pip install av) - keyframe-aware seeking, frames picked
+#           by PTS, grayscale/thumbnail output converted straight from the decoded YUV
+BACKENDS = ("opencv", "pyav")
+DEFAULT_BACKEND = "opencv"
+
+# Without a keyframe index (PyAV missing), pyav seeks when a request is further ahead
+# than this instead of decoding every frame in between
+SEEK_AHEAD_SEC = 5.0
+
+class OpenCVFrame:
+    # A decoded frame; conversions are done on first use
+    def __init__(self, bgr):
+        self._bgr = bgr
+        self._gray = None
+
+    def bgr(self):
+        return self._bgr
+
+    def gray(self):
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self._bgr, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def thumbnail(self, size):
+        # Same as scene_scoring.make_thumbnail
+        return cv2.resize(self.gray(), size, interpolation=cv2.INTER_AREA)
+
+class PyAVFrame:
+    # Wraps an av.VideoFrame; only the representation asked for is converted from YUV
+    def __init__(self, frame):
+        self._frame = frame
+        self._bgr = None
+        self._gray = None
+
+    def bgr(self):
+        if self._bgr is None:
+            self._bgr = self._frame.to_ndarray(format='bgr24')
+        return self._bgr
+
+    def gray(self):
+        if self._gray is None:
+            self._gray = self._frame.to_ndarray(format='gray')
+        return self._gray
+
+    def thumbnail(self, size):
+        # Scaled and converted in one swscale call, the full-size frame is never built
+        return self._frame.reformat(width=size[0], height=size[1], format='gray',
+                                    interpolation='AREA').to_ndarray()
+
+class OpenCVFrameSource:
+    def __init__(self, video_path, index=None):
+        self.cap = cv2.VideoCapture(video_path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap.isOpened() else 0.0
+        self.index = index
+        self._next_idx = None  # frame the next read() returns, when known
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def frame_at(self, time_sec):
+        # Millisecond seek + read, as the scripts always did. With a keyframe index, a
+        # target reachable without passing a keyframe is decoded forward instead.
+        # None if nothing was read.
+        target = time_to_frame_index(time_sec, self.fps)
+        if (self.index is not None and self._next_idx is not None and
+                not self.index.should_seek(self._next_idx, target)):
+            while self._next_idx < target:
+                if not self.cap.grab():
+                    self._next_idx = None
+                    return None
+                self._next_idx += 1
+        else:
+            self.cap.set(cv2.CAP_PROP_POS_MSEC, time_sec * 1000)
+        ret, frame = self.cap.read()
+        self._next_idx = target + 1 if ret else None
+        return OpenCVFrame(frame) if ret else None
+
+    def iter_frames(self, times, seek_to_first=False):
+        # (time_sec, frame) for every requested time, in ascending order, in one pass
+        self._next_idx = None
+        for t, frame in iter_capture_frames(self.cap, times, seek_to_first, self.index):
+            yield t, OpenCVFrame(frame)
+
+    def iter_aligned(self, timed_items, merge_sec=ALIGN_MERGE_SEC):
+        # (time_sec, payload, frame or None) for lazily supplied (time_sec, payload) items
+        self._next_idx = None
+        last_raw = last_frame = None
+        for t, payload, frame in iter_aligned_frames(self.cap, timed_items, merge_sec, self.index):
+            if frame is not None and frame is not last_raw:
+                last_raw, last_frame = frame, OpenCVFrame(frame)
+            yield t, payload, (last_frame if frame is not None else None)
+
+    def release(self):
+        self.cap.release()
+
+class PyAVFrameSource:
+    def __init__(self, video_path, index=None):
+        try:
+            import av
+        except ImportError:
+            raise ImportError("The pyav backend needs PyAV: pip install av")
+        try:
+            self.container = av.open(video_path)
+            self.stream = self.container.streams.video[0]
+        except (av.FFmpegError, IndexError, OSError) as e:
+            print(f"Error opening video with PyAV: {e}")
+            self.container = None
+            self.fps = 0.0
+            return
+        if (os.cpu_count() or 1) > 1:
+            # Frame threading only pays off with spare cores, on one core it is pure overhead
+            self.stream.thread_type = "AUTO"
+        rate = self.stream.average_rate or self.stream.guessed_rate
+        self.fps = float(rate) if rate else 0.0
+        self.time_base = float(self.stream.time_base)
+        self.start_pts = self.stream.start_time or 0
+        self.index = index
+        self._decoder = None
+        self._last = None   # (frame index, PyAVFrame) of the last decoded frame
+        self._ended = False
+
+    def is_opened(self):
+        return self.container is not None and self.fps > 0
+
+    def _frame_index(self, frame):
+        # Index the frame would have in a constant-rate stream, from its PTS
+        return time_to_frame_index((frame.pts - self.start_pts) * self.time_base, self.fps)
+
+    def _seek(self, target_idx):
+        # Lands on the keyframe at or before the target; decoding continues from there
+        pts = self.start_pts + int(max(0.0, (target_idx - 0.5) / self.fps) / self.time_base)
+        self.container.seek(pts, stream=self.stream, backward=True, any_frame=False)
+        self._decoder = self.container.decode(self.stream)
+        self._last = None
+        self._ended = False
+
+    def _frame_for_index(self, target_idx):
+        if self._last is not None and self._last[0] == target_idx:
+            return self._last[1]
+        current = self._last[0] if self._last is not None else None
+        if self._decoder is None or current is None and self._ended:
+            self._seek(target_idx)
+        elif current is not None:
+            if self.index is not None:
+                seek = self.index.should_seek(current + 1, target_idx)
+            else:
+                seek = target_idx < current or target_idx - current > SEEK_AHEAD_SEC * self.fps
+            if seek:
+                self._seek(target_idx)
+        for frame in self._decoder:
+            if frame.pts is None:
+                continue
+            idx = self._frame_index(frame)
+            if idx < target_idx:
+                continue
+            # First frame at or after the target (variable-rate streams can skip indexes)
+            self._last = (idx, PyAVFrame(frame))
+            return self._last[1]
+        self._ended = True
+        return None
+
+    def frame_at(self, time_sec):
+        return self._frame_for_index(time_to_frame_index(time_sec, self.fps))
+
+    def iter_frames(self, times, seek_to_first=False):
+        wanted = {}
+        for t in times:
+            wanted.setdefault(time_to_frame_index(t, self.fps), []).append(t)
+        for target in sorted(wanted):
+            frame = self._frame_for_index(target)
+            if frame is None:
+                break
+            for t in sorted(wanted[target]):
+                yield t, frame
+
+    def iter_aligned(self, timed_items, merge_sec=ALIGN_MERGE_SEC):
+        merge_frames = int(round(merge_sec * self.fps))
+        last_idx = last_frame = None
+        for time_sec, payload in timed_items:
+            target = time_to_frame_index(time_sec, self.fps)
+            if last_frame is None or not (last_idx <= target <= last_idx + merge_frames):
+                last_frame = self._frame_for_index(target)
+                last_idx = target
+            yield time_sec, payload, last_frame
+
+    def release(self):
+        if self.container is not None:
+            self.container.close()
+
+def open_frame_source(video_path, backend=DEFAULT_BACKEND, use_index=True):
+    # use_index: load (or build once) the keyframe index stored next to the video
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown decoder backend: {backend} (expected one of {BACKENDS})")
+    index = load_keyframe_index(video_path) if use_index and os.path.exists(video_path) else None
+    if backend == "pyav":
+        return PyAVFrameSource(video_path, index)
+    return OpenCVFrameSource(video_path, index)
+
+if __name__ == "__main__":
+    # Benchmark of the backends on the frames a content plan needs:
+    #   python frame_source.py <video> <content_plan.json>
+    from assembler import previous_frame_time
+    import scene_scoring
+
+    video_path, plan_path = sys.argv[1], sys.argv[2]
+    with open(plan_path, 'r', encoding='utf-8') as f:
+        plan = json.load(f)
+    times = [item['time'] for item in plan if item['type'] == 'step']
+    times = sorted(set(times + [previous_frame_time(t) for t in times]))
+    print(f"{len(times)} frames")
+
+    for backend in BACKENDS:
+        try:
+            source = open_frame_source(video_path, backend)
+        except ImportError as e:
+            print(f"{backend}: skipped ({e})")
+            continue
+        results = {}
+        start = time.perf_counter()
+        for t in times:
+            source.frame_at(t).bgr()
+        results["seek per frame (bgr)"] = time.perf_counter() - start
+        source.release()
+
+        for mode in ("bgr", "gray", "thumbnail"):
+            source = open_frame_source(video_path, backend)
+            start = time.perf_counter()
+            for _, frame in source.iter_frames(times):
+                if mode == "bgr":
+                    frame.bgr()
+                elif mode == "gray":
+                    frame.gray()
+                else:
+                    frame.thumbnail(scene_scoring.THUMB_SIZE)
+            results[f"single pass ({mode})"] = time.perf_counter() - start
+            source.release()
+
+        for name, seconds in results.items():
+            print(f"{backend:>6} {name:>24}: {seconds:.2f} s")
@@ -1,19 +1,31 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, ttk
 import threading
 import os
 from assembler import create_doc_from_plan
+from progress import CancelToken, BuildCancelled
+
+STAGE_LABELS = {
+    "template": "Şablon hazırlanıyor",
+    "extract": "Kareler çıkarılıyor",
+    "optimize": "Görseller optimize ediliyor",
+    "embed": "Doküman oluşturuluyor",
+    "save": "Kaydediliyor",
+    "done": "Tamamlandı",
+}
 
 class AutoDocGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("AIFTeam - SAP B1 Dokümantasyon Aracı")
-        self.root.geometry("600x450")
+        self.root.geometry("600x540")
         
         # Variables
         self.video_path = tk.StringVar()
         self.plan_path = tk.StringVar()
         self.output_path = tk.StringVar()
+        self.workers = tk.IntVar(value=1)
+        self.cancel_token = None
         
         # UI Elements
         self.create_widgets()
@@ -41,9 +53,19 @@ class AutoDocGUI:
         tk.Label(frame, text="Çıktı Dosyası (.docx):").grid(row=2, column=0, sticky="w", pady=5)
         tk.Entry(frame, textvariable=self.output_path, width=50).grid(row=2, column=1, padx=5)
         
+        # Parallel Workers
+        tk.Label(frame, text="İşlemci Sayısı:").grid(row=3, column=0, sticky="w", pady=5)
+        tk.Spinbox(frame, from_=1, to=os.cpu_count() or 1, textvariable=self.workers, width=5).grid(row=3, column=1, sticky="w", padx=5)
+        
         # Generate Button
         self.btn_generate = tk.Button(self.root, text="Dokümanı Oluştur", command=self.start_generation, bg="#4CAF50", fg="white", font=("Arial", 11, "bold"), height=2)
-        self.btn_generate.pack(pady=30, fill="x", padx=100)
+        self.btn_generate.pack(pady=(30, 10), fill="x", padx=100)
+        
+        # Progress
+        self.progress_bar = ttk.Progressbar(self.root, mode="determinate", maximum=100)
+        self.progress_bar.pack(fill="x", padx=100)
+        self.btn_cancel = tk.Button(self.root, text="İptal", command=self.cancel_generation, state="disabled")
+        self.btn_cancel.pack(pady=10)
         
         # Status
         self.status = tk.Label(self.root, text="Hazır", fg="gray")
@@ -63,6 +85,7 @@ class AutoDocGUI:
         video = self.video_path.get()
         plan = self.plan_path.get()
         output = self.output_path.get()
+        workers = self.workers.get()
         
         if not output:
              output = os.path.join(os.path.dirname(video), "Olusturulan_Dokuman.docx")
@@ -73,21 +96,49 @@ class AutoDocGUI:
             return
             
         self.btn_generate.config(state="disabled")
+        self.btn_cancel.config(state="normal")
+        self.progress_bar["value"] = 0
         self.status.config(text="İşleniyor... Lütfen bekleyin.")
+        self.cancel_token = CancelToken()
         
         # Run in thread to not freeze GUI
-        threading.Thread(target=self.run_process, args=(video, plan, output)).start()
+        threading.Thread(target=self.run_process, args=(video, plan, output, workers, self.cancel_token)).start()
+        
+    def cancel_generation(self):
+        # The build stops after the current step; the output file is not touched
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+            self.btn_cancel.config(state="disabled")
+            self.status.config(text="İptal ediliyor...")
+        
+    def on_progress(self, event):
+        # Called from the worker thread: hand the update to the Tk thread
+        self.root.after(0, lambda: self.show_progress(event))
+        
+    def show_progress(self, event):
+        if self.cancel_token is None or self.cancel_token.cancelled:
+            return
+        self.progress_bar["value"] = event.fraction * 100
+        text = f"{STAGE_LABELS.get(event.stage, event.stage)}: {event.done}/{event.total}"
+        if event.eta is not None and event.stage != "done":
+            text += f" (kalan ~{int(event.eta // 60)} dk {int(event.eta % 60)} sn)"
+        self.status.config(text=text)
         
-    def run_process(self, video, plan, output):
+    def run_process(self, video, plan, output, workers=1, cancel_token=None):
         try:
-            create_doc_from_plan(video, plan, output)
+            create_doc_from_plan(video, plan, output, workers=workers, on_progress=self.on_progress, cancel=cancel_token)
             self.root.after(0, lambda: messagebox.showinfo("Başarılı", f"Doküman oluşturuldu:\n{output}"))
             self.root.after(0, lambda: self.status.config(text="Tamamlandı."))
+        except BuildCancelled:
+            self.root.after(0, lambda: self.status.config(text="İptal edildi."))
+            self.root.after(0, lambda: self.progress_bar.config(value=0))
         except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("Hata", str(e)))
+            message = str(e)  # e is unbound once the except block ends
+            self.root.after(0, lambda: messagebox.showerror("Hata", message))
             self.root.after(0, lambda: self.status.config(text="Hata oluştu."))
         finally:
              self.root.after(0, lambda: self.btn_generate.config(state="normal"))
+             self.root.after(0, lambda: self.btn_cancel.config(state="disabled"))
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import zlib
+import hashlib
+import struct
+import time
+import cv2
+import numpy as np
+
+# Images are embedded at a fixed 6 inch width, so anything above the print DPI for that
+# width only makes the .docx bigger. Frames are resampled to EMBED_WIDTH_INCHES * dpi
+# pixels and re-encoded; the originals in final_images/ are left untouched.
+EMBED_WIDTH_INCHES = 6
+DEFAULT_DPI = 200
+JPEG_QUALITY = 85
+PALETTE_COLORS = 256
+# zlib level of the palette PNGs: 9 costs about 6x the time of 6 for ~4% fewer bytes
+PNG_COMPRESSION = 6
+
+# Bump when the encoding changes so earlier embed files are not reused
+OPTIMIZER_VERSION = 2
+
+# auto: palette PNG or JPEG, whichever is smaller for the image
+# original: embed the rendered file as is
+FORMATS = ("auto", "jpeg", "png", "original")
+
+def resample_for_print(image, width_inches=EMBED_WIDTH_INCHES, dpi=DEFAULT_DPI):
+    # Downscales to the pixel width needed at the given DPI (never upscales)
+    target_w = int(round(width_inches * dpi))
+    h, w = image.shape[:2]
+    if w <= target_w:
+        return image
+    target_h = max(1, int(round(h * target_w / float(w))))
+    return cv2.resize(image, (target_w, target_h), interpolation=cv2.INTER_AREA)
+
+def quantize_palette(image, colors=PALETTE_COLORS):
+    # Popularity quantizer for flat UI screenshots: the most frequent 15-bit colors become
+    # the palette and every other color maps to its nearest palette entry.
+    # Returns (indices HxW uint8, palette Nx3 uint8 BGR).
+    pixels = image.reshape(-1, 3)
+    buckets = ((pixels[:, 0] >> 3).astype(np.int32) << 10) | ((pixels[:, 1] >> 3).astype(np.int32) << 5) | (pixels[:, 2] >> 3)
+    counts = np.bincount(buckets, minlength=1 << 15)
+
+    # Screens with few colors get an exact palette
+    if np.count_nonzero(counts) <= colors:
+        packed = (pixels[:, 0].astype(np.uint32) << 16) | (pixels[:, 1].astype(np.uint32) << 8) | pixels[:, 2]
+        exact, exact_idx = np.unique(packed, return_inverse=True)
+        if len(exact) <= colors:
+            palette = np.stack([exact >> 16, (exact >> 8) & 255, exact & 255], axis=1).astype(np.uint8)
+            return exact_idx.astype(np.uint8).reshape(image.shape[:2]), palette
+
+    top = np.argsort(counts)[::-1][:colors]
+    top = top[counts[top] > 0]
+    # Palette entry = mean color of the bucket
+    sums = np.stack([np.bincount(buckets, pixels[:, c], minlength=1 << 15) for c in range(3)], axis=1)
+    palette = (sums[top] / counts[top][:, None]).round().astype(np.uint8)
+
+    # Nearest palette entry for every used bucket, through a bucket lookup table
+    used = np.flatnonzero(counts)
+    centers = np.stack([(used >> 10) & 31, (used >> 5) & 31, used & 31], axis=1) * 8 + 4
+    lut = np.zeros(1 << 15, np.uint8)
+    pal = palette.astype(np.int32)
+    for start in range(0, len(used), 4096):
+        c = centers[start:start + 4096, None, :]
+        dist = ((c - pal[None]) ** 2).sum(axis=2)
+        lut[used[start:start + 4096]] = dist.argmin(axis=1)
+    lut[top] = np.arange(len(top))
+    return lut[buckets].reshape(image.shape[:2]), palette
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+def encode_palette_png(indices, palette):
+    # 8-bit indexed PNG (OpenCV can only write truecolor PNGs)
+    h, w = indices.shape
+    raw = np.zeros((h, w + 1), np.uint8)  # filter byte 0 (None) per row
+    raw[:, 1:] = indices
+    header = struct.pack(">IIBBBBB", w, h, 8, 3, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", header)
+            + _png_chunk(b"PLTE", palette[:, ::-1].tobytes())
+            + _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), PNG_COMPRESSION))
+            + _png_chunk(b"IEND", b""))
+
+def encode_jpeg(image, quality=JPEG_QUALITY):
+    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buf.tobytes()
+
+def _file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _reusable_output(meta_path, out_dir, meta):
+    # The previous output of the same source and settings, or None
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if {k: stored.get(k) for k in meta} != meta:
+        return None
+    if stored.get("output") is None:
+        return stored
+    out_path = os.path.join(out_dir, stored["output"])
+    if not os.path.exists(out_path) or os.path.getsize(out_path) != stored.get("after"):
+        return None
+    return stored
+
+def optimize_image(src_path, out_dir, fmt="auto", dpi=DEFAULT_DPI, quality=JPEG_QUALITY, image=None, reuse=True):
+    # Writes the embed-ready version of src_path into out_dir.
+    # image: the pixels of src_path when the caller still has them (not read back from disk).
+    # Returns (output path, bytes before, bytes after).
+    # <name>.embed.json next to the output records the source's content hash and the
+    # settings: an unchanged step image (incremental build, frame cache hit) is not encoded
+    # again (reuse=False always encodes).
+    before = os.path.getsize(src_path)
+    if fmt == "original":
+        return src_path, before, before
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown image format: {fmt} (expected one of {FORMATS})")
+
+    base = os.path.splitext(os.path.basename(src_path))[0]
+    meta_path = os.path.join(out_dir, base + ".embed.json")
+    meta = {"source": _file_hash(src_path), "format": fmt, "dpi": dpi, "quality": quality,
+            "version": OPTIMIZER_VERSION}
+    stored = _reusable_output(meta_path, out_dir, meta) if reuse else None
+    if stored is not None:
+        if stored["output"] is None:
+            return src_path, before, before
+        return os.path.join(out_dir, stored["output"]), before, stored["after"]
+
+    if image is None:
+        image = cv2.imread(src_path, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Cannot read image: {src_path}")
+    image = resample_for_print(image, dpi=dpi)
+
+    candidates = []
+    if fmt in ("auto", "png"):
+        candidates.append((".png", encode_palette_png(*quantize_palette(image))))
+    if fmt in ("auto", "jpeg"):
+        candidates.append((".jpg", encode_jpeg(image, quality)))
+    ext, data = min(candidates, key=lambda c: len(c[1]))
+
+    os.makedirs(out_dir, exist_ok=True)
+    # Never make an image bigger than the rendered original
+    if len(data) >= before:
+        out_path, after = src_path, before
+        meta.update(output=None, after=before)
+    else:
+        out_path, after = os.path.join(out_dir, base + ext), len(data)
+        with open(out_path, 'wb') as f:
+            f.write(data)
+        meta.update(output=base + ext, after=after)
+    # Written last: a crash in between leaves no record of an unfinished output
+    tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+    # An earlier build may have picked the other format (auto) for this step
+    for other in (".png", ".jpg"):
+        stale = os.path.join(out_dir, base + other)
+        if stale not in (out_path, src_path) and os.path.exists(stale):
+            os.remove(stale)
+    return out_path, before, after
+
+def optimize_images(paths, out_dir, fmt="auto", dpi=DEFAULT_DPI, quality=JPEG_QUALITY, progress=None):
+    # Optimizes a list of images (None entries are passed through) and prints the savings.
+    # Returns the embed paths in the same order.
+    # progress: a progress.ProgressReporter advanced after every entry (or None).
+    results = []
+    total_before = total_after = 0
+    for path in paths:
+        out_path = path
+        if path is not None:
+            try:
+                out_path, before, after = optimize_image(path, out_dir, fmt, dpi, quality)
+                total_before += before
+                total_after += after
+                if fmt != "original":
+                    print(f"  {os.path.basename(path)} -> {os.path.basename(out_path)}: "
+                          f"{before / 1024:.0f} KB -> {after / 1024:.0f} KB ({(before - after) / 1024:.0f} KB saved)")
+            except Exception as e:
+                print(f"Image optimize error ({path}): {e}")
+        results.append(out_path)
+        if progress is not None:
+            progress.advance()
+    if total_before and fmt != "original":
+        print(f"Images: {total_before / 1048576:.1f} MB -> {total_after / 1048576:.1f} MB "
+              f"({100.0 * (total_before - total_after) / total_before:.0f}% saved)")
+    return results
+
+if __name__ == "__main__":
+    # Compares the formats on a folder of rendered step images (default: final_images)
+    src_dir = sys.argv[1] if len(sys.argv) > 1 else "final_images"
+    paths = sorted(os.path.join(src_dir, n) for n in os.listdir(src_dir) if n.lower().endswith((".jpg", ".png")))
+    for fmt in ("jpeg", "png", "auto"):
+        out_dir = os.path.join(src_dir, "optimized_" + fmt)
+        start = time.perf_counter()
+        before = after = 0
+        for path in paths:
+            _, b, a = optimize_image(path, out_dir, fmt, reuse=False)
+            before += b
+            after += a
+        ms = (time.perf_counter() - start) / max(1, len(paths)) * 1000
+        print(f"{fmt:>5}: {before / 1048576:.2f} MB -> {after / 1048576:.2f} MB, {ms:.0f} ms/image")
@@ -6,16 +6,39 @@ import subprocess
 from datetime import datetime
 from assembler import create_doc_from_plan
 
+# Long stages are logged at most this often (every stage is logged when it ends)
+PROGRESS_LOG_SEC = 10.0
+
 class JulesAgent:
     def __init__(self):
         self.name = "Jules"
         self.version = "v7.2"
         self.work_dir = os.path.dirname(os.path.abspath(__file__))
+        self._log_stage = None
+        self._last_progress_log = 0.0
         
     def log(self, message):
         timestamp = datetime.now().strftime("%H:%M:%S")
         print(f"[{self.name} {timestamp}]: {message}")
 
+    def log_progress(self, event):
+        # Logs the throughput of every stage when it completes and of long stages every
+        # PROGRESS_LOG_SEC, e.g. "extract: 40/120, 2.1/s, ~38s left"
+        now = time.perf_counter()
+        if event.stage == "done":
+            minutes = event.elapsed / 60
+            self.log(f"Build finished: {event.total} steps in {event.elapsed:.1f}s "
+                     f"({event.total / minutes if minutes else 0:.1f} steps/min)")
+            return
+        if event.stage != self._log_stage:
+            self._log_stage = event.stage
+            self._last_progress_log = now
+        if event.done < event.total and now - self._last_progress_log < PROGRESS_LOG_SEC:
+            return
+        self._last_progress_log = now
+        eta = f", ~{event.eta:.0f}s left" if event.eta is not None and event.done < event.total else ""
+        self.log(f"{event.stage}: {event.done}/{event.total}, {event.rate:.1f}/s{eta}")
+
     def run_task(self):
         self.log(f"Initializing... (Version {self.version})")
         self.log("Reading configuration...")
@@ -36,7 +59,7 @@ class JulesAgent:
         self.log("Starting Phase 1: Visual Analysis & RedBox Detection...")
         # assembler.py logic is imported
         try:
-            create_doc_from_plan(video_file, plan_file, output_file)
+            create_doc_from_plan(video_file, plan_file, output_file, on_progress=self.log_progress)
             self.log("Phase 1 Complete. Document Generated.")
         except Exception as e:
             self.log(f"Critical Error during generation: {e}")
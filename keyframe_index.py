@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import time
+from bisect import bisect_right
+
+from build_manifest import file_stamp
+from frame_engine import time_to_frame_index
+
+# Keyframe positions of a video, found once by reading the container packets (nothing
+# is decoded) and stored next to the video as <video>.keyframes.json. The stamp
+# (size, mtime) of the video is stored with it; a re-encoded or replaced recording
+# gets a fresh index automatically.
+INDEX_VERSION = 1
+
+def index_path_for(video_path):
+    return video_path + ".keyframes.json"
+
+class KeyframeIndex:
+    def __init__(self, frames, pts, fps):
+        self.frames = frames  # frame index of every keyframe, ascending
+        self.pts = pts        # their PTS in stream time base units
+        self.fps = fps
+
+    def keyframe_before(self, target_idx):
+        # Position in self.frames of the last keyframe at or before target_idx (or None)
+        pos = bisect_right(self.frames, target_idx) - 1
+        return pos if pos >= 0 else None
+
+    def should_seek(self, next_idx, target_idx):
+        # Decoding continues at next_idx. Seeking only pays off when going back, or when a
+        # keyframe after next_idx lets the decoder skip the frames in between.
+        if target_idx < next_idx:
+            return True
+        pos = self.keyframe_before(target_idx)
+        return pos is not None and self.frames[pos] > next_idx
+
+def build_keyframe_index(video_path):
+    # Demuxes the video once and records every keyframe packet. Needs PyAV.
+    import av
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        rate = stream.average_rate or stream.guessed_rate
+        fps = float(rate) if rate else 0.0
+        time_base = float(stream.time_base)
+        start_pts = stream.start_time or 0
+        keyframe_pts = [packet.pts for packet in container.demux(stream)
+                        if packet.is_keyframe and packet.pts is not None]
+    keyframe_pts.sort()
+    return {
+        "version": INDEX_VERSION,
+        "stamp": file_stamp(video_path),
+        "fps": fps,
+        "time_base": time_base,
+        "start_pts": start_pts,
+        "frames": [time_to_frame_index((p - start_pts) * time_base, fps) for p in keyframe_pts],
+        "pts": keyframe_pts,
+    }
+
+def load_keyframe_index(video_path, build=True):
+    # Returns the KeyframeIndex of the video, building and saving it if missing or stale.
+    # None when it cannot be built (PyAV not installed, unreadable video).
+    path = index_path_for(video_path)
+    data = None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION or data.get("stamp") != file_stamp(video_path):
+            data = None
+    except (OSError, ValueError):
+        data = None
+
+    if data is None:
+        if not build:
+            return None
+        try:
+            start = time.perf_counter()
+            data = build_keyframe_index(video_path)
+            print(f"Indexed {len(data['frames'])} keyframes of {os.path.basename(video_path)} "
+                  f"in {time.perf_counter() - start:.1f}s")
+        except ImportError:
+            return None
+        except Exception as e:
+            print(f"Keyframe index error: {e}")
+            return None
+        # Worker processes may build it at the same time: unique temp file, atomic rename
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Read-only video folder: the index is only used for this run
+            pass
+
+    if not data["frames"] or data["fps"] <= 0:
+        return None
+    return KeyframeIndex(data["frames"], data["pts"], data["fps"])
+
+if __name__ == "__main__":
+    # Builds (or refreshes) the index and prints the GOP statistics
+    video_path = sys.argv[1]
+    index = load_keyframe_index(video_path)
+    if index is None:
+        print("Could not index the video (is PyAV installed?)")
+        sys.exit(1)
+    gaps = [b - a for a, b in zip(index.frames, index.frames[1:])]
+    print(f"{len(index.frames)} keyframes, fps {index.fps:.2f}")
+    if gaps:
+        print(f"keyframe interval: min {min(gaps) / index.fps:.2f}s, max {max(gaps) / index.fps:.2f}s, "
+              f"mean {sum(gaps) / len(gaps) / index.fps:.2f}s")
@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import threading
+
+# Wall-clock spans of the pipeline stages (decode, diff, Canny/contours, image write,
+# embed, save...). Off by default: a disabled stage() returns a shared do-nothing context
+# manager and iterate() returns the iterable untouched, so the instrumented code costs
+# one method call per span. Enabled with assembler's --timings / --trace.
+# Only the calling process is measured; with --workers > 1 the extraction shows up as
+# one "extract" span of the main process.
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    def __init__(self, timings, name, args):
+        self.timings = timings
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.record(self.name, self.start, time.perf_counter() - self.start, self.args)
+        return False
+
+class Timings:
+    def __init__(self):
+        self.enabled = False
+        self.spans = []  # (name, start, seconds, args, thread id)
+        self.origin = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+        self.spans = []
+        self.origin = time.perf_counter()
+
+    def disable(self):
+        self.enabled = False
+
+    def stage(self, name, **args):
+        # with timings.stage("embed", image="step_3_12.jpg"): ...
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def iterate(self, name, iterable):
+        # Times every next() of iterable, e.g. the decoding done inside a frame generator
+        if not self.enabled:
+            return iterable
+        return self._timed_iter(name, iterable)
+
+    def _timed_iter(self, name, iterable):
+        it = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            self.record(name, start, time.perf_counter() - start, {})
+            yield item
+
+    def record(self, name, start, seconds, args):
+        # list.append is atomic, spans from threads need no lock
+        self.spans.append((name, start, seconds, args, threading.get_ident()))
+
+    def summary(self):
+        # {stage: {"count", "total", "p50", "p95", "max"}} in seconds, by first appearance
+        durations = {}
+        for name, _, seconds, _, _ in self.spans:
+            durations.setdefault(name, []).append(seconds)
+        result = {}
+        for name, values in durations.items():
+            values.sort()
+            result[name] = {"count": len(values), "total": sum(values), "p50": _percentile(values, 0.5),
+                            "p95": _percentile(values, 0.95), "max": values[-1]}
+        return result
+
+    def step_totals(self):
+        # {step image name: seconds} over the spans recorded with an image= argument
+        # (rendering and embedding of a step both name its image)
+        totals = {}
+        for _, _, seconds, args, _ in self.spans:
+            if "image" in args:
+                totals[args["image"]] = totals.get(args["image"], 0.0) + seconds
+        return totals
+
+    def report(self, slowest_steps=5):
+        lines = [f"{'Stage':<16} {'Count':>6} {'Total s':>9} {'p50 ms':>9} {'p95 ms':>9} {'Max ms':>9}"]
+        for name, s in self.summary().items():
+            lines.append(f"{name:<16} {s['count']:>6} {s['total']:>9.2f} {s['p50'] * 1000:>9.1f} "
+                         f"{s['p95'] * 1000:>9.1f} {s['max'] * 1000:>9.1f}")
+        steps = sorted(self.step_totals().items(), key=lambda kv: kv[1], reverse=True)[:slowest_steps]
+        if steps:
+            lines.append("Slowest steps: " + ", ".join(f"{step} {seconds * 1000:.0f} ms" for step, seconds in steps))
+        return "\n".join(lines)
+
+    def write_trace(self, path):
+        # Chrome trace event format: load in chrome://tracing or https://ui.perfetto.dev
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "pid": pid, "tid": tid,
+                   "ts": round((start - self.origin) * 1e6, 1), "dur": round(seconds * 1e6, 1),
+                   "args": args}
+                  for name, start, seconds, args, tid in self.spans]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+def _percentile(sorted_values, q):
+    # Value at the closest rank, no interpolation
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+# Shared by every module of the process
+timings = Timings()
@@ -0,0 +1,94 @@
+import time
+import threading
+from collections import namedtuple
+
+# Progress reporting and cancellation for long builds (GUI, Jules).
+# The builder announces every stage with ProgressReporter.begin() and calls advance()
+# after every unit of work (a step, an image). Both report to the callback and then
+# honor the CancelToken: once cancel() was called from any thread the next call raises
+# BuildCancelled, so a build stops within one step.
+
+# stage: "template", "extract", "optimize", "embed", "save" or "done"
+# done/total: units of the stage (steps or images); rate: units per second in this stage;
+# eta: seconds left in the stage (None until it can be estimated);
+# fraction: 0..1 of the whole build
+ProgressEvent = namedtuple("ProgressEvent", ["stage", "done", "total", "elapsed", "rate", "eta", "fraction"])
+
+# Rough share of the build time of every stage, for the overall fraction
+STAGE_WEIGHTS = [("template", 0.02), ("extract", 0.6), ("optimize", 0.25), ("embed", 0.08), ("save", 0.05)]
+
+class BuildCancelled(Exception):
+    pass
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise BuildCancelled("Build cancelled")
+
+class ProgressReporter:
+    # callback(ProgressEvent) runs in the building thread; callback and cancel may be None
+    def __init__(self, callback=None, cancel=None):
+        self.callback = callback
+        self.cancel = cancel
+        self.start = time.perf_counter()
+        self.stage = None
+        self.done = self.total = 0
+        self._stage_start = self.start
+        self._done_at_start = 0
+
+    def check(self):
+        if self.cancel is not None:
+            self.cancel.check()
+
+    def begin(self, stage, total, done=0):
+        # done: units already finished before any work (e.g. served from the cache)
+        self.stage = stage
+        self.total = total
+        self.done = done
+        self._stage_start = time.perf_counter()
+        self._done_at_start = done
+        self._emit()
+        self.check()
+
+    def advance(self, count=1):
+        self.done += count
+        self._emit()
+        self.check()
+
+    def finish(self, total):
+        # Final event with the number of steps built; never raises, the output is
+        # complete at this point
+        self.stage = "done"
+        self.done = self.total = total
+        self._done_at_start = 0
+        self._stage_start = self.start
+        self._emit()
+
+    def _emit(self):
+        if self.callback is None:
+            return
+        now = time.perf_counter()
+        worked = self.done - self._done_at_start
+        stage_elapsed = now - self._stage_start
+        rate = worked / stage_elapsed if worked and stage_elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate else None
+        self.callback(ProgressEvent(self.stage, self.done, self.total, now - self.start, rate, eta,
+                                    overall_fraction(self.stage, self.done, self.total)))
+
+def overall_fraction(stage, done, total):
+    fraction = 0.0
+    for name, weight in STAGE_WEIGHTS:
+        if name == stage:
+            return fraction + weight * (done / total if total else 1.0)
+        fraction += weight
+    return 1.0
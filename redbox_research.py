@@ -1,25 +1,50 @@
 import cv2
 import numpy as np
 import os
+import sys
+from frame_source import open_frame_source, DEFAULT_BACKEND
+from activity_timeline import load_timeline
 
-def detect_change_region(video_path, time_sec):
-    cap = cv2.VideoCapture(video_path)
+def detect_change_region(video_path, time_sec, backend=DEFAULT_BACKEND, timeline=None):
+    # timeline: activity_timeline.ActivityTimeline of the video (opt-in); the change region
+    # is then read from it and only the frame at time_sec is decoded. That region is the
+    # union of everything that changed over the second before (a cursor move and a click
+    # give one box around both), not the largest diff contour of the default path.
+    source = open_frame_source(video_path, backend)
     
     # Get frame at time_sec
-    cap.set(cv2.CAP_PROP_POS_MSEC, time_sec * 1000)
-    ret1, frame_curr = cap.read()
+    frame_curr = source.frame_at(time_sec)
+    
+    if timeline is not None:
+        if frame_curr is None:
+            print("Could not read frames")
+            source.release()
+            return
+        output_img = frame_curr.bgr().copy()
+        region = timeline.change_region(time_sec - 1.0, time_sec)
+        if region is not None:
+            x, y, w, h = region
+            cv2.rectangle(output_img, (x, y), (x+w, y+h), (0, 0, 255), 3)
+            print(f"Detected change at {time_sec}s: Box at ({x},{y},{w},{h}) (timeline)")
+        else:
+            print("No significant change detected.")
+        out_name = f"redbox_test_{int(time_sec)}.jpg"
+        cv2.imwrite(out_name, output_img)
+        print(f"Saved: {out_name}")
+        source.release()
+        return
     
     # Get frame slightly before (e.g. 1 second before) to see change
-    cap.set(cv2.CAP_PROP_POS_MSEC, (time_sec - 1.0) * 1000)
-    ret2, frame_prev = cap.read()
+    frame_prev = source.frame_at(time_sec - 1.0)
     
-    if not ret1 or not ret2:
+    if frame_curr is None or frame_prev is None:
         print("Could not read frames")
+        source.release()
         return
         
-    # Convert to grayscale
-    gray_curr = cv2.cvtColor(frame_curr, cv2.COLOR_BGR2GRAY)
-    gray_prev = cv2.cvtColor(frame_prev, cv2.COLOR_BGR2GRAY)
+    # Grayscale is all the diff needs (the previous frame is never converted to BGR)
+    gray_curr = frame_curr.gray()
+    gray_prev = frame_prev.gray()
     
     # Absdiff
     diff = cv2.absdiff(gray_curr, gray_prev)
@@ -35,7 +60,7 @@ def detect_change_region(video_path, time_sec):
     contours, _ = cv2.findContours(dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
     # Find largest contour (assumed to be the interaction)
-    output_img = frame_curr.copy()
+    output_img = frame_curr.bgr().copy()
     found = False
     
     if contours:
@@ -59,12 +84,14 @@ def detect_change_region(video_path, time_sec):
     cv2.imwrite(out_name, output_img)
     print(f"Saved: {out_name}")
     
-    cap.release()
+    source.release()
 
 if __name__ == "__main__":
     video_file = r"..\1-El Terminali Eğitimi-20250623_092431-Toplantı Kaydı.mp4"
     # Test on a few timestamps from the plan
     # 544s -> Genel Parametreler Click
     # 2814s -> Buton Parametre Click
-    detect_change_region(video_file, 544)
-    detect_change_region(video_file, 2814)
+    # --timeline: boxes from the activity timeline instead of the frame diff
+    timeline = load_timeline(video_file) if "--timeline" in sys.argv[1:] else None
+    detect_change_region(video_file, 544, timeline=timeline)
+    detect_change_region(video_file, 2814, timeline=timeline)
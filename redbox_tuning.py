@@ -0,0 +1,271 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from assembler import (detect_redboxes, previous_frame_time, capture_jobs, REDBOX_PARAMS, CAPTURE_MODES,
+                       DEFAULT_CAPTURE)
+from build_manifest import file_stamp
+from change_events import capture_windows
+from frame_source import open_frame_source, DEFAULT_BACKEND, BACKENDS
+
+# Tuning of the red-box detection parameters against hand-checked boxes.
+#   1. label: the steps of a content plan are captured as the assembler would and the
+#      current detection is written to a labels file; fix the "boxes" of every step by
+#      hand (add the missing ones, delete the wrong ones). The decoded frame pairs are
+#      kept next to it (<labels>.frames.npy) and reused by every tuning run.
+#        python redbox_tuning.py label --video kayit.mp4 --plan content_plan.json --labels labels.json
+#   2. tune: every configuration is scored on the labelled frames (precision, recall and
+#      detection time per frame), in parallel, one configuration per worker at a time.
+#        python redbox_tuning.py tune labels.json --search grid --params diff_threshold,min_diff_area
+#        python redbox_tuning.py tune labels.json --search random --trials 200
+
+# Values tried for every parameter; the current REDBOX_PARAMS are always evaluated too
+SEARCH_SPACE = {
+    "canny_low": [20, 30, 40, 50],
+    "canny_high": [80, 100, 150],
+    "ui_kernel": [(3, 15), (3, 25), (5, 35)],
+    "ui_min_h": [10, 15, 20],
+    "ui_max_h": [60, 80, 100],
+    "ui_min_w": [30, 50, 80],
+    "diff_threshold": [15, 25, 35],
+    "min_diff_area": [150, 300, 600],
+    "dedupe_distance": [10, 20, 40],
+}
+
+# A detected box counts as correct when it overlaps an expected box this much
+MATCH_IOU = 0.5
+RESULTS_FILE = "tuning_results.json"
+
+def frames_path_for(labels_path):
+    return os.path.splitext(labels_path)[0] + ".frames.npy"
+
+def make_labels(video_path, plan_path, capture=DEFAULT_CAPTURE, backend=DEFAULT_BACKEND):
+    # Labels of every plan step with the boxes found by the current parameters
+    with open(plan_path, 'r', encoding='utf-8') as f:
+        steps = [item for item in json.load(f) if item['type'] == 'step']
+    jobs = [(item['time'], None) for item in steps]
+    if capture == "events":
+        moved, prev_times = capture_jobs(video_path, jobs, capture_windows([t for t, _ in jobs]), backend)
+    else:
+        moved, prev_times = jobs, None
+    if prev_times is None:
+        prev_times = [previous_frame_time(t) for t, _ in moved]
+    labels = {"video": video_path, "stamp": file_stamp(video_path), "steps": [
+        {"text": item['text'], "time": item['time'], "capture": t, "reference": prev, "boxes": []}
+        for item, (t, _), prev in zip(steps, moved, prev_times)]}
+    return labels
+
+def decode_frames(video_path, labels, frames_path, backend=DEFAULT_BACKEND):
+    # (steps, 2, h, w, 3) array of the captured and reference frame of every step,
+    # written to frames_path (memory-mapped .npy) in one pass over the video
+    steps = labels["steps"]
+    wanted = {}
+    for i, step in enumerate(steps):
+        wanted.setdefault(step["capture"], []).append((i, 0))
+        wanted.setdefault(step["reference"], []).append((i, 1))
+    source = open_frame_source(video_path, backend)
+    if not source.is_opened():
+        raise RuntimeError(f"Cannot open video: {video_path}")
+    frames = None
+    filled = 0
+    try:
+        for t, frame in source.iter_frames(sorted(wanted)):
+            bgr = frame.bgr()
+            if frames is None:
+                frames = np.lib.format.open_memmap(frames_path + ".tmp", mode='w+', dtype=np.uint8,
+                                                   shape=(len(steps), 2) + bgr.shape)
+            for i, k in wanted[t]:
+                frames[i, k] = bgr
+                filled += 1
+    finally:
+        source.release()
+    if frames is None or filled < 2 * len(steps):
+        raise RuntimeError(f"Could not read every labelled frame of {video_path}")
+    frames.flush()
+    del frames
+    os.replace(frames_path + ".tmp", frames_path)
+
+def load_frames(labels_path, labels, backend=DEFAULT_BACKEND):
+    # The labelled frame pairs, decoded again only when the video or the steps changed
+    frames_path = frames_path_for(labels_path)
+    key_path = frames_path + ".json"
+    key = {"stamp": labels["stamp"], "times": [[s["capture"], s["reference"]] for s in labels["steps"]]}
+    try:
+        with open(key_path, 'r', encoding='utf-8') as f:
+            fresh = json.load(f) == key and os.path.exists(frames_path)
+    except (OSError, ValueError):
+        fresh = False
+    if not fresh:
+        start = time.perf_counter()
+        decode_frames(labels["video"], labels, frames_path, backend)
+        with open(key_path, 'w', encoding='utf-8') as f:
+            json.dump(key, f)
+        print(f"Decoded {2 * len(labels['steps'])} labelled frames in {time.perf_counter() - start:.1f}s")
+    return frames_path
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    return inter / float(aw * ah + bw * bh - inter)
+
+def match_boxes(found, expected, min_iou=MATCH_IOU):
+    # Correct detections, greedily by best overlap; each expected box matches at most once
+    pairs = sorted(((iou(f, e), i, j) for i, f in enumerate(found) for j, e in enumerate(expected)), reverse=True)
+    used_found, used_expected = set(), set()
+    for overlap, i, j in pairs:
+        if overlap < min_iou:
+            break
+        if i not in used_found and j not in used_expected:
+            used_found.add(i)
+            used_expected.add(j)
+    return len(used_found)
+
+def make_configs(search, names=None, trials=100, seed=0):
+    # Parameter overrides to evaluate: the current parameters first, then the grid over
+    # `names` (the others keep their current value) or `trials` random draws from the
+    # whole space
+    configs = [{}]
+    names = names or list(SEARCH_SPACE)
+    unknown = [n for n in names if n not in SEARCH_SPACE]
+    if unknown:
+        raise ValueError(f"Unknown parameter(s): {', '.join(unknown)} (expected from {', '.join(SEARCH_SPACE)})")
+    if search == "grid":
+        for values in itertools.product(*(SEARCH_SPACE[n] for n in names)):
+            configs.append(dict(zip(names, values)))
+    elif search == "random":
+        rng = random.Random(seed)
+        for _ in range(trials):
+            configs.append({n: rng.choice(SEARCH_SPACE[n]) for n in names})
+    else:
+        raise ValueError(f"Unknown search: {search} (expected grid or random)")
+    # Drop duplicates (and draws equal to the current parameters)
+    unique, seen = [], set()
+    for config in configs:
+        key = json.dumps(dict(REDBOX_PARAMS, **config), sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            unique.append(config)
+    return unique
+
+# Worker state: the frame pairs (memory-mapped, shared through the page cache) and labels
+_frames = None
+_expected = None
+
+def _init_worker(frames_path, expected):
+    global _frames, _expected
+    _frames = np.load(frames_path, mmap_mode='r')
+    _expected = expected
+    # One untimed run, so the first configuration does not pay for the first page reads
+    if len(_frames):
+        detect_redboxes(np.asarray(_frames[0][0]), np.asarray(_frames[0][1]))
+
+def evaluate(config):
+    # Precision, recall and detection time of one parameter override on every labelled step
+    params = dict(REDBOX_PARAMS, **config)
+    found_total = expected_total = correct = 0
+    seconds = 0.0
+    for pair, expected in zip(_frames, _expected):
+        curr, prev = np.asarray(pair[0]), np.asarray(pair[1])
+        start = time.perf_counter()
+        found = detect_redboxes(curr, prev, params)
+        seconds += time.perf_counter() - start
+        correct += match_boxes(found, expected)
+        found_total += len(found)
+        expected_total += len(expected)
+    precision = correct / found_total if found_total else 1.0
+    recall = correct / expected_total if expected_total else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"config": config, "precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4),
+            "ms_per_frame": round(seconds / max(1, len(_expected)) * 1000, 3)}
+
+def tune(labels_path, configs, workers=None, backend=DEFAULT_BACKEND):
+    with open(labels_path, 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+    frames_path = load_frames(labels_path, labels, backend)
+    expected = [[tuple(b) for b in step["boxes"]] for step in labels["steps"]]
+    workers = workers or os.cpu_count() or 1
+    print(f"Evaluating {len(configs)} configurations on {len(expected)} labelled steps with {workers} workers...")
+    start = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(frames_path, expected)) as executor:
+            results = list(executor.map(evaluate, configs, chunksize=max(1, len(configs) // (workers * 4))))
+    else:
+        _init_worker(frames_path, expected)
+        results = [evaluate(config) for config in configs]
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+    return results
+
+def print_results(results, top=10):
+    # Most accurate first, the faster one among equals
+    ranked = sorted(results, key=lambda r: (-r["f1"], r["ms_per_frame"]))
+    baseline = results[0]
+    print(f"{'F1':>6} {'Prec':>6} {'Recall':>6} {'ms/frame':>9}  Parameters")
+    for r in [baseline] + [r for r in ranked[:top] if r is not baseline]:
+        label = "(current)" if r is baseline else json.dumps(r["config"])
+        print(f"{r['f1']:>6.3f} {r['precision']:>6.3f} {r['recall']:>6.3f} {r['ms_per_frame']:>9.2f}  {label}")
+    # The fastest configuration at least as accurate as the current one
+    candidates = [r for r in results if r["f1"] >= baseline["f1"]]
+    fastest = min(candidates, key=lambda r: r["ms_per_frame"])
+    if fastest is not baseline:
+        print(f"Fastest at current accuracy or better: {json.dumps(fastest['config'])} "
+              f"({fastest['ms_per_frame']:.2f} vs {baseline['ms_per_frame']:.2f} ms/frame)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tunes the red-box detection parameters on hand-checked steps")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    label = commands.add_parser("label", help="Writes a labels file from a content plan (boxes to be checked by hand)")
+    label.add_argument("--video", required=True)
+    label.add_argument("--plan", default="content_plan.json")
+    label.add_argument("--labels", default="labels.json")
+    label.add_argument("--capture", choices=CAPTURE_MODES, default=DEFAULT_CAPTURE)
+    label.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND)
+
+    search = commands.add_parser("tune", help="Scores parameter configurations on a labels file")
+    search.add_argument("labels")
+    search.add_argument("--search", choices=("grid", "random"), default="random")
+    search.add_argument("--params", default="", help=f"Comma separated, from {', '.join(SEARCH_SPACE)} (default: all)")
+    search.add_argument("--trials", type=int, default=100, help="Random configurations to draw")
+    search.add_argument("--seed", type=int, default=0)
+    search.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    search.add_argument("--top", type=int, default=10)
+    search.add_argument("--output", default=RESULTS_FILE)
+    search.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND)
+    args = parser.parse_args()
+
+    if args.command == "label":
+        labels = make_labels(args.video, args.plan, args.capture, args.backend)
+        frames_path = load_frames(args.labels, labels, args.backend)
+        frames = np.load(frames_path, mmap_mode='r')
+        for step, pair in zip(labels["steps"], frames):
+            step["boxes"] = [list(b) for b in detect_redboxes(np.asarray(pair[0]), np.asarray(pair[1]))]
+        with open(args.labels, 'w', encoding='utf-8') as f:
+            json.dump(labels, f, ensure_ascii=False, indent=1)
+        print(f"Wrote {len(labels['steps'])} steps to {args.labels}; check the boxes by hand before tuning")
+        sys.exit(0)
+
+    names = [n.strip() for n in args.params.split(",") if n.strip()]
+    try:
+        configs = make_configs(args.search, names, args.trials, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.search == "grid" and len(configs) > 5000:
+        parser.error(f"grid of {len(configs)} configurations, pick fewer --params or use --search random")
+    results = tune(args.labels, configs, args.workers, args.backend)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({"labels": args.labels, "search": args.search, "results": results}, f, ensure_ascii=False, indent=1)
+    print_results(results, args.top)
+    print(f"All results written to {args.output}")
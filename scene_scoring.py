@@ -0,0 +1,145 @@
+import time
+import cv2
+import numpy as np
+
+# histogram and phash score a small luma thumbnail instead of the full-resolution BGR frame.
+# absdiff stays at full resolution (frame_difference): a thumbnail averages fine detail
+# away, so replaced text scores far lower on it and the scene cut is lost. Its scene loop
+# therefore keeps the last scene's full BGR frame (about 6 MB at 1080p) instead of a small
+# signature; only histogram and phash keep just the thumbnail.
+THUMB_SIZE = (160, 90)
+
+METRICS = ("absdiff", "histogram", "phash")
+
+# Score above which two frames count as different scenes.
+# absdiff keeps the old SCENE_CHANGE_THRESHOLD of doc_generator.
+DEFAULT_THRESHOLDS = {
+    "absdiff": 5.0,    # mean grayscale per-pixel difference at full resolution (0-255)
+    "histogram": 10.0, # % of the 32-bin luma histogram mass that moved (0-100)
+    "phash": 10,       # differing bits of the 64-bit perceptual hash (0-64)
+}
+
+HIST_BINS = 32
+PHASH_SIZE = 8
+
+def make_thumbnail(frame, size=THUMB_SIZE):
+    # Grayscale, downscaled copy of a BGR frame (uint8, shape (h, w))
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+def frame_difference(frame_a, frame_b):
+    # calculate_image_difference on in-memory BGR frames: mean of the grayscale per-pixel
+    # difference, 100 for frames of different sizes. cv2.sumElems adds the uint8 pixels
+    # exactly, so this is np.mean's value at about half the time.
+    if frame_a.shape != frame_b.shape:
+        return 100.0
+    gray = cv2.cvtColor(cv2.absdiff(frame_a, frame_b), cv2.COLOR_BGR2GRAY)
+    return cv2.sumElems(gray)[0] / gray.size
+
+def scene_signature(frame, metric="absdiff"):
+    # What the scene loop keeps of a decoded frame (frame_source frame) for `metric`:
+    # the full BGR frame for absdiff (no smaller signature gives the same cuts), a luma
+    # thumbnail for the others
+    return frame.bgr() if metric == "absdiff" else frame.thumbnail(THUMB_SIZE)
+
+def signature_score(reference, candidate, metric="absdiff"):
+    # Score of two scene_signature values
+    if metric == "absdiff":
+        return frame_difference(reference, candidate)
+    return score(reference, candidate, metric)
+
+def _dct_matrix(n, rows):
+    # First `rows` rows of the orthonormal DCT-II matrix of size n
+    k = np.arange(rows)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m.astype(np.float32)
+
+_dct_cache = {}
+
+def _low_freq_dct(thumbs):
+    # Top-left PHASH_SIZE x PHASH_SIZE DCT coefficients of every thumbnail in one matmul
+    h, w = thumbs.shape[1:]
+    if (h, w) not in _dct_cache:
+        _dct_cache[(h, w)] = (_dct_matrix(h, PHASH_SIZE), _dct_matrix(w, PHASH_SIZE).T)
+    dct_rows, dct_cols = _dct_cache[(h, w)]
+    return dct_rows @ thumbs.astype(np.float32) @ dct_cols
+
+def phash_bits(thumbs):
+    # 64-bit perceptual hashes as a (N, 64) bool array
+    coeffs = _low_freq_dct(thumbs).reshape(len(thumbs), -1)
+    # The DC term only carries the overall brightness, leave it out of the median
+    ac = coeffs[:, 1:]
+    mid = ac.shape[1] // 2
+    median = np.partition(ac, mid, axis=1)[:, mid:mid + 1]
+    return coeffs > median
+
+def luma_histograms(thumbs):
+    # Normalized HIST_BINS-bin histograms as a (N, HIST_BINS) array, one bincount for the batch
+    n = len(thumbs)
+    bins = (thumbs.reshape(n, -1) >> 3).astype(np.intp) + (np.arange(n) * HIST_BINS)[:, None]
+    counts = np.bincount(bins.ravel(), minlength=n * HIST_BINS).reshape(n, HIST_BINS)
+    return counts / float(thumbs[0].size)
+
+def score_batch(reference, candidates, metric="absdiff"):
+    # Scores every candidate thumbnail against the reference thumbnail.
+    # candidates: (N, h, w) uint8 array or a list of thumbnails. Returns a float array of N scores.
+    candidates = np.asarray(candidates)
+    if candidates.ndim == 2:
+        candidates = candidates[None]
+    if reference.shape != candidates.shape[1:]:
+        raise ValueError(f"Thumbnail size mismatch: {reference.shape} vs {candidates.shape[1:]}")
+
+    if metric == "absdiff":
+        # Thumbnail approximation (batch/offline use); lower than frame_difference on fine detail
+        diff = np.abs(candidates.astype(np.int16) - reference.astype(np.int16))
+        return diff.mean(axis=(1, 2))
+    if metric == "histogram":
+        hists = luma_histograms(np.concatenate([reference[None], candidates]))
+        return np.abs(hists[1:] - hists[0]).sum(axis=1) * 50.0
+    if metric == "phash":
+        bits = phash_bits(np.concatenate([reference[None], candidates]))
+        return np.count_nonzero(bits[1:] != bits[0], axis=1).astype(np.float64)
+    raise ValueError(f"Unknown scene metric: {metric} (expected one of {METRICS})")
+
+def score(reference, candidate, metric="absdiff"):
+    return float(score_batch(reference, candidate[None], metric)[0])
+
+def is_scene_change(score_value, metric="absdiff", threshold=None):
+    if threshold is None:
+        threshold = DEFAULT_THRESHOLDS[metric]
+    return score_value > threshold
+
+if __name__ == "__main__":
+    # Micro-benchmark of one comparison on 1080p frames. The thumbnail scores are other
+    # metrics with their own thresholds (and cuts), not a faster absdiff.
+    rng = np.random.default_rng(0)
+    frame_a = rng.integers(0, 255, (1080, 1920, 3), dtype=np.uint8)
+    frame_b = frame_a.copy()
+    frame_b[300:600, 800:1400] = 255
+    runs = 50
+
+    def per_run_ms(fn):
+        start = time.perf_counter()
+        for _ in range(runs):
+            fn()
+        return (time.perf_counter() - start) / runs * 1000
+
+    old_ms = per_run_ms(lambda: np.mean(cv2.cvtColor(cv2.absdiff(frame_a, frame_b), cv2.COLOR_BGR2GRAY)))
+    full_ms = per_run_ms(lambda: frame_difference(frame_a, frame_b))
+    print(f"full-res absdiff: {full_ms:.3f} ms/comparison (np.mean: {old_ms:.3f} ms), "
+          f"score={frame_difference(frame_a, frame_b):.2f}")
+
+    thumb_a = make_thumbnail(frame_a)
+    thumb_b = make_thumbnail(frame_b)
+    for metric in METRICS:
+        ms = per_run_ms(lambda: score(thumb_a, thumb_b, metric))
+        print(f"thumbnail {metric:>9}: {ms:.3f} ms/comparison, score={score(thumb_a, thumb_b, metric):.2f}"
+              + (" (approximation, lower on fine detail)" if metric == "absdiff" else ""))
+
+    batch = np.stack([thumb_b] * 100)
+    start = time.perf_counter()
+    score_batch(thumb_a, batch, "absdiff")
+    print(f"batch of 100 (absdiff): {(time.perf_counter() - start) * 1000:.3f} ms")
@@ -0,0 +1,102 @@
+import queue
+import threading
+
+# Runs the stages of a build at the same time, connected by bounded queues:
+#   source (one thread, e.g. the decoder) -> stage 1 (n threads) -> stage 2 (m threads) ...
+# and hands the output of the last stage back to the calling thread in index order (the
+# docx writer must add the steps in plan order). A full queue blocks the stage feeding
+# it, so at most queue_size items wait between two stages and one more is held by every
+# thread: memory stays bounded however far the decoder could run ahead.
+# The stages are plain functions; OpenCV releases the GIL in its heavy calls, so threads
+# are enough to keep several cores busy.
+PIPELINE_QUEUE_SIZE = 8
+
+# How often blocked threads look at the stop flag
+_POLL_SEC = 0.1
+
+def staged_results(source, stages, count, queue_size=PIPELINE_QUEUE_SIZE, check=None):
+    # source: iterable of (index, item) with indexes in 0..count-1, consumed in its own thread.
+    # stages: [(function, threads), ...]; function(item) returns the item of the next stage.
+    # Yields the last stage's output for every index in order, None for indexes the source
+    # never produced. check: called while waiting (e.g. ProgressReporter.check, which
+    # raises to cancel). Closing the generator stops every thread.
+    stop = threading.Event()
+    queues = [queue.Queue(queue_size) for _ in stages]
+    state = threading.Condition()
+    results = {}
+    errors = []
+    counts = {"produced": 0, "finished": 0, "source_done": False}
+
+    def put(q, entry):
+        while not stop.is_set():
+            try:
+                q.put(entry, timeout=_POLL_SEC)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def fail(e):
+        with state:
+            errors.append(e)
+            state.notify_all()
+        stop.set()
+
+    def produce():
+        try:
+            for index, item in source:
+                with state:
+                    counts["produced"] += 1
+                if not put(queues[0], (index, item)):
+                    return
+        except BaseException as e:
+            fail(e)
+        finally:
+            with state:
+                counts["source_done"] = True
+                state.notify_all()
+
+    def work(k):
+        function = stages[k][0]
+        while not stop.is_set():
+            try:
+                index, item = queues[k].get(timeout=_POLL_SEC)
+            except queue.Empty:
+                continue
+            try:
+                item = function(item)
+            except BaseException as e:
+                fail(e)
+                return
+            if k + 1 < len(stages):
+                if not put(queues[k + 1], (index, item)):
+                    return
+            else:
+                with state:
+                    results[index] = item
+                    counts["finished"] += 1
+                    state.notify_all()
+
+    threads = [threading.Thread(target=produce, name="pipeline-source", daemon=True)]
+    for k, (function, n) in enumerate(stages):
+        threads += [threading.Thread(target=work, args=(k,), name=f"pipeline-{k + 1}.{t + 1}", daemon=True)
+                    for t in range(max(1, n))]
+    for thread in threads:
+        thread.start()
+    try:
+        for index in range(count):
+            with state:
+                while (index not in results and not errors and
+                       not (counts["source_done"] and counts["finished"] == counts["produced"])):
+                    state.wait(_POLL_SEC)
+                    if check is not None:
+                        check()
+                if errors:
+                    # The first failure of any stage, raised in the calling thread
+                    raise errors[0]
+                result = results.pop(index, None)
+            yield result
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
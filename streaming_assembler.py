@@ -0,0 +1,276 @@
+import os
+import json
+import shutil
+import hashlib
+import zipfile
+from lxml import etree
+from docx.image.image import Image
+from docx.oxml.shape import CT_Inline
+from docx.shared import Inches
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+
+from assembler import (prepare_template_document, plan_step_jobs, add_step_text, add_step_caption,
+                       extract_plan_frames_cached, capture_windows, extraction_params, TEMPLATE_FILE,
+                       IMG_DIR, DEFAULT_CAPTURE, REDBOX_VERSION)
+from activity_timeline import load_timeline
+from frame_cache import FrameCache, video_fingerprint
+from image_optimizer import optimize_images, DEFAULT_DPI
+from frame_source import DEFAULT_BACKEND
+from pipeline_timing import timings
+
+# Streaming build: the body of the document is written step by step to a fragment file
+# next to the output, the images stay on disk, and the final .docx is assembled as a zip
+# stream. Peak memory is the template plus one step, whatever the plan length.
+# A failed run leaves <output>.parts behind (with a copy of every embedded image) and the
+# next run of the same build resumes after the last completed batch.
+
+BODY_MARKER = "@@AUTODOC_STREAM_BODY@@"
+STREAM_BATCH_STEPS = 10
+
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+IMAGE_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+CONTENT_TYPES = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png"}
+
+def _build_key(plan, template_file, settings=None):
+    # settings: everything else the written steps depend on (video, extraction and image
+    # parameters); a run with other settings starts over instead of resuming
+    h = hashlib.sha256(json.dumps(plan, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    h.update(os.path.abspath(template_file).encode('utf-8'))
+    h.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+class StreamingDocBuilder:
+    def __init__(self, output_docx, plan, template_file=TEMPLATE_FILE, settings=None):
+        self.output_docx = output_docx
+        self.parts_dir = output_docx + ".parts"
+        self.skeleton_path = os.path.join(self.parts_dir, "skeleton.docx")
+        self.body_path = os.path.join(self.parts_dir, "body.xml")
+        self.progress_path = os.path.join(self.parts_dir, "progress.json")
+        self.media_dir = os.path.join(self.parts_dir, "media")
+        self.build_key = _build_key(plan, template_file, settings)
+        self.template_file = template_file
+        self.progress = None
+
+    def open(self):
+        # Resumes a previous run of the same plan, or starts a new one.
+        # Returns the number of plan items already written.
+        progress = self._load_progress()
+        if progress and progress["key"] == self.build_key and os.path.exists(self.skeleton_path):
+            self.progress = progress
+            # Drop anything written after the last flush
+            with open(self.body_path, 'r+b') as f:
+                f.truncate(progress["body_bytes"])
+            from docx import Document
+            self.doc = Document(self.skeleton_path)
+            print(f"Resuming streaming build after {progress['done']} plan items")
+            return progress["done"]
+
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+        os.makedirs(self.media_dir)
+        self.doc, anchor_element = prepare_template_document(self.template_file)
+        # Placeholder where the streamed body goes (template anchoring as before)
+        marker = self.doc.add_paragraph(BODY_MARKER)
+        if anchor_element is not None:
+            anchor_element.addprevious(marker._element)
+        self.doc.save(self.skeleton_path)
+        open(self.body_path, 'wb').close()
+        self.progress = {"key": self.build_key, "done": 0, "body_bytes": 0, "images": [],
+                         "next_shape_id": self.doc.part.next_id}
+        self._save_progress()
+        return 0
+
+    def _load_progress(self):
+        try:
+            with open(self.progress_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_progress(self):
+        tmp_path = self.progress_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.progress, f)
+        os.replace(tmp_path, self.progress_path)
+
+    def _write(self, paragraph):
+        # Serializes a paragraph built on the skeleton document, then detaches it
+        element = paragraph._element
+        with open(self.body_path, 'ab') as f:
+            f.write(etree.tostring(element, encoding='utf-8'))
+        element.getparent().remove(element)
+
+    def add_heading(self, text, level):
+        self._write(self.doc.add_heading(text, level=level))
+
+    def add_step(self, item, step_counter, img_path, box_count):
+        self._write(add_step_text(self.doc, item, box_count))
+        if box_count is False:
+            return
+        try:
+            image = Image.from_file(img_path)
+            index = len(self.progress["images"]) + 1
+            rId = f"rIdAutoDoc{index}"
+            media_name = f"autodoc_step{index}.{image.ext}"
+            cx, cy = image.scaled_dimensions(Inches(6), None)
+            shape_id = self.progress["next_shape_id"]
+            inline = CT_Inline.new_pic_inline(shape_id, rId, media_name, cx, cy)
+
+            pic_p = self.doc.add_paragraph()
+            pic_p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+            pic_p.add_run()._r.add_drawing(inline)
+            self._write(pic_p)
+            # Kept with the parts: the embed folder is shared and may change before a resume
+            media_path = os.path.join(self.media_dir, media_name)
+            shutil.copyfile(img_path, media_path)
+            self.progress["images"].append([rId, media_name, media_path])
+            self.progress["next_shape_id"] = shape_id + 1
+
+            self._write(add_step_caption(self.doc, step_counter))
+        except Exception as e:
+            print(f"Error adding image: {e}")
+
+    def flush(self, done):
+        # Marks the first `done` plan items as durable
+        self.progress["done"] = done
+        self.progress["body_bytes"] = os.path.getsize(self.body_path)
+        self._save_progress()
+
+    def finish(self):
+        # Streams skeleton + body fragments + images into the final .docx
+        tmp_output = self.output_docx + ".tmp"
+        with zipfile.ZipFile(self.skeleton_path) as src, \
+                zipfile.ZipFile(tmp_output, 'w', zipfile.ZIP_DEFLATED) as dst:
+            for info in src.infolist():
+                if info.filename == "word/document.xml":
+                    self._write_document_xml(src.read(info), dst)
+                elif info.filename == "word/_rels/document.xml.rels":
+                    dst.writestr(info.filename, self._patched_rels(src.read(info)))
+                elif info.filename == "[Content_Types].xml":
+                    dst.writestr(info.filename, self._patched_content_types(src.read(info)))
+                else:
+                    dst.writestr(info, src.read(info))
+            for _, media_name, media_path in self.progress["images"]:
+                dst.write(media_path, "word/media/" + media_name)
+        os.replace(tmp_output, self.output_docx)
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+
+    def _write_document_xml(self, xml, dst):
+        marker_pos = xml.find(BODY_MARKER.encode('utf-8'))
+        start = max(xml.rfind(b"<w:p>", 0, marker_pos), xml.rfind(b"<w:p ", 0, marker_pos))
+        end = xml.find(b"</w:p>", marker_pos) + len(b"</w:p>")
+        with dst.open("word/document.xml", 'w') as out:
+            out.write(xml[:start])
+            with open(self.body_path, 'rb') as body:
+                shutil.copyfileobj(body, out, 1024 * 1024)
+            out.write(xml[end:])
+
+    def _patched_rels(self, xml):
+        root = etree.fromstring(xml)
+        for rId, media_name, _ in self.progress["images"]:
+            rel = etree.SubElement(root, f"{{{REL_NS}}}Relationship")
+            rel.set("Id", rId)
+            rel.set("Type", IMAGE_REL)
+            rel.set("Target", "media/" + media_name)
+        return etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+    def _patched_content_types(self, xml):
+        root = etree.fromstring(xml)
+        known = set(d.get("Extension", "").lower() for d in root.findall(f"{{{CT_NS}}}Default"))
+        for _, media_name, _ in self.progress["images"]:
+            ext = media_name.rsplit('.', 1)[-1].lower()
+            if ext not in known:
+                default = etree.Element(f"{{{CT_NS}}}Default")
+                default.set("Extension", ext)
+                default.set("ContentType", CONTENT_TYPES.get(ext, "image/" + ext))
+                # Defaults must come before Overrides
+                root.insert(0, default)
+                known.add(ext)
+        return etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+def create_doc_streaming(video_path, plan_path, output_docx, workers=1, use_cache=True,
+                         batch_steps=STREAM_BATCH_STEPS, image_format="auto", dpi=DEFAULT_DPI,
+                         backend=DEFAULT_BACKEND, template_file=TEMPLATE_FILE, img_dir=IMG_DIR,
+                         capture=DEFAULT_CAPTURE, use_timeline=False):
+    # Same document as assembler.create_doc_from_plan, built with bounded memory.
+    # Frames are extracted batch by batch and progress is flushed after each batch.
+    with open(plan_path, 'r', encoding='utf-8') as f:
+        plan = json.load(f)
+
+    steps = [item for item in plan if item['type'] == 'step']
+    jobs = plan_step_jobs(steps, img_dir)
+    # Windows of the whole plan, so a batch border does not change what a step captures
+    windows = capture_windows([t for t, _ in jobs]) if capture == "events" else None
+    timeline = None
+    if use_timeline and windows is not None and os.path.exists(video_path):
+        with timings.stage("timeline"):
+            timeline = load_timeline(video_path, backend)
+
+    settings = {
+        "video": video_fingerprint(video_path) if os.path.exists(video_path) else os.path.abspath(video_path),
+        "params": extraction_params(backend, capture, timeline),
+        "version": REDBOX_VERSION,
+        "image_format": image_format,
+        "dpi": dpi,
+    }
+    builder = StreamingDocBuilder(output_docx, plan, template_file, settings=settings)
+    done = builder.open()
+    cache = FrameCache() if use_cache and os.path.exists(video_path) else None
+
+    # Step number of every plan item (0 for headings)
+    step_numbers = []
+    step_counter = 0
+    for item in plan:
+        if item['type'] == 'step':
+            step_counter += 1
+            step_numbers.append(step_counter)
+        else:
+            step_numbers.append(0)
+
+    index = done
+    while index < len(plan):
+        # Next batch: up to batch_steps steps plus the headings around them
+        end = index
+        batch_steps_seen = 0
+        while end < len(plan) and (batch_steps_seen < batch_steps or not step_numbers[end]):
+            if step_numbers[end]:
+                batch_steps_seen += 1
+            end += 1
+
+        batch_numbers = [n for n in step_numbers[index:end] if n]
+        batch_jobs = [jobs[n - 1] for n in batch_numbers]
+        print(f"Extracting steps {batch_numbers[0] if batch_numbers else '-'}"
+              f"-{batch_numbers[-1] if batch_numbers else '-'} of {len(jobs)}...")
+        with timings.stage("extract"):
+            extracted = dict(zip(batch_numbers, extract_plan_frames_cached(
+                video_path, batch_jobs, workers, cache, backend, capture=capture,
+                windows=[windows[n - 1] for n in batch_numbers] if windows else None, timeline=timeline)))
+        with timings.stage("optimize"):
+            embed_paths = dict(zip(batch_numbers, optimize_images(
+                [job[1] if extracted[n] is not False else None for n, job in zip(batch_numbers, batch_jobs)],
+                os.path.join(img_dir, "embed"), image_format, dpi)))
+
+        for i in range(index, end):
+            item = plan[i]
+            if item['type'] == 'heading':
+                builder.add_heading(item['text'], item['level'])
+            elif item['type'] == 'step':
+                n = step_numbers[i]
+                time_sec = jobs[n - 1][0]
+                print(f"Processing Step {n}: {item['text'][:30]}... at {time_sec}s")
+                boxes = extracted[n]
+                box_count = len(boxes) if boxes is not False else False
+                with timings.stage("embed", image=os.path.basename(jobs[n - 1][1])):
+                    builder.add_step(item, n, embed_paths[n], box_count)
+
+        with timings.stage("flush"):
+            builder.flush(end)
+        index = end
+
+    with timings.stage("save"):
+        builder.finish()
+    print(f"Successfully saved {output_docx}")
+
+    if cache is not None:
+        cache.evict()
+        print(cache.report())
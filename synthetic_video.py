@@ -0,0 +1,307 @@
+import os
+import sys
+import json
+import cv2
+import numpy as np
+from docx import Document
+
+# Synthetic SAP-like screen recordings for benchmarks and tuning: title/menu/tool bars,
+# tabs, a form with input fields and a grid with checkboxes, changed by a scripted
+# sequence of clicks, typing, row selections and dialogs. Every event is recorded with
+# the rectangle that changed, so detections can be checked against ground truth.
+# The layout is drawn in 1280x720 units and scaled to the requested size.
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080), "1440p": (2560, 1440)}
+DATASET_VERSION = 2
+
+EVENT_INTERVAL_SEC = 4.0
+# Plan steps are placed this long after their event, once the screen has settled
+STEP_DELAY_SEC = 1.0
+# Dialogs fade in and out over this long, like the real client's animations
+DIALOG_ANIMATION_SEC = 0.5
+
+BACKGROUND = (240, 236, 232)
+TITLE_BAR = (95, 74, 53)
+BAR = (225, 220, 214)
+BORDER = (150, 140, 130)
+TEXT = (30, 30, 30)
+SELECTED = (250, 215, 160)
+WHITE = (255, 255, 255)
+
+TABS = ["Genel", "Para Birimi", "Kurlar", "Onay"]
+FIELDS = ["Sirket kodu", "Para birimi", "Kur tipi", "Gecerlilik", "Referans"]
+FIELD_VALUES = ["1000", "EUR", "M", "01.07.2025", "REF-42", "USD", "2000", "B", "TRY"]
+GRID_ROWS = 16
+
+# Layout (1280x720 units)
+FORM_X, FORM_Y, FIELD_H = 20, 136, 36
+GRID_X0, GRID_Y0, GRID_X1, ROW_H = 440, 132, 1260, 28
+TAB_Y, TAB_W = 96, 130
+DIALOG = (440, 260, 400, 200)
+
+def grid_row_rect(row):
+    return (GRID_X0, GRID_Y0 + ROW_H * (row + 1), GRID_X1 - GRID_X0, ROW_H)
+
+def field_rect(field):
+    return (FORM_X + 170, FORM_Y + FIELD_H * field, 230, 26)
+
+def tab_rect(tab):
+    return (20 + tab * (TAB_W + 4), TAB_Y, TAB_W, 28)
+
+def script_events(seconds, seed=0):
+    # The scripted session: one event every EVENT_INTERVAL_SEC. Each event carries the
+    # state after it, the changed rectangle (layout units) and the spoken/plan text.
+    rng = np.random.default_rng(seed)
+    state = {"checked": [], "selected": None, "values": {}, "dialog": False, "tab": 0}
+    events = []
+    t = EVENT_INTERVAL_SEC / 2
+    while t < seconds - STEP_DELAY_SEC:
+        state = json.loads(json.dumps(state))
+        if state["dialog"]:
+            kind = "dialog_close"
+        else:
+            kind = ["check", "check", "type", "type", "select", "dialog", "tab"][rng.integers(7)]
+        if kind == "check":
+            row = int(rng.integers(GRID_ROWS))
+            if row in state["checked"]:
+                state["checked"].remove(row)
+            else:
+                state["checked"].append(row)
+            rect = grid_row_rect(row)
+            label = f"Malzeme {row + 1}"
+            text = f"{label} satırını işaretleyiniz."
+            speech = f"Şimdi burada {label} satırını işaretliyoruz."
+        elif kind == "type":
+            field = int(rng.integers(len(FIELDS)))
+            value = FIELD_VALUES[int(rng.integers(len(FIELD_VALUES)))]
+            state["values"][str(field)] = value
+            rect = field_rect(field)
+            text = f"{FIELDS[field]} alanına {value} giriniz."
+            speech = f"Arkadaşlar {FIELDS[field]} alanına {value} yazıyoruz."
+        elif kind == "select":
+            row = int(rng.integers(GRID_ROWS))
+            state["selected"] = row
+            rect = grid_row_rect(row)
+            text = f"Listeden {row + 1}. satırı seçiniz."
+            speech = f"Yani listeden {row + 1}. satırı seçiyoruz."
+        elif kind == "dialog":
+            state["dialog"] = True
+            rect = DIALOG
+            text = "Kaydet butonuna basınız, onay penceresi açılır."
+            speech = "Kaydet butonuna basıyoruz, gördüğünüz gibi onay penceresi açılıyor."
+        elif kind == "dialog_close":
+            state["dialog"] = False
+            rect = DIALOG
+            text = "Onay penceresinde Evet butonuna basınız."
+            speech = "Onay penceresinde aslında Evet diyoruz ve devam ediyoruz."
+        else:
+            state["tab"] = (state["tab"] + 1 + int(rng.integers(len(TABS) - 1))) % len(TABS)
+            state["checked"] = []
+            state["selected"] = None
+            rect = (GRID_X0, GRID_Y0, GRID_X1 - GRID_X0, ROW_H * (GRID_ROWS + 1))
+            text = f"{TABS[state['tab']]} sekmesine geçiniz."
+            speech = f"Öncelikle {TABS[state['tab']]} sekmesine geçiyoruz."
+        events.append({"time": round(t, 3), "kind": kind, "rect": rect, "text": text,
+                       "speech": speech, "state": state})
+        t += EVENT_INTERVAL_SEC
+    return events
+
+def render_screen(state, width, height, cursor=None):
+    # Draws the screen for a state; cursor: (x, y) in layout units or None
+    s = height / 720.0
+    img = np.full((height, width, 3), BACKGROUND, np.uint8)
+    thick = max(1, int(round(s)))
+
+    def r(v):
+        return int(round(v * s))
+
+    def box(x, y, w, h, color, fill=True):
+        cv2.rectangle(img, (r(x), r(y)), (r(x + w), r(y + h)), color, -1 if fill else thick)
+
+    def text(msg, x, y, scale=0.45, color=TEXT):
+        cv2.putText(img, msg, (r(x), r(y)), cv2.FONT_HERSHEY_SIMPLEX, scale * s, color, thick, cv2.LINE_AA)
+
+    box(0, 0, 1280, 32, TITLE_BAR)
+    text("SAP Easy Access - Coklu Para Birimi Sihirbazi", 12, 22, 0.55, WHITE)
+    box(0, 32, 1280, 24, BAR)
+    for i, item in enumerate(["Menu", "Duzenle", "Git", "Ekstralar", "Sistem", "Yardim"]):
+        text(item, 12 + i * 90, 49)
+    for i in range(10):
+        box(12 + i * 34, 62, 26, 24, BORDER, fill=False)
+    for i, name in enumerate(TABS):
+        x, y, w, h = tab_rect(i)
+        box(x, y, w, h, WHITE if i == state["tab"] else BAR)
+        box(x, y, w, h, BORDER, fill=False)
+        text(name, x + 10, y + 19)
+
+    # Form
+    for i, name in enumerate(FIELDS):
+        text(name, FORM_X + 8, FORM_Y + FIELD_H * i + 18)
+        x, y, w, h = field_rect(i)
+        box(x, y, w, h, WHITE)
+        box(x, y, w, h, BORDER, fill=False)
+        value = state["values"].get(str(i))
+        if value:
+            text(value, x + 6, y + 18)
+
+    # Grid
+    box(GRID_X0, GRID_Y0, GRID_X1 - GRID_X0, ROW_H, BAR)
+    for j, header in enumerate(["Sec", "Malzeme", "Tanim", "Miktar", "PB"]):
+        text(header, GRID_X0 + 8 + j * 160, GRID_Y0 + 19)
+    page = state["tab"] * 100
+    for row in range(GRID_ROWS):
+        x, y, w, h = grid_row_rect(row)
+        box(x, y, w, h, SELECTED if state["selected"] == row else WHITE)
+        box(x, y, w, h, BORDER, fill=False)
+        box(x + 10, y + 7, 14, 14, TEXT, fill=False)
+        if row in state["checked"]:
+            cv2.line(img, (r(x + 12), r(y + 14)), (r(x + 16), r(y + 19)), TEXT, thick + 1)
+            cv2.line(img, (r(x + 16), r(y + 19)), (r(x + 23), r(y + 9)), TEXT, thick + 1)
+        text(f"MAT-{page + row + 1:05d}", x + 168, y + 19)
+        text(f"Malzeme {row + 1}", x + 328, y + 19)
+        text(f"{(page + row * 37) % 500 + 1:>4} ADT", x + 488, y + 19)
+        text(["EUR", "USD", "TRY"][(page + row) % 3], x + 648, y + 19)
+
+    if state["dialog"]:
+        x, y, w, h = DIALOG
+        box(x + 6, y + 6, w, h, BORDER)
+        box(x, y, w, h, WHITE)
+        box(x, y, w, 30, TITLE_BAR)
+        text("Onay", x + 10, y + 21, 0.5, WHITE)
+        text("Degisiklikler kaydedilsin mi?", x + 20, y + 80, 0.55)
+        for k, label in enumerate(["Evet", "Hayir"]):
+            box(x + 90 + k * 130, y + 140, 100, 32, BAR)
+            box(x + 90 + k * 130, y + 140, 100, 32, BORDER, fill=False)
+            text(label, x + 120 + k * 130, y + 162)
+
+    box(0, 692, 1280, 28, BAR)
+    if cursor is not None:
+        cx, cy = cursor
+        pts = np.array([(cx, cy), (cx, cy + 18), (cx + 5, cy + 14), (cx + 12, cy + 14)])
+        cv2.fillPoly(img, [np.round(pts * s).astype(np.int32)], TEXT)
+    return img
+
+def write_video(path, events, width, height, seconds, fps):
+    # Frames only change at events, so every screen is rendered once and repeated
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Cannot write video: {path}")
+    initial = {"checked": [], "selected": None, "values": {}, "dialog": False, "tab": 0}
+    screen = render_screen(initial, width, height)
+    previous = animation_end = None
+    next_event = 0
+    for i in range(int(round(seconds * fps))):
+        t = i / fps
+        if next_event < len(events) and t >= events[next_event]["time"]:
+            event = events[next_event]
+            x, y, w, h = event["rect"]
+            previous = screen
+            screen = render_screen(event["state"], width, height, cursor=(x + min(w, 40) / 2, y + h / 2))
+            animated = event["kind"] in ("dialog", "dialog_close")
+            animation_end = event["time"] + DIALOG_ANIMATION_SEC if animated else None
+            next_event += 1
+        if animation_end is not None and t < animation_end:
+            alpha = 1.0 - (animation_end - t) / DIALOG_ANIMATION_SEC
+            writer.write(cv2.addWeighted(screen, alpha, previous, 1.0 - alpha, 0))
+        else:
+            writer.write(screen)
+    writer.release()
+
+def scale_rect(rect, height):
+    s = height / 720.0
+    return [int(round(v * s)) for v in rect]
+
+def make_plan(events, steps_per_heading=5):
+    plan = []
+    for i, event in enumerate(events):
+        if i % steps_per_heading == 0:
+            plan.append({"type": "heading", "level": 1, "text": f"{i // steps_per_heading + 1}. Bölüm"})
+        plan.append({"type": "step", "time": round(event["time"] + STEP_DELAY_SEC, 3), "text": event["text"]})
+    return plan
+
+def _vtt_time(seconds):
+    ms = int(round(seconds * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}.{ms % 1000:03d}"
+
+def write_vtt(path, events, repeat=1, period=None):
+    # One cue on every event and one in between; repeat > 1 appends shifted copies
+    # (a long transcript for text benchmarks, period = length of one copy in seconds)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("WEBVTT\n\n")
+        n = 0
+        for k in range(repeat):
+            offset = k * (period or 0)
+            for event in events:
+                t = offset + event["time"]
+                for start, end, line in ((t - 0.3, t + 1.8, event["speech"]),
+                                         (t + 2.0, t + 3.7, "Burada tabii ki kontrol ediyoruz, zaten kaydedeceğiz.")):
+                    n += 1
+                    f.write(f"{n}\n{_vtt_time(max(0.0, start))} --> {_vtt_time(end)}\n"
+                            f"Konuşmacı 1: {line}\n\n")
+    return n
+
+def score_detections(boxes_per_step, truth):
+    # boxes_per_step: drawn boxes (x, y, w, h) of every plan step, in event order.
+    # A box is on target when its center lies in the changed rectangle of the event.
+    # Returns (recall: share of steps with a box on target,
+    #          precision: share of boxes on target)
+    hits = on_target = total = 0
+    for boxes, event in zip(boxes_per_step, truth):
+        ex, ey, ew, eh = event["rect"]
+        good = sum(1 for x, y, w, h in (boxes or [])
+                   if ex <= x + w / 2 <= ex + ew and ey <= y + h / 2 <= ey + eh)
+        hits += good > 0
+        on_target += good
+        total += len(boxes or [])
+    recall = hits / len(truth) if truth else 0.0
+    precision = on_target / total if total else 0.0
+    return recall, precision
+
+def make_template(path):
+    # Minimal stand-in for the corporate template: title, history table, "1. Amaç" section
+    doc = Document()
+    doc.add_paragraph("Çoklu Para Birimi Sihirbazı Kullanıcı Dokümanı")
+    table = doc.add_table(rows=1, cols=4)
+    for i, header in enumerate(["Versiyon", "Tarih", "Yazar", "Açıklama"]):
+        table.rows[0].cells[i].text = header
+    doc.add_paragraph("1. Amaç")
+    doc.add_paragraph("Şablon içeriği")
+    doc.save(path)
+
+def generate_dataset(out_dir, name, width, height, seconds=60, fps=10, seed=0):
+    # Writes <name>.mp4, <name>.plan.json, <name>.vtt and <name>.events.json (ground truth,
+    # rectangles in pixels) into out_dir; reused when already generated with the same settings.
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, name)
+    paths = {"video": base + ".mp4", "plan": base + ".plan.json", "vtt": base + ".vtt", "events": base + ".events.json"}
+    settings = {"version": DATASET_VERSION, "width": width, "height": height, "seconds": seconds,
+                "fps": fps, "seed": seed}
+    try:
+        with open(paths["events"], 'r', encoding='utf-8') as f:
+            existing = json.load(f)
+        if existing["settings"] == settings and all(os.path.exists(p) for p in paths.values()):
+            return paths, existing["events"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    events = script_events(seconds, seed)
+    write_video(paths["video"], events, width, height, seconds, fps)
+    with open(paths["plan"], 'w', encoding='utf-8') as f:
+        json.dump(make_plan(events), f, ensure_ascii=False, indent=1)
+    write_vtt(paths["vtt"], events)
+    truth = [{"time": e["time"], "step_time": round(e["time"] + STEP_DELAY_SEC, 3), "kind": e["kind"],
+              "settled": round(e["time"] + (DIALOG_ANIMATION_SEC if e["kind"] in ("dialog", "dialog_close") else 0), 3),
+              "rect": scale_rect(e["rect"], height)} for e in events]
+    with open(paths["events"], 'w', encoding='utf-8') as f:
+        json.dump({"settings": settings, "events": truth}, f, ensure_ascii=False, indent=1)
+    return paths, truth
+
+if __name__ == "__main__":
+    # python synthetic_video.py <out_dir> [720p|1080p|1440p] [seconds]
+    out_dir = sys.argv[1]
+    resolution = sys.argv[2] if len(sys.argv) > 2 else "720p"
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 60
+    width, height = RESOLUTIONS[resolution]
+    paths, truth = generate_dataset(out_dir, f"sap_{resolution}", width, height, seconds)
+    print(f"{len(truth)} events")
+    for kind, path in paths.items():
+        print(f"  {kind}: {path}")
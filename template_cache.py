@@ -0,0 +1,54 @@
+import io
+import hashlib
+from docx import Document
+
+# Parsed and cleaned templates, kept for the lifetime of the process (a GUI session, a
+# batch worker). An entry is keyed on the sha256 of the template bytes, so an edited
+# template is cleaned again while a renamed or copied one is not. The cleaned document is
+# kept as .docx bytes and every build loads its own copy from them: no cleaning again,
+# and nothing of one build's document (python-docx caches wrappers of its XML, which a
+# deep copy would detach from the copied tree) is shared with another.
+MAX_TEMPLATES = 4
+
+def read_template_bytes(template_file):
+    # template_file: a path or a binary file-like object (batch workers pass BytesIO)
+    if hasattr(template_file, 'read'):
+        template_file.seek(0)
+        return template_file.read()
+    with open(template_file, 'rb') as f:
+        return f.read()
+
+class TemplateCache:
+    # prepare(file_like) -> (doc, anchor_element), anchor being a direct child of the body
+    def __init__(self, prepare, max_templates=MAX_TEMPLATES):
+        self.prepare = prepare
+        self.max_templates = max_templates
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}  # hash -> (cleaned .docx bytes, anchor position in the body or None)
+
+    def get(self, template_file):
+        # Returns a private (doc, anchor_element) for one build
+        data = read_template_bytes(template_file)
+        key = hashlib.sha256(data).hexdigest()
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            doc, anchor = self.prepare(io.BytesIO(data))
+            cleaned = io.BytesIO()
+            doc.save(cleaned)
+            entry = (cleaned.getvalue(), doc.element.body.index(anchor) if anchor is not None else None)
+            while len(self._entries) >= self.max_templates:
+                # Oldest first (dicts keep insertion order, hits are re-inserted)
+                self._entries.pop(next(iter(self._entries)))
+        else:
+            self.hits += 1
+        self._entries[key] = entry
+
+        cleaned, anchor_pos = entry
+        doc = Document(io.BytesIO(cleaned))
+        anchor = doc.element.body[anchor_pos] if anchor_pos is not None else None
+        return doc, anchor
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,188 @@
+import re
+import sys
+import time
+
+# Transcript cleanup rules of doc_generator, compiled once.
+# Every group of rules is a single alternation so a cue is scanned once per group
+# instead of once per rule.
+
+# Speaker labels and mm:ss timestamps
+LABEL_PATTERNS = [r'Speaker \d+:', r'Konuşmacı \d+:', r'\d{2}:\d{2}']
+
+FILLERS = [
+    "arkadaşlar", "şimdi", "burada", "gördüğünüz gibi",
+    "yani", "efendim", "öncelikle", "şeklinde", "tabii ki",
+    "mesela", "örneğin", "bu noktada", "aslında", "muhakkak",
+    "baktığımızda", "diyebiliriz", "açıkçası", "zaten"
+]
+
+# Spoken "we do / let's do" forms -> formal imperative ("yapıyoruz" -> "yapınız").
+# Order matters: with IGNORECASE "ı" also matches "i", the first rule wins as before.
+SUFFIX_RULES = [
+    ("iyoruz", "iniz"), ("ıyoruz", "ınız"), ("uyoruz", "unuz"), ("üyoruz", "ünüz"),
+    ("iyorsunuz", "iniz"), ("ıyorsunuz", "ınız"), ("uyorsunuz", "unuz"), ("üyorsunuz", "ünüz"),
+    ("eceğiz", "iniz"), ("acağız", "ınız"),
+    ("elim", "iniz"), ("alım", "ınız"),
+]
+
+class TextNormalizer:
+    def __init__(self, fillers=FILLERS, suffix_rules=SUFFIX_RULES):
+        self.label_re = re.compile('|'.join(LABEL_PATTERNS), re.IGNORECASE)
+        # Longest first, so a filler is never cut short by another one it starts with
+        fillers = sorted(fillers, key=len, reverse=True)
+        self.filler_re = re.compile(r'\b(?:' + '|'.join(re.escape(f) for f in fillers) + r')\b', re.IGNORECASE)
+        # One group per suffix; match.lastindex tells which rule matched.
+        # Anchored at the word start (where the old per-rule patterns matched anyway), so
+        # the engine does not retry from every letter of every word.
+        self.suffix_re = re.compile(r'\b(\w+)(?:' + '|'.join('(' + re.escape(s) + ')' for s, _ in suffix_rules) + r')\b',
+                                    re.IGNORECASE)
+        self.suffix_repl = [None, None] + [r for _, r in suffix_rules]
+        self.space_before_punct_re = re.compile(r'\s+([.,!?;:])')
+        self.space_re = re.compile(r'\s+')
+        self.sentence_split_re = re.compile(r'([.!?]+)')
+        self.terminator_re = re.compile(r'^[.!?]+$')
+
+    def _suffix(self, m):
+        return m.group(1) + self.suffix_repl[m.lastindex]
+
+    def clean(self, text):
+        text = self.label_re.sub('', text)
+        text = self.filler_re.sub('', text)
+        text = self.suffix_re.sub(self._suffix, text)
+
+        # Fix punctuation spacing
+        text = self.space_before_punct_re.sub(r'\1', text)
+        text = self.space_re.sub(' ', text).strip()
+        if not text:
+            return text
+
+        # Capitalize sentences
+        cleaned_sentences = []
+        for s in self.sentence_split_re.split(text):
+            s_clean = s.strip()
+            if not s_clean:
+                continue
+            if self.terminator_re.match(s_clean):
+                if cleaned_sentences:
+                    cleaned_sentences[-1] += s_clean
+            else:
+                cleaned_sentences.append(s_clean[0].upper() + s_clean[1:])
+        return " ".join(cleaned_sentences)
+
+    def clean_batch(self, texts):
+        # Cleans a whole cue list in one call
+        clean = self.clean
+        return [clean(t) for t in texts]
+
+def legacy_clean_text(text):
+    # Reference: the original doc_generator.clean_text_with_regex, kept for the parity check
+    # 1. Remove Speaker labels and Timestamps
+    text = re.sub(r'Speaker \d+:', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'Konuşmacı \d+:', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'\d{2}:\d{2}', '', text)
+    
+    # 2. Aggressive Filler Removal
+    fillers = [
+        "arkadaşlar", "şimdi", "burada", "gördüğünüz gibi", 
+        "yani", "efendim", "öncelikle", "şeklinde", "tabii ki",
+        "mesela", "örneğin", "bu noktada", "aslında", "muhakkak",
+        "baktığımızda", "diyebiliriz", "açıkçası", "zaten"
+    ]
+    
+    for filler in fillers:
+        pattern = re.compile(r'\b' + re.escape(filler) + r'\b', re.IGNORECASE)
+        text = pattern.sub('', text)
+        
+    # 3. VERB CONJUGATION TRANSFORMATION (The Core Logic)
+    # Target: Convert "yapıyoruz" (we are doing) to "yapınız" (do it / imperative formal)
+    # or "seçiyoruz" -> "seçiniz"
+    
+    # Common Present Continuous Suffixes in Turkish:
+    # -iyor, -ıyor, -uyor, -üyor
+    # 1st Plural: -iyoruz, -ıyoruz, -uyoruz, -üyoruz
+    # 2nd Plural: -iyorsunuz, ...
+    # Future: -acağız, -eceğiz
+    
+    # Rules:
+    # (word root) + (optional neg) + (suffix)
+    
+    # Map: "iyoruz" -> "iniz", "ıyoruz" -> "ınız", "uyoruz" -> "unuz", "üyoruz" -> "ünüz"
+    
+    replacements = [
+        (r'(\w+)iyoruz\b', r'\1iniz'),
+        (r'(\w+)ıyoruz\b', r'\1ınız'),
+        (r'(\w+)uyoruz\b', r'\1unuz'),
+        (r'(\w+)üyoruz\b', r'\1ünüz'),
+        
+        # Second person plural nuances
+        (r'(\w+)iyorsunuz\b', r'\1iniz'),
+        (r'(\w+)ıyorsunuz\b', r'\1ınız'),
+        (r'(\w+)uyorsunuz\b', r'\1unuz'),
+        (r'(\w+)üyorsunuz\b', r'\1ünüz'),
+        
+        # Basic imperative softener "lütfen" removal if valid, but keeping it is polite? 
+        # Actually corporate docs rarely use "lütfen".
+        
+        # Future tense -> Passive/Formal Future
+        # e.g. "yapacağız" -> "yapılacaktır" (hard to automate perfectly without root analysis)
+        # fallback: "yapacağız" -> "yapınız" might be safer for instructions
+        (r'(\w+)eceğiz\b', r'\1iniz'),
+        (r'(\w+)acağız\b', r'\1ınız'),
+        
+        # "ediyoruz" -> "ediniz" is handled by above generic rules but "etmek" requires care?
+        # "ediyoruz" -> "ed"+"iniz" works.
+        
+        # "basıyoruz" -> "basınız" works.
+        
+        # "girelim" -> "giriniz"
+        (r'(\w+)elim\b', r'\1iniz'),
+        (r'(\w+)alım\b', r'\1ınız'),
+    ]
+    
+    for pattern, repl in replacements:
+        text = re.sub(pattern, repl, text, flags=re.IGNORECASE)
+
+    # 4. Clean up formatting
+    # Fix punctuation spacing
+    text = re.sub(r'\s+([.,!?;:])', r'\1', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    
+    # Capitalize sentences
+    if text:
+        # Split by sentence terminators to capitalize each sentence
+        sentences = re.split(r'([.!?]+)', text)
+        cleaned_sentences = []
+        for s in sentences:
+            s_clean = s.strip()
+            if s_clean and not re.match(r'^[.!?]+$', s_clean):
+                s_clean = s_clean[0].upper() + s_clean[1:]
+                cleaned_sentences.append(s_clean)
+            elif re.match(r'^[.!?]+$', s_clean):
+                if cleaned_sentences:
+                    cleaned_sentences[-1] += s_clean
+                    
+        text = " ".join(cleaned_sentences)
+        
+    return text
+
+if __name__ == "__main__":
+    # Parity and throughput against doc_generator's original implementation on a VTT file
+    import webvtt
+
+    vtt_path = sys.argv[1]
+    texts = [c.text.strip().replace('\n', ' ') for c in webvtt.read(vtt_path)]
+    normalizer = TextNormalizer()
+
+    start = time.perf_counter()
+    expected = [legacy_clean_text(t) for t in texts]
+    legacy_s = time.perf_counter() - start
+    start = time.perf_counter()
+    got = normalizer.clean_batch(texts)
+    new_s = time.perf_counter() - start
+
+    mismatches = [(e, g) for e, g in zip(expected, got) if e != g]
+    print(f"{len(texts)} cues, {len(mismatches)} mismatches")
+    for e, g in mismatches[:5]:
+        print(f"  expected: {e!r}\n       got: {g!r}")
+    print(f"original: {legacy_s * 1000:.1f} ms, TextNormalizer: {new_s * 1000:.1f} ms "
+          f"({legacy_s / new_s:.1f}x)")
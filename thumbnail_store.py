@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+
+import scene_scoring
+from assembler import REDBOX_PARAMS, previous_frame_time
+from activity_timeline import video_info
+from build_manifest import file_stamp
+from frame_source import open_frame_source, DEFAULT_BACKEND, BACKENDS
+from vtt_reader import iter_cues
+
+# Raw luma thumbnails of the whole recording, decoded once and kept next to the video as
+# <video>.thumbs.u8 (a plain (count, height, width) uint8 array) with its header in
+# <video>.thumbs.json. Analysis passes open the array with np.memmap, so a threshold
+# sweep reads thumbnails straight from the page cache instead of decoding H.264 again.
+# Scene detection and the red-box candidate search (the diff stage of detect_redboxes)
+# run directly on it:
+#   python thumbnail_store.py <video> --vtt <file.vtt> --scene-thresholds 6,8,10,12
+#   python thumbnail_store.py <video> --plan content_plan.json --diff-thresholds 15,25,35
+STORE_VERSION = 1
+STORE_FPS = 2.0
+STORE_SIZE = (320, 180)
+
+def store_paths(video_path):
+    return video_path + ".thumbs.u8", video_path + ".thumbs.json"
+
+class ThumbnailStore:
+    def __init__(self, data_path, count, fps, size, frame_size):
+        # Read-only and zero-copy: slicing returns views of the mapped file
+        self.frames = np.memmap(data_path, dtype=np.uint8, mode='r', shape=(count, size[1], size[0]))
+        self.fps = fps
+        self.size = size              # (width, height) of the thumbnails
+        self.frame_size = frame_size  # (width, height) of the video
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def times(self):
+        return np.arange(len(self.frames)) / self.fps
+
+    def index_at(self, time_sec):
+        # Thumbnail closest to time_sec, or None past the end of the recording
+        i = int(round(max(0.0, time_sec) * self.fps))
+        return i if i < len(self.frames) else None
+
+    def thumbnail_at(self, time_sec):
+        i = self.index_at(time_sec)
+        return self.frames[i] if i is not None else None
+
+def build_store(video_path, backend=DEFAULT_BACKEND, fps=STORE_FPS, size=STORE_SIZE, progress=None):
+    # One pass over the video written straight into the mapped file; returns the header
+    data_path, header_path = store_paths(video_path)
+    duration, width, height = video_info(video_path)
+    source = open_frame_source(video_path, backend)
+    if not source.is_opened():
+        raise RuntimeError(f"Cannot open video: {video_path}")
+    # One extra second in case the header's frame count is short; the file is cut to the
+    # thumbnails actually decoded
+    capacity = int((duration + 1.0) * fps) + 1
+    tmp_path = f"{data_path}.{os.getpid()}.tmp"
+    frames = np.memmap(tmp_path, dtype=np.uint8, mode='w+', shape=(capacity, size[1], size[0]))
+    count = 0
+    try:
+        for t, frame in source.iter_frames([i / fps for i in range(capacity)]):
+            if progress is not None:
+                progress.check()
+            i = int(round(t * fps))
+            frames[i] = frame.thumbnail(size)
+            if i > count:
+                # A frame that could not be read repeats the one before it (the first one
+                # read when the video starts with unreadable frames)
+                frames[count:i] = frames[count - 1] if count else frames[i]
+            count = i + 1
+        frames.flush()
+    except BaseException:
+        del frames
+        os.remove(tmp_path)
+        raise
+    finally:
+        source.release()
+    del frames
+    os.truncate(tmp_path, count * size[0] * size[1])
+    os.replace(tmp_path, data_path)
+    header = {"version": STORE_VERSION, "stamp": file_stamp(video_path), "fps": fps, "size": list(size),
+              "frame_size": [width, height], "count": count}
+    with open(f"{header_path}.{os.getpid()}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(header, f)
+    os.replace(f"{header_path}.{os.getpid()}.tmp", header_path)
+    return header
+
+def load_store(video_path, backend=DEFAULT_BACKEND, build=True, fps=STORE_FPS, size=STORE_SIZE, progress=None):
+    # Returns the ThumbnailStore of the video, building it if missing or stale.
+    # None when it cannot be built (unreadable video, read-only folder).
+    data_path, header_path = store_paths(video_path)
+    header = None
+    try:
+        with open(header_path, 'r', encoding='utf-8') as f:
+            header = json.load(f)
+        if (header.get("version") != STORE_VERSION or header.get("stamp") != file_stamp(video_path)
+                or header.get("fps") != fps or header.get("size") != list(size)
+                or os.path.getsize(data_path) != header["count"] * size[0] * size[1]):
+            header = None
+    except (OSError, ValueError, KeyError):
+        header = None
+
+    if header is None:
+        if not build:
+            return None
+        try:
+            start = time.perf_counter()
+            header = build_store(video_path, backend, fps, size, progress)
+            mb = header["count"] * size[0] * size[1] / 1024 / 1024
+            print(f"Thumbnail store of {os.path.basename(video_path)}: {header['count']} thumbnails "
+                  f"({mb:.1f} MB) in {time.perf_counter() - start:.1f}s")
+        except (RuntimeError, OSError) as e:
+            print(f"Thumbnail store error: {e}")
+            return None
+
+    if not header["count"]:
+        return None
+    return ThumbnailStore(data_path, header["count"], header["fps"], tuple(header["size"]),
+                          tuple(header["frame_size"]))
+
+def scene_thumbnail(store, time_sec):
+    # The stored thumbnail scaled down to scene_scoring.THUMB_SIZE, the size doc_generator
+    # scores, so scores are on the same scale; None past the end
+    thumb = store.thumbnail_at(time_sec)
+    if thumb is None:
+        return None
+    return cv2.resize(thumb, scene_scoring.THUMB_SIZE, interpolation=cv2.INTER_AREA)
+
+def detect_scenes(store, cue_times, metric="phash", threshold=None, min_gap=4.0):
+    # doc_generator's scene loop on the stored thumbnails: every cue is compared with the
+    # thumbnail of the last scene. Returns the start time of every scene.
+    # Close to doc_generator but not the same: the store holds a frame every 1/STORE_FPS
+    # seconds, so a cue is scored on the nearest of them, and the thumbnail is resized
+    # twice (video -> STORE_SIZE -> THUMB_SIZE). histogram and phash thresholds found here
+    # carry over approximately. absdiff thresholds do not: doc_generator's absdiff compares
+    # full-resolution frames, where changed fine detail such as text scores far higher.
+    scenes = []
+    last_thumb = None
+    for t in cue_times:
+        thumb = scene_thumbnail(store, t)
+        if thumb is None:
+            continue
+        if last_thumb is None:
+            changed = True
+        else:
+            value = scene_scoring.score(last_thumb, thumb, metric)
+            changed = scene_scoring.is_scene_change(value, metric, threshold) and t - scenes[-1] > min_gap
+        if changed:
+            scenes.append(t)
+            last_thumb = thumb
+    return scenes
+
+def redbox_candidates(store, time_sec, prev_time, params=REDBOX_PARAMS):
+    # The diff stage of detect_redboxes on the stored thumbnails: changed areas between
+    # the two times, as (x, y, w, h) in video pixels, largest first. The reach of the
+    # dilation and the minimum area are scaled to the thumbnail size.
+    curr, prev = store.thumbnail_at(time_sec), store.thumbnail_at(prev_time)
+    if curr is None or prev is None:
+        return []
+    sx = store.frame_size[0] / store.size[0]
+    sy = store.frame_size[1] / store.size[1]
+    _, thresh = cv2.threshold(cv2.absdiff(curr, prev), params["diff_threshold"], 255, cv2.THRESH_BINARY)
+    reach = (max(params["diff_kernel"]) // 2) * params["diff_iterations"]
+    dilated = cv2.dilate(thresh, np.ones((3, 3), np.uint8), iterations=max(1, int(np.ceil(reach / max(sx, sy)))))
+    contours, _ = cv2.findContours(dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    min_area = params["min_diff_area"] / (sx * sy)
+    candidates = []
+    for c in sorted(contours, key=cv2.contourArea, reverse=True):
+        if cv2.contourArea(c) > min_area:
+            x, y, w, h = cv2.boundingRect(c)
+            candidates.append((int(x * sx), int(y * sy), int(round(w * sx)), int(round(h * sy))))
+    return candidates
+
+def _float_list(text):
+    return [float(v) for v in text.split(",") if v.strip()]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds the thumbnail store of a video and sweeps analysis thresholds on it")
+    parser.add_argument("video")
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND)
+    parser.add_argument("--vtt", help="Transcript whose cues are tested for scene changes")
+    parser.add_argument("--metric", choices=scene_scoring.METRICS, default="phash",
+                        help="absdiff thresholds found on thumbnails do not apply to doc_generator's absdiff")
+    parser.add_argument("--scene-thresholds", default="", help="Comma separated scene thresholds to try")
+    parser.add_argument("--plan", help="content_plan.json whose steps are searched for red-box candidates")
+    parser.add_argument("--diff-thresholds", default="", help="Comma separated diff thresholds to try")
+    args = parser.parse_args()
+
+    store = load_store(args.video, args.backend)
+    if store is None:
+        sys.exit(1)
+    print(f"{len(store)} thumbnails {store.size[0]}x{store.size[1]} at {store.fps:g}/s")
+
+    if args.vtt:
+        cue_times = [cue.start_ms / 1000.0 for cue in iter_cues(args.vtt)]
+        thresholds = _float_list(args.scene_thresholds) or [scene_scoring.DEFAULT_THRESHOLDS[args.metric]]
+        if args.metric == "absdiff":
+            print("Note: absdiff thresholds found on thumbnails cannot be used for doc_generator's "
+                  "full-resolution absdiff; tune histogram or phash here instead")
+        for threshold in thresholds:
+            start = time.perf_counter()
+            scenes = detect_scenes(store, cue_times, args.metric, threshold)
+            print(f"{args.metric} > {threshold:g}: {len(scenes)} scenes ({len(cue_times)} cues) "
+                  f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    if args.plan:
+        with open(args.plan, 'r', encoding='utf-8') as f:
+            step_times = [item['time'] for item in json.load(f) if item['type'] == 'step']
+        thresholds = _float_list(args.diff_thresholds) or [REDBOX_PARAMS["diff_threshold"]]
+        for threshold in thresholds:
+            params = dict(REDBOX_PARAMS, diff_threshold=threshold)
+            start = time.perf_counter()
+            found = [redbox_candidates(store, t, previous_frame_time(t), params) for t in step_times]
+            print(f"diff > {threshold:g}: {sum(len(c) for c in found)} candidates, "
+                  f"{sum(1 for c in found if not c)} of {len(step_times)} steps without any, "
+                  f"in {(time.perf_counter() - start) * 1000:.0f} ms")
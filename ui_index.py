@@ -0,0 +1,139 @@
+import time
+import cv2
+import numpy as np
+
+# UI rows are short (see REDBOX_PARAMS["ui_max_h"]), so bucketing them into horizontal
+# bands keeps every box in at most a few buckets and every query to one bucket.
+BAND_HEIGHT = 32
+
+class UIBoxIndex:
+    # Spatial index over the UI boxes of a frame for "smallest box containing a point"
+    # queries. Boxes are stable-sorted by area once, so the first hit in a bucket is the
+    # answer and ties keep their original order (same choice as a linear scan).
+    def __init__(self, boxes, max_area, band_height=BAND_HEIGHT):
+        rects = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        areas = rects[:, 2] * rects[:, 3]
+        # Huge container boxes (like the whole window) are never selected
+        keep = np.flatnonzero(areas < max_area)
+        order = keep[np.argsort(areas[keep], kind='stable')]
+
+        self.rects = rects[order]
+        self._tuples = [tuple(r) for r in self.rects.tolist()]
+        self.x1 = self.rects[:, 0]
+        self.y1 = self.rects[:, 1]
+        self.x2 = self.x1 + self.rects[:, 2]
+        self.y2 = self.y1 + self.rects[:, 3]
+        self.band_height = band_height
+
+        # Bucket every box into all bands it overlaps, preserving the area order
+        first_band = self.y1 // band_height
+        last_band = self.y2 // band_height
+        spans = last_band - first_band + 1
+        box_ids = np.repeat(np.arange(len(order)), spans)
+        offsets = np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans)
+        bands = np.repeat(first_band, spans) + offsets
+
+        by_band = np.argsort(bands, kind='stable')
+        self._bands, starts = np.unique(bands[by_band], return_index=True)
+        self._members = np.split(box_ids[by_band], starts[1:]) if len(starts) else []
+        self._lookup = dict(zip(self._bands.tolist(), range(len(self._bands))))
+        # Per band (4, k) coordinate block, so a query is a single broadcast compare
+        corners = np.stack([self.x1, self.y1, self.x2, self.y2]).astype(np.float64)
+        self._blocks = [corners[:, ids] for ids in self._members]
+
+    def smallest_containing(self, cx, cy):
+        slot = self._lookup.get(int(cy // self.band_height))
+        if slot is None:
+            return None
+        x1, y1, x2, y2 = self._blocks[slot]
+        hits = (x1 <= cx) & (cx <= x2) & (y1 <= cy) & (cy <= y2)
+        first = hits.argmax()
+        if not hits[first]:
+            return None
+        return self._tuples[self._members[slot][first]]
+
+    def smallest_containing_many(self, points):
+        # Batched query: one vectorized containment test per band instead of per point.
+        # Returns a list with a box tuple or None for every (cx, cy) point.
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        results = [None] * len(points)
+        if not len(points):
+            return results
+        point_bands = (points[:, 1] // self.band_height).astype(np.int64)
+        by_band = np.argsort(point_bands, kind='stable')
+        bands, starts = np.unique(point_bands[by_band], return_index=True)
+        for band, rows in zip(bands.tolist(), np.split(by_band, starts[1:])):
+            slot = self._lookup.get(band)
+            if slot is None:
+                continue
+            ids = self._members[slot]
+            x1, y1, x2, y2 = self._blocks[slot]
+            cx = points[rows, 0][:, None]
+            cy = points[rows, 1][:, None]
+            hits = (x1 <= cx) & (cx <= x2) & (y1 <= cy) & (cy <= y2)
+            first = np.argmax(hits, axis=1)
+            found = hits[np.arange(len(rows)), first]
+            for row, box_id in zip(rows[found].tolist(), ids[first[found]].tolist()):
+                results[row] = self._tuples[box_id]
+        return results
+
+def linear_smallest_containing(ui_boxes, cx, cy, max_area):
+    # Reference: the original per-contour scan of extract_frame_with_redbox
+    best_match = None
+    min_area = float('inf')
+    for ux, uy, uw, uh in ui_boxes:
+        if (ux <= cx <= ux + uw) and (uy <= cy <= uy + uh):
+            area = uw * uh
+            if area < min_area and area < max_area:
+                min_area = area
+                best_match = (ux, uy, uw, uh)
+    return best_match
+
+def synthetic_dense_ui_frame(width=1920, height=1080, seed=0):
+    # Grid of form rows (checkbox + label + input) like a busy SAP B1 screen
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width), 230, np.uint8)
+    for col_x in range(10, width - 180, 180):
+        for y in range(10, height - 30, 30):
+            cv2.rectangle(img, (col_x, y + 4), (col_x + 12, y + 16), 0, 1)
+            text = "".join(rng.choice(list("ABCDEFGHIJKLMNOPRSTUVYZ"), 4))
+            cv2.putText(img, text, (col_x + 16, y + 15), cv2.FONT_HERSHEY_PLAIN, 0.8, 20, 1)
+            cv2.rectangle(img, (col_x + 60, y), (col_x + 150, y + 20), 90, 1)
+    # Grid lines of a matrix/table area
+    for x in range(0, width, 120):
+        cv2.line(img, (x, height // 2), (x, height), 60, 1)
+    return img
+
+if __name__ == "__main__":
+    # Micro-benchmark of the matching step on dense synthetic UI frames
+    gray = synthetic_dense_ui_frame()
+    edges = cv2.dilate(cv2.Canny(gray, 30, 100), np.ones((3, 25), np.uint8), iterations=1)
+    contours, _ = cv2.findContours(edges, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    rects = [cv2.boundingRect(c) for c in contours]
+    ui_boxes = [r for r in rects if 15 < r[3] < 80 and r[2] > 50]
+    max_area = gray.shape[0] * gray.shape[1] * 0.9
+
+    rng = np.random.default_rng(1)
+    points = list(zip(rng.uniform(0, gray.shape[1], 2000), rng.uniform(0, gray.shape[0], 2000)))
+    print(f"{len(contours)} contours, {len(ui_boxes)} UI boxes, {len(points)} queries")
+
+    start = time.perf_counter()
+    expected = [linear_smallest_containing(ui_boxes, cx, cy, max_area) for cx, cy in points]
+    linear_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = UIBoxIndex(ui_boxes, max_area)
+    build_s = time.perf_counter() - start
+    start = time.perf_counter()
+    got = [index.smallest_containing(cx, cy) for cx, cy in points]
+    query_s = time.perf_counter() - start
+    start = time.perf_counter()
+    got_many = index.smallest_containing_many(points)
+    batch_s = time.perf_counter() - start
+
+    assert got == expected and got_many == expected, "index and linear scan disagree"
+    print(f"linear scan: {linear_s * 1000:.1f} ms")
+    print(f"index: build {build_s * 1000:.2f} ms + queries {query_s * 1000:.1f} ms "
+          f"({linear_s / (build_s + query_s):.0f}x)")
+    print(f"index: build {build_s * 1000:.2f} ms + batched query {batch_s * 1000:.1f} ms "
+          f"({linear_s / (build_s + batch_s):.0f}x)")
@@ -0,0 +1,72 @@
+import re
+import sys
+import time
+from collections import namedtuple
+
+# Streaming WebVTT reader: cues are yielded while the file is read, so memory stays
+# flat and the first cue is available immediately, however long the recording is.
+# Times are integer milliseconds.
+Cue = namedtuple("Cue", ["start_ms", "end_ms", "text", "speaker"])
+
+# [hh:]mm:ss.ttt --> [hh:]mm:ss.ttt [cue settings]
+TIMING_RE = re.compile(r'(?:(\d+):)?(\d{2}):(\d{2})[.,](\d{3})\s+-->\s+(?:(\d+):)?(\d{2}):(\d{2})[.,](\d{3})')
+
+# "Speaker 1: ..." / "Konuşmacı 1: ..." at the start of a cue
+SPEAKER_RE = re.compile(r'\s*(?:Speaker|Konuşmacı)\s+(\d+):\s*', re.IGNORECASE)
+
+def _to_ms(h, m, s, ms):
+    return ((int(h) if h else 0) * 3600 + int(m) * 60 + int(s)) * 1000 + int(ms)
+
+def iter_cues(vtt_path):
+    # Yields a Cue for every caption block, in file order. Multi-line cue text is joined
+    # with spaces; a leading speaker label is moved into Cue.speaker (int or None).
+    timing = None
+    lines = []
+    with open(vtt_path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                if timing is not None and lines:
+                    yield _make_cue(timing, lines)
+                timing = None
+                lines = []
+                continue
+            if timing is None:
+                # Header, NOTE/STYLE blocks and cue identifiers come before the timing line
+                if '-->' in line:
+                    timing = TIMING_RE.match(line)
+                continue
+            lines.append(line)
+        if timing is not None and lines:
+            yield _make_cue(timing, lines)
+
+def _make_cue(timing, lines):
+    g = timing.groups()
+    text = " ".join(lines)
+    speaker = None
+    m = SPEAKER_RE.match(text)
+    if m:
+        speaker = int(m.group(1))
+        text = text[m.end():]
+    return Cue(_to_ms(*g[:4]), _to_ms(*g[4:]), text, speaker)
+
+if __name__ == "__main__":
+    # Time-to-first-cue and full-parse time against webvtt-py
+    vtt_path = sys.argv[1]
+
+    start = time.perf_counter()
+    first = next(iter_cues(vtt_path))
+    first_s = time.perf_counter() - start
+    start = time.perf_counter()
+    count = sum(1 for _ in iter_cues(vtt_path))
+    total_s = time.perf_counter() - start
+    print(f"vtt_reader: first cue {first_s * 1000:.2f} ms, {count} cues in {total_s * 1000:.1f} ms")
+    print(f"  first: {first}")
+
+    try:
+        import webvtt
+    except ImportError:
+        sys.exit(0)
+    start = time.perf_counter()
+    captions = webvtt.read(vtt_path)
+    print(f"webvtt.read: {len(captions)} cues in {(time.perf_counter() - start) * 1000:.1f} ms (before the first cue)")